@@ -0,0 +1 @@
+"""Microbenchmarks, run as python -m benchmarks.<name> from the repo root."""
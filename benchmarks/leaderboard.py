@@ -0,0 +1,90 @@
+"""Microbenchmark for rendering a leaderboard page.
+
+Compares format() with calc_max_col_width() and highlight_row() against
+LeaderboardRenderer, rendering and highlighting the same page. A cached page is what
+flipping back to a page of an unchanged snapshot costs.
+
+usage: python -m benchmarks.leaderboard
+"""
+
+import random
+import string
+import timeit
+
+from src import leaderboard
+
+PAGES = 1_000
+REPEAT = 5
+
+HEADERS = ["Rank", "Exp", "Lv", "User"]
+ALIGN = ["<", ">", ">", ">"]
+MAX_PADDING = [0, 0, 0, 16]
+
+
+def _legacy(entries: list[list], highlight: int) -> str:
+	"""Render a page as the leaderboards did before LeaderboardRenderer."""
+	raw_scoreboard = leaderboard.format(
+		entries, HEADERS, align=ALIGN, max_padding=MAX_PADDING
+	)
+	col_widths = leaderboard.calc_max_col_width(
+		entries, HEADERS, MAX_PADDING
+	)
+	leaderboard.highlight_row(raw_scoreboard, highlight, col_widths)
+	return "\n".join(raw_scoreboard)
+
+
+def main():
+	random.seed(0)
+	pages = []
+	for p in range(PAGES):
+		names = [
+			"".join(
+				random.choices(string.ascii_letters, k=random.randint(3, 20))
+			)
+			for _ in range(10)
+		]
+		exps = sorted(
+			(random.randint(0, 10**6) for _ in range(10)), reverse=True
+		)
+		pages.append(
+			[
+				[p * 10 + i + 1, exp, exp // 1000, name]
+				for i, (exp, name) in enumerate(zip(exps, names))
+			]
+		)
+
+	renderer = leaderboard.LeaderboardRenderer(
+		HEADERS, align=ALIGN, max_padding=MAX_PADDING
+	)
+	for i, page in enumerate(pages):
+		rendered = renderer.render(page, highlight=i % 10)
+		assert rendered == _legacy(page, i % 10)
+		renderer.remember(i % leaderboard.MAX_CACHED_PAGES, rendered)
+
+	cases = {
+		"format + highlight_row": lambda: [
+			_legacy(page, i % 10) for i, page in enumerate(pages)
+		],
+		"LeaderboardRenderer": lambda: [
+			renderer.render(page, highlight=i % 10)
+			for i, page in enumerate(pages)
+		],
+		"cached page": lambda: [
+			renderer.page(i % leaderboard.MAX_CACHED_PAGES)
+			for i in range(PAGES)
+		],
+	}
+
+	baseline = None
+	for name, case in cases.items():
+		best = min(timeit.repeat(case, number=1, repeat=REPEAT))
+		per_page = best / PAGES * 1e6
+		baseline = baseline or per_page
+		print(
+			f"{name:<24}{per_page:>10.1f} us/page"
+			f"{baseline / per_page:>8.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
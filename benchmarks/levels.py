@@ -0,0 +1,81 @@
+"""Microbenchmark for levels_helper lookups.
+
+Compares the current bisect over the precomputed threshold array against the old
+lookup, which rebuilt a list from the memo dict and binary searched it on every call.
+The sorted case is what leaderboards hit, a column already ordered by exp.
+
+usage: python -m benchmarks.levels
+"""
+
+import random
+import timeit
+
+from src import levels_helper
+
+N = 10_000
+REPEAT = 5
+
+
+def _legacy_level_from_exp(exp: int, memo: dict) -> int:
+	"""The lookup as it was before the threshold array, kept for comparison."""
+	if not exp or exp <= 0:
+		return 0
+
+	arr = list(memo.values())
+	left, right = 0, len(arr) - 1
+	while left <= right:
+		mid = left + (right - left) // 2
+		if mid + 1 >= len(arr):
+			break
+
+		if arr[mid] <= exp < arr[mid + 1]:
+			return mid
+
+		if exp > arr[mid]:
+			left = mid + 1
+		else:
+			right = mid - 1
+
+	return -1
+
+
+def main():
+	random.seed(0)
+	top = levels_helper.exp_to_level_cum(levels_helper.MAX_LEVEL) - 1
+	exps = [random.randint(0, int(top)) for _ in range(N)]
+	ranked = sorted(exps, reverse=True)  # like a leaderboard column
+	memo = {
+		i: levels_helper.exp_to_level_cum(i)
+		for i in range(levels_helper.MAX_LEVEL + 1)
+	}
+
+	assert [_legacy_level_from_exp(e, memo) for e in exps] == [
+		levels_helper.level_from_exp(e) for e in exps
+	]
+
+	cases = {
+		"legacy level_from_exp": lambda: [
+			_legacy_level_from_exp(e, memo) for e in exps
+		],
+		"level_from_exp": lambda: [
+			levels_helper.level_from_exp(e) for e in exps
+		],
+		"levels_from_exps": lambda: levels_helper.levels_from_exps(exps),
+		"levels_from_exps sorted": lambda: levels_helper.levels_from_exps(
+			ranked
+		),
+	}
+
+	baseline = None
+	for name, case in cases.items():
+		best = min(timeit.repeat(case, number=1, repeat=REPEAT))
+		per_call = best / N * 1e9
+		baseline = baseline or per_call
+		print(
+			f"{name:<24}{per_call:>10.0f} ns/exp"
+			f"{baseline / per_call:>8.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
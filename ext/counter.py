@@ -3,7 +3,7 @@ import logging
 
 import discord
 import pendulum
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 from src import db
 from src.utility import prepare_embed
@@ -20,7 +20,10 @@ class Counter(commands.Cog):
 	def __init__(self, bot):
 		self.bot = bot
 
-		self.wait_baka_expire.start()
+		self.bot.scheduler.register("counter", self.baka_expire)
+
+	async def cog_unload(self):
+		self.bot.scheduler.unregister("counter")
 
 	@commands.group()
 	async def counter(self, ctx: commands.Context):
@@ -125,32 +128,20 @@ class Counter(commands.Cog):
 				'cid': cid,
 			},
 		)
-		await db.task.add(self.bot.pool, task)
-
-	@tasks.loop(seconds=1)
-	async def wait_baka_expire(self):
-		records = await db.task.get(self.bot.pool, tag=['counter'])
-		if not records:
-			return
+		await self.bot.scheduler.add(task)
 
-		now = pendulum.now("UTC")
-		expired_counter_records = [
-			item for item in records if item["run_at"] < now
-		]
+	async def baka_expire(self, tsk: db.table.Task):
+		"""Reset the counter's footer once no one has been a baka for a while."""
+		cid, mid = (tsk.payload['cid'], tsk.payload['mid'])
+		ch = await self.bot.fetch_channel(cid)
+		msg = discord.Message = await ch.fetch_message(mid)
 
-		for record in expired_counter_records:
-			payload = record['payload']
-			cid, mid = (payload['cid'], payload['mid'])
-			cid = payload["cid"]
-			ch = await self.bot.fetch_channel(cid)
-			msg = discord.Message = await ch.fetch_message(mid)
-
-			embed = msg.embeds[-1]
-			embed.set_footer(text="There are no bakas as of recently...", icon_url="https://files.catbox.moe/qo7bkv.gif")
-			embed.set_thumbnail(url=BORED)
-			await msg.edit(embed=embed)
+		embed = msg.embeds[-1]
+		embed.set_footer(text="There are no bakas as of recently...", icon_url="https://files.catbox.moe/qo7bkv.gif")
+		embed.set_thumbnail(url=BORED)
+		await msg.edit(embed=embed)
 
-			await db.task.drop_one(self.bot.pool, record['id'])
+		await self.bot.scheduler.drop_one(tsk.id)
 
 	@counter.command(name="create")
 	async def counter_create(self, ctx: commands.Context):
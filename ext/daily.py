@@ -8,7 +8,8 @@ import pendulum
 from discord.ext import commands, tasks
 
 from main import CazzuBot
-from src import db
+from src import db, exp_ledger
+from src.leaderboard_snapshot import Board
 
 if TYPE_CHECKING:
 	from main import CazzuBot
@@ -25,6 +26,7 @@ class Daily(commands.Cog):
 		self.force_reset = force_reset
 
 		self.daily_reset.start()
+		self.partition_upkeep.start()
 
 	async def cog_load(self):
 		if self.force_reset:
@@ -34,27 +36,46 @@ class Daily(commands.Cog):
 	async def cog_unload(self):
 		"""Cancel any tasks on unload."""
 		self.daily_reset.cancel()
+		self.partition_upkeep.cancel()
 
 	@tasks.loop(time=DAILY_RESET)
 	async def daily_reset(self):
 		"""Dummy function to decorate for tasks."""  # noqa: D401
 		await self.reset()
 
+	@tasks.loop(time=DAILY_RESET)
+	async def partition_upkeep(self):
+		"""Keep log partitions created ahead, see src.db.partition."""
+		await db.partition.ensure(self.bot.pool)
+
 	async def reset(self):
-		"""Reset dailies."""
+		"""Reset dailies.
+
+		Message counts aren't rewritten, they're read as reset once counted on a day
+		before the last daily reset. See src.exp_ledger.
+		"""
 		_log.info("Running daily reset")
 
-		# Reset all message counts and cdr
-		await db.member_exp.reset_all_msg_cnt(self.bot.pool)
-		await db.member_exp.reset_all_cdr(self.bot.pool)
+		# Buffered exp must land before member_exp is rewritten under the ledger
+		await self.bot.exp_ledger.flush()
 
-		# Log the time this daily reset was done
+		# Log the time this daily reset was done, which resets all message counts
 		now = pendulum.now("UTC")
 		await db.internal.set_last_daily(self.bot.pool, now)
+		self.bot.exp_ledger.roll_day(exp_ledger.day_of(now))
+
+		# Fold whatever was logged since the last sync into the lifetime placeholders,
+		# and have the lifetime rankings of guilds it changed loaded again
+		for gid in await db.member_exp.sync_with_exp_logs(self.bot.pool):
+			self.bot.rankings.invalidate_lifetime(Board.EXP, gid)
+		for gid in await db.member_frog.sync_with_frog_logs(self.bot.pool):
+			self.bot.rankings.invalidate_lifetime(Board.FROG, gid)
+
+		# Have the ledger re-read everything it just had reset
+		self.bot.exp_ledger.clear()
 
-		# Resync logs to their lifetime placeholders
-		await db.member_exp.sync_with_exp_logs(self.bot.pool)
-		await db.member_frog.sync_with_frog_logs(self.bot.pool)
+		# Roll months old exp logs into daily sums, now that lifetime has them
+		await db.member_exp_log.compact(self.bot.pool)
 
 
 async def setup(bot: CazzuBot):
@@ -73,6 +94,7 @@ async def setup(bot: CazzuBot):
 		force_reset = True
 	else:
 		last_daily = pendulum.parser.parse(last_daily_raw)
+		bot.exp_ledger.roll_day(exp_ledger.day_of(last_daily))
 		if now > last_daily + pendulum.duration(days=1):
 			force_reset = True
 
@@ -14,6 +14,7 @@ from discord.ext import commands
 
 from main import CazzuBot
 from src import db, leaderboard, level, levels_helper, rank, utility
+from src.leaderboard_snapshot import Board, Snapshot
 
 _log = logging.getLogger(__name__)
 
@@ -32,6 +33,12 @@ _EXP_BUFF_RESET = 1440  # mins	  |   1440m = 24h
 
 _SCOREBOARD_STAMP = "https://cdn.discordapp.com/emojis/695126165756837999.webp?size=160&quality=lossless"
 
+_SCOREBOARD = leaderboard.LeaderboardRenderer(
+	["Rank", "Exp", "Lv", "User"],
+	align=["<", ">", ">", ">"],
+	max_padding=[0, 0, 0, 16],
+)
+
 
 def _from_msg(msg: int):
 	"""Return the expected experience reward given the total message count."""
@@ -63,6 +70,10 @@ class Experience(commands.Cog):
 	def __init__(self, bot: CazzuBot):
 		self.bot = bot
 
+	async def cog_unload(self):
+		"""Make sure buffered experience isn't lost when reloading."""
+		await self.bot.exp_ledger.flush()
+
 	@commands.Cog.listener()
 	async def on_message(self, message: discord.Message):
 		"""Add experience to the member based on prior activity.
@@ -89,62 +100,47 @@ class Experience(commands.Cog):
 		uid = message.author.id
 		gid = message.guild.id
 
-		member_db = await db.member_exp.get_one(self.bot.pool, gid, uid)
-		if member_db is None:  # Member not found, insert and try again.
-			await db.member_exp.add(
-				self.bot.pool,
-				db.table.MemberExp(gid, uid, 0, 0, now.subtract(hours=1)),
-			)
-			member_db = await db.member_exp.get_one(
-				self.bot.pool, gid, uid
-			)
+		# Most messages land here, answered without any I/O at all
+		if self.bot.exp_cooldowns.is_cooling(gid, uid, now.timestamp()):
+			return
 
-		if member_db and now < member_db.get("cdr"):
+		# Experience is buffered in the ledger and written out in batches, so this is
+		# free of database round trips once the member has been loaded.
+		award = await self.bot.exp_ledger.award_message(
+			gid,
+			uid,
+			now,
+			reward=_from_msg,
+			cooldown=pendulum.duration(seconds=_EXP_COOLDOWN),
+		)
+		if award is None:
 			return  # Cooldown has not yet expired, do nothing
 
-		# Prepare and pack variables
-		msg_cnt = member_db.get("msg_cnt") + 1
-		exp_gain = _from_msg(msg_cnt)
-
-		year = now.year
-		month = now.month
-		seasonal_exp_old = await db.member_exp_log.get_seasonal_by_month(
-			self.bot.pool, gid, uid, year, month
+		_, seasonal_exp, lifetime_exp = award
+		seasonal_exp = utility.OldNew(*seasonal_exp)
+		lifetime_exp = utility.OldNew(*lifetime_exp)
+
+		self.bot.rankings.update(
+			Board.EXP,
+			gid,
+			uid,
+			now,
+			seasonal=seasonal_exp.new,
+			lifetime=lifetime_exp.new,
 		)
-		if not seasonal_exp_old:
-			seasonal_exp_old = 0
-
-		seasonal_exp_new = seasonal_exp_old + exp_gain
-		seasonal_exp = utility.OldNew(seasonal_exp_old, seasonal_exp_new)
 
-		lifetime_exp_old = member_db.get("lifetime")
-		lifetime_exp_new = lifetime_exp_old + exp_gain
-		lifetime_exp = utility.OldNew(lifetime_exp_old, lifetime_exp_new)
-
-		seasonal_level_old = levels_helper.level_from_exp(seasonal_exp_old)
-		seasonal_level_new = levels_helper.level_from_exp(seasonal_exp_new)
+		seasonal_level_old = levels_helper.level_from_exp(seasonal_exp.old)
+		seasonal_level_new = levels_helper.level_from_exp(seasonal_exp.new)
 		seasonal_level = utility.OldNew(
 			seasonal_level_old, seasonal_level_new
 		)
 
-		lifetime_level_old = levels_helper.level_from_exp(lifetime_exp_old)
-		lifetime_level_new = levels_helper.level_from_exp(lifetime_exp_new)
+		lifetime_level_old = levels_helper.level_from_exp(lifetime_exp.old)
+		lifetime_level_new = levels_helper.level_from_exp(lifetime_exp.new)
 		lifetime_level = utility.OldNew(
 			lifetime_level_old, lifetime_level_new
 		)
 
-		# Add to member's lifetime exp
-		offset_cooldown = now + pendulum.duration(seconds=_EXP_COOLDOWN)
-		member_updated = db.table.MemberExp(
-			gid, uid, lifetime_exp.new, msg_cnt, offset_cooldown
-		)
-		await db.member_exp.update_exp(self.bot.pool, member_updated)
-
-		# Add to loggings for seasonal (and weekly, monthly, etc.)
-		await db.member_exp_log.add(
-			self.bot.pool, db.table.MemberExpLog(gid, uid, exp_gain, now)
-		)
-
 		# Deal with potential level up
 		await level.on_msg_handle_levels(
 			self.bot, message, seasonal_level, delete_after=7
@@ -170,14 +166,15 @@ class Experience(commands.Cog):
 		if user is None:
 			user = ctx.message.author
 
-		now = pendulum.now()
+		now = pendulum.now("UTC")
 		gid = ctx.guild.id
 
-		rows = await db.guild.get_members_exp_seasonal_by_month(
-			self.bot.pool, gid, now.year, now.month
-		)
+		focus = await self._seasonal_focus(gid, user.id, now)
+		if focus is None:
+			await ctx.send("No experience has been earned yet this season!")
+			return
 
-		embed = await self._prepare_personal_summary(ctx, user, rows)
+		embed = await self._prepare_personal_summary(ctx, user, *focus)
 
 		await ctx.send(embed=embed)
 
@@ -190,77 +187,80 @@ class Experience(commands.Cog):
 			user = ctx.message.author
 
 		gid = ctx.guild.id
-		rows = await db.guild.get_members_exp_ranked(self.bot.pool, gid)
+		ranking = await self.bot.rankings.lifetime(Board.EXP, gid)
+		if user.id not in ranking:
+			await ctx.send("No experience has been earned yet!")
+			return
+
+		subset, subset_i = ranking.neighbours(user.id)
 		embed = await self._prepare_personal_summary(
-			ctx, user, rows, db.table.WindowEnum.LIFETIME
+			ctx,
+			user,
+			subset,
+			subset_i,
+			len(ranking),
+			db.table.WindowEnum.LIFETIME,
 		)
 
 		await ctx.send(embed=embed)
 
+	async def _seasonal_focus(
+		self, gid: int, uid: int, now: pendulum.DateTime
+	) -> tuple[list, int, int] | None:
+		"""Return the rows around a member this season, where they are, and the total.
+
+		Read from the guild's ranking once it's loaded. Until then, only those few rows
+		are queried for. None if the member has no exp this season.
+		"""
+		ranking = self.bot.rankings.peek_seasonal(Board.EXP, gid, now)
+		if ranking is not None:
+			if uid not in ranking:
+				return None
+
+			return *ranking.neighbours(uid), len(ranking)
+
+		rows = await db.member_exp_log.get_focus_window(
+			self.bot.pool, gid, uid, now.year, (now.month - 1) // 3
+		)
+		if not rows:
+			return None
+
+		subset = [(r["rank"], r["uid"], r["exp_sum"]) for r in rows]
+		subset_i = next(i for i, r in enumerate(rows) if r["uid"] == uid)
+		return subset, subset_i, rows[0]["total"]
+
 	async def _prepare_personal_summary(
 		self,
 		ctx: commands.Context,
 		user: discord.Member,
-		data: list[Record],
+		subset: list[tuple[int, int, int]],
+		subset_i: int,
+		total: int,
 		mode: db.table.WindowEnum = db.table.WindowEnum.SEASONAL,
 	) -> discord.Embed:
 		"""Return the embed of scoreboard Club Membership Card.
 
-		data: the raw result from query, containing (rank, uid, exp) in that order
+		subset: rows of (rank, uid, exp) around user, who is at subset_i
+		total: how many members are ranked in the window
 		"""
 		uid = user.id
 
-		# Prepare leaderboard window
-		uid_index = [r["uid"] for r in data].index(uid)
-		subset, subset_i = leaderboard.create_focus_subset(data, uid_index)
-
 		# Transpose for per-column transformations
 		ranks, uids, exps = zip(*subset)
-		lvls = [levels_helper.level_from_exp(e) for e in exps]
-
-		# Annoying bug to learn from, and python programming misunderstanding.
-		#
-		# List Comprehension (speculative, but sound) seems to execute expressions
-		# immediately to build the list; there is no generator formed and casted to
-		# list.
-		#
-		# Generator Comprehension, when there's an await, will return an async
-		# generator. When immediately passed into list() to cast it, it won't work
-		# because its implementaion is only for synchronous iterators, not async.
-		# In other words, do not list(await x for x in arr), instead, do list comp.
-		#
-		# Even if the expression may stall, since they are await'ed, it shouldn't stall
-		# the loop. So for generator purposes, there's no purpose to use asyncstdlib.
-		names = [
-			await utility.find_username(self.bot, ctx, id) for id in uids
-		]
+		lvls = levels_helper.levels_from_exps(exps)
+
+		names = await self.bot.usernames.resolve_many(ctx.guild, uids)
 
 		# Transpose back to prepare to generate
 		window = list(zip(ranks, exps, lvls, names))
 
 		# Generate leaderboard
-		headers = ["Rank", "Exp", "Lv", "User"]
-		align = ["<", ">", ">", ">"]
-		max_padding = [0, 0, 0, 16]
-
-		raw_scoreboard = leaderboard.format(
-			window,
-			headers,
-			align=align,
-			max_padding=max_padding,
-		)
-
-		col_widths = leaderboard.calc_max_col_width(
-			window, headers, max_padding
-		)
-
-		leaderboard.highlight_row(raw_scoreboard, subset_i, col_widths)
-		scoreboard_s = "\n".join(raw_scoreboard)  # Final step to join.
+		scoreboard_s = _SCOREBOARD.render(window, highlight=subset_i)
 
 		# Other Preparation
 		gid = ctx.guild.id
 		rid = await db.rank_threshold.of_member(
-			self.bot.pool, gid, uid, mode=mode
+			self.bot.pool, gid, uid, mode=mode, exp=exps[subset_i]
 		)
 		role: discord.Role = ctx.guild.get_role(rid)
 
@@ -270,20 +270,7 @@ class Experience(commands.Cog):
 		exp = exps[subset_i]
 		rank = ranks[subset_i]
 
-		if mode is db.table.WindowEnum.SEASONAL:
-			now = pendulum.now()
-			year = now.year
-			month = now.month
-
-			total_member_count = await db.member_exp_log.get_seasonal_total_members_by_month(
-				self.bot.pool, gid, year, month
-			)
-		elif mode is db.table.WindowEnum.LIFETIME:
-			total_member_count = await db.member_exp_log.get_total_members(
-				self.bot.pool, gid
-			)
-
-		percentile = utility.calc_percentile(rank, total_member_count)
+		percentile = utility.calc_percentile(rank, total)
 
 		embed.set_author(
 			name=f"{user.display_name}'s Club Membership Card",
@@ -343,23 +330,19 @@ class Experience(commands.Cog):
 
 		gid = ctx.guild.id
 
-		# Fetch data
+		# Fetch data, shared with anyone else looking at this season
 		date = pendulum.date(year, ((season - 1) * 3) + 1, 1)
-		rows = await db.guild.get_members_exp_seasonal_by_month(
-			self.bot.pool, gid, date.year, date.month
+		snapshot = await self.bot.leaderboards.seasonal_by_month(
+			Board.EXP, gid, date.year, date.month
 		)
 
-		headers = ["Rank", "Exp", "Lv", "User"]
-		align = ["<", ">", ">", ">"]
-		max_padding = [0, 0, 0, 16]
-
 		# Chunk data to process only what we need right now
 		scoreboard_s = await self.create_leaderboard_str(
-			rows, page, ctx, headers, align, max_padding
+			snapshot, page, ctx
 		)
 
 		embed = await self._prepare_leaderboard_embed(
-			ctx, page, date, rows, scoreboard_s
+			ctx, page, date, snapshot.rows, scoreboard_s
 		)
 
 		# Send leaderboard
@@ -405,8 +388,7 @@ class Experience(commands.Cog):
 				if str(reaction.emoji) == "◀":
 					page = max(page - 1, 1)
 				elif str(reaction.emoji) == "▶":
-					max_page = len(rows) // 10
-					page = min(page + 1, max_page)
+					page = min(page + 1, snapshot.pages)
 
 			elif str(reaction.emoji) in ["⬅", "➡"]:
 				if str(reaction.emoji) == "⬅":
@@ -414,63 +396,60 @@ class Experience(commands.Cog):
 				elif str(reaction.emoji) == "➡":
 					date = date.add(months=3)
 
-				rows = await db.guild.get_members_exp_seasonal_by_month(
-					self.bot.pool, gid, date.year, date.month
-				)
 				page = 1
 
+			# Only ever a memory lookup, unless the season hasn't been seen yet
+			snapshot = await self.bot.leaderboards.seasonal_by_month(
+				Board.EXP, gid, date.year, date.month
+			)
+
 			scoreboard_s = await self.create_leaderboard_str(
-				rows, page, ctx, headers, align, max_padding
+				snapshot, page, ctx
 			)
 
 			embed = await self._prepare_leaderboard_embed(
-				ctx, page, date, rows, scoreboard_s
+				ctx, page, date, snapshot.rows, scoreboard_s
 			)
 			await msg.edit(embed=embed)
 
 	async def create_leaderboard_str(
 		self,
-		rows: list[Record],
+		snapshot: Snapshot,
 		page: int,
 		ctx: commands.Context,
-		headers: list[str],
-		align: list[str],
-		max_padding: list[int],
 	) -> str:
-		if not rows:
+		"""Render a page of snapshot, highlighting the author if they're on it.
+
+		Pages are cached by snapshot version, so flipping back to a page already seen
+		costs nothing.
+		"""
+		if not snapshot:
 			return "No data has been logged during this time period."
 
-		subset = await leaderboard.prepare_leaderboard_subset(rows, page)
-		subset_, uids = await self.process_subset(ctx, subset)
-		raw_scoreboard = leaderboard.format(
-			subset_, headers, align=align, max_padding=max_padding
+		page = min(max(page, 1), snapshot.pages)
+		subset = snapshot.page(page)
+		uids = [row[1] for row in subset]
+		highlight = (
+			uids.index(ctx.author.id) if ctx.author.id in uids else None
 		)
 
-		self.leaderboard_highlight(
-			ctx, headers, max_padding, subset_, uids, raw_scoreboard
+		key = (
+			snapshot.board,
+			snapshot.gid,
+			snapshot.year,
+			snapshot.season,
+			snapshot.version,
+			page,
+			highlight,
 		)
+		scoreboard_s = _SCOREBOARD.page(key)
+		if scoreboard_s is None:
+			subset_, _ = await self.process_subset(ctx, subset)
+			scoreboard_s = _SCOREBOARD.render(subset_, highlight=highlight)
+			_SCOREBOARD.remember(key, scoreboard_s)
 
-		scoreboard_s = "\n".join(raw_scoreboard)
 		return scoreboard_s
 
-	def leaderboard_highlight(
-		self,
-		ctx: commands.Context,
-		headers: list[str],
-		max_padding: list[str],
-		subset_: list,
-		uids: list[str],
-		raw_scoreboard: list[str],
-	) -> None:
-		"""Given a list of strings, will modify in place and add @ if matches uid."""
-		uid = ctx.author.id
-		if uid in uids:
-			col_widths = leaderboard.calc_max_col_width(
-				subset_, headers, max_padding
-			)
-			subset_i = uids.index(uid)
-			leaderboard.highlight_row(raw_scoreboard, subset_i, col_widths)
-
 	async def _prepare_leaderboard_embed(
 		self,
 		ctx: commands.Context,
@@ -512,10 +491,8 @@ class Experience(commands.Cog):
 		Also return uids for usage.
 		"""
 		ranks, uids, exps = zip(*subset)
-		lvls = [levels_helper.level_from_exp(e) for e in exps]
-		names = [
-			await utility.find_username(self.bot, ctx, id) for id in uids
-		]
+		lvls = levels_helper.levels_from_exps(exps)
+		names = await self.bot.usernames.resolve_many(ctx.guild, uids)
 
 		# Transpose back to prepare to generate
 		window = list(zip(ranks, exps, lvls, names))
@@ -527,10 +504,44 @@ class Experience(commands.Cog):
 	async def exp_resync(self, ctx: commands.Context):
 		_log.info(f"{ctx.author} called for resync of member lifetime exp")
 
-		msg = await ctx.send("Starting frog sync...")
-		await db.member_exp.sync_with_exp_logs(self.bot.pool)
+		msg = await ctx.send("Starting exp sync...")
+		await self.bot.exp_ledger.flush()
+		await db.member_exp.rebuild_from_exp_logs(self.bot.pool)
+		self.bot.exp_ledger.clear()
+		self.bot.leaderboards.invalidate()
+		self.bot.rankings.invalidate()
 		await msg.edit(content="Synced! ✅")
 
+	@exp.command(name="verify")
+	@commands.is_owner()
+	async def exp_verify(self, ctx: commands.Context):
+		"""Report members whose lifetime exp has drifted from their exp logs."""
+		await self.bot.exp_ledger.flush()
+		drifted = await db.member_exp.verify_with_exp_logs(self.bot.pool)
+		if not drifted:
+			await ctx.send("No drift, lifetime exp matches the logs ✅")
+			return
+
+		drift = sum(row["lifetime"] - row["logged"] for row in drifted)
+		await ctx.send(
+			f"{len(drifted)} members have drifted, by {drift:+} exp in total. "
+			"Run `exp resync` to rebuild lifetime exp from the logs."
+		)
+
+	@exp.command(name="backfill")
+	@commands.is_owner()
+	@utility.author_confirm()
+	async def exp_backfill(self, ctx: commands.Context):
+		"""Rebuild the seasonal exp rollup from the raw exp logs."""
+		_log.info(f"{ctx.author} called for backfill of seasonal exp")
+
+		msg = await ctx.send("Rebuilding seasonal exp...")
+		await self.bot.exp_ledger.flush()
+		await db.member_exp_season.backfill(self.bot.pool)
+		self.bot.leaderboards.invalidate()
+		self.bot.rankings.invalidate()
+		await msg.edit(content="Rebuilt! ✅")
+
 	@exp.group(name="quiet", invoke_without_command=True)
 	async def quiet(self, ctx: commands.Context):
 		gid = ctx.guild.id
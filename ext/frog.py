@@ -9,19 +9,26 @@ from math import trunc
 
 import discord
 import pendulum
-from asyncpg import Record
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 from main import CazzuBot
 from src import db, frog, frog_factory, leaderboard, user_json, utility
 from src.custom_converters import PositiveInt
 from src.db.table import FrogTypeEnum
+from src.leaderboard_snapshot import Board
+from src.ranking import Ranking
 from src.ntlp import InvalidTimeError, parse_duration
 
 _log = logging.getLogger(__name__)
 
 _SCOREBOARD_STAMP = "https://cdn.discordapp.com/emojis/752290769712316506.webp?size=160&quality=lossless"
 
+_SCOREBOARD = leaderboard.LeaderboardRenderer(
+	["Rank", "Frogs", "User"],
+	align=["<", ">", ">"],
+	max_padding=[0, 0, 16],
+)
+
 
 class _ExpFrog(Enum):
 	NORMAL: int = 10
@@ -31,46 +38,29 @@ class _ExpFrog(Enum):
 class Frog(commands.Cog):
 	def __init__(self, bot: CazzuBot):
 		self.bot: CazzuBot = bot
-		self.check_spawn_frog.start()
+		self.bot.scheduler.register(
+			"frog",
+			self.spawn_frog,
+			concurrency=frog_factory.GLOBAL_SPAWN_LIMIT,
+		)
 
 	async def cog_load(self):
 		await frog_factory.reset_frog_tasks(self.bot)
 
 	async def cog_unload(self):
-		self.check_spawn_frog.cancel()
+		self.bot.scheduler.unregister("frog")
 
 	# def cog_check(self, ctx):
 	# return ctx.author.id == self.bot.owner_id
 
-	@tasks.loop(seconds=1)
-	async def check_spawn_frog(self):
-		"""Check at regular invervals if we need to spawn a frog.
-
-		We know we need to spawn a frog if the time now is past the the "run_at" under
-		the task query with tags "frog".
-		"""
-		# _log.info("Checking if frog can spawn...")
+	async def spawn_frog(self, tsk: db.table.Task):
+		"""Handle frog tasks as they come due, see src.task_scheduler."""
 		try:
-			await frog_factory.check_frog_spawn(self.bot)
+			await frog_factory.spawn_frog_task(self.bot, tsk)
 		except discord.DiscordServerError:
-			# Loops, if they encounter any exception, will stop looping and set
-			# _has_failed = True. Catching allows looping to continue to work even
-			# if Discord themselves have a server error.
-			#
-			# Though if Discord never fixes themselves, this will continuously reroll
-			# all frogs despite never interacting with discord.
+			# Anything else raised is logged by the scheduler, which retries the
+			# task later. Discord having a server error is not worth the noise.
 			_log.warning("%s", traceback.format_exc())
-		except Exception as err:
-			msg = (
-				"Frog tasks.loop has encountered an uncaught exception. "
-				"Frog spawning will now terminate."
-			)
-			_log.error("%s", msg)
-			_log.exception(err)
-
-	@check_spawn_frog.before_loop
-	async def before_check_frog_spawn(self):
-		await self.bot.wait_until_ready()
 
 	@commands.group(invoke_without_command=True, aliases=["frogs"])
 	async def frog(
@@ -80,34 +70,28 @@ class Frog(commands.Cog):
 		if member is None:
 			member = ctx.message.author
 
-		now = pendulum.now()
+		now = pendulum.now("UTC")
 		gid = ctx.guild.id
 		uid = member.id
 
-		rows = await db.member_frog.get_members_frog_seasonal_by_month(
-			self.bot.pool, gid, now.year, now.month
-		)
-
-		for row in rows:
-			_log.debug(f"{list(row.values())=}")
+		ranking = await self.bot.rankings.seasonal(Board.FROG, gid, now)
 
 		# New season, no data on user yet
 		# It would be better to just ignore all things leaderboards, but still show
 		# all other status, but this will work for now...
 		#
 		# This is an issue with c!xp as well...
-		if not rows:
+		if not ranking:
 			await ctx.send("No one has yet captured frogs in this server!")
 			return
 
-		_, uids, _ = zip(*rows)
-		if uid not in uids:
+		if uid not in ranking:
 			await ctx.send(
 				"You have not yet captured any frogs this season!"
 			)
 			return
 
-		embed = await self._prepare_personal_summary(ctx, member, rows)
+		embed = await self._prepare_personal_summary(ctx, member, ranking)
 
 		await ctx.send(embed=embed)
 
@@ -120,28 +104,25 @@ class Frog(commands.Cog):
 			user = ctx.message.author
 
 		gid = ctx.guild.id
-		rows = await db.member_frog.get_all_member_frogs_ranked(
-			self.bot.pool, gid
-		)
+		ranking = await self.bot.rankings.lifetime(Board.FROG, gid)
 
 		# New season, no data on user yet
 		# It would be better to just ignore all things leaderboards, but still show
 		# all other status, but this will work for now...
 		#
 		# This is an issue with c!xp as well...
-		if not rows:
+		if not ranking:
 			await ctx.send("No one has yet captured frogs in this server!")
 			return
 
-		_, uids, _ = zip(*rows)
-		if user.id not in uids:
+		if user.id not in ranking:
 			await ctx.send(
 				"You have not yet captured any frogs this season!"
 			)
 			return
 
 		embed = await self._prepare_personal_summary(
-			ctx, user, rows, db.table.WindowEnum.LIFETIME
+			ctx, user, ranking, db.table.WindowEnum.LIFETIME
 		)
 
 		await ctx.send(embed=embed)
@@ -150,49 +131,31 @@ class Frog(commands.Cog):
 		self,
 		ctx: commands.Context,
 		user: discord.Member,
-		data: list[Record],
+		ranking: Ranking,
 		mode: db.table.WindowEnum = db.table.WindowEnum.SEASONAL,
 	) -> discord.Embed:
 		"""Return embed for frog summary on user.
 
-		data: raw query result, formatted as (rank, uid, frog)
+		ranking: of the window, user must be ranked in it
 		"""
 		uid = user.id
 
-		# Prepare leaderboard
-		uid_index = [r["uid"] for r in data].index(uid)
-		_log.debug(f"{uid_index=}")
-		subset, subset_i = leaderboard.create_focus_subset(data, uid_index)
+		# Prepare leaderboard, rows of (rank, uid, frog)
+		subset, subset_i = ranking.neighbours(uid)
 		for s in subset:
 			_log.debug(f"{s=}")
 
 		# Transpose, turn uid into usernames
 		ranks, uids, frog_cnt = zip(*subset)
 
-		names = [
-			await utility.find_username(self.bot, ctx, id) for id in uids
-		]
+		names = await self.bot.usernames.resolve_many(ctx.guild, uids)
 
 		# Transpose back to row-major
 		window = list(zip(ranks, frog_cnt, names))
 
 		# Generate leaderboard
-		headers = ["Rank", "Frogs", "User"]
-		align = ["<", ">", ">"]
-		max_padding = [0, 0, 16]
-
-		raw_scoreboard = leaderboard.format(
-			window, headers, align=align, max_padding=max_padding
-		)
-
-		col_widths = leaderboard.calc_max_col_width(
-			data, headers, max_padding
-		)
-
-		for e in raw_scoreboard:
-			_log.debug(f"{e}")
-		leaderboard.highlight_row(raw_scoreboard, subset_i, col_widths)
-		scoreboard_s = "\n".join(raw_scoreboard)
+		scoreboard_s = _SCOREBOARD.render(window, highlight=subset_i)
+		_log.debug(f"{scoreboard_s}")
 
 		# Other Preparation
 		gid = ctx.guild.id
@@ -208,22 +171,7 @@ class Frog(commands.Cog):
 		)
 		rank = ranks[subset_i]
 
-		if mode is db.table.WindowEnum.SEASONAL:
-			now = pendulum.now()
-			year = now.year
-			month = now.month
-
-			total_member_count = await db.member_frog_log.get_seasonal_total_members_by_month(
-				self.bot.pool, gid, year, month
-			)
-		elif mode is db.table.WindowEnum.LIFETIME:
-			total_member_count = (
-				await db.member_frog_log.get_total_members(
-					self.bot.pool, gid
-				)
-			)
-
-		percentile = utility.calc_percentile(rank, total_member_count)
+		percentile = utility.calc_percentile(rank, len(ranking))
 
 		embed.set_author(
 			name=f"{user.display_name}'s Frog Capture Permit",
@@ -307,21 +255,18 @@ class Frog(commands.Cog):
 			payload = self.generate_payload(
 				gid, cid, interval, persist, fuzzy
 			)
-			record = await db.task.get_one(
-				self.bot.pool,
-				payload={"gid": gid, "cid": cid},
-				tag=["frog"],
+			record = await db.task.get_by_key(
+				self.bot.pool, "frog", gid, cid
 			)
 
 			if record is not None:  # If a task already exists
-				id = record["id"]
-				run_at = frog_factory.roll_future_frog(
-					now, interval, fuzzy
-				)
-
-				# payload = self.bot.json_encoder.encode(payload)
-				await db.task.update_all(
-					self.bot.pool, id, run_at, payload
+				await frog_factory.update_frog_task(
+					self.bot,
+					record["id"],
+					now,
+					interval,
+					fuzzy,
+					payload=payload,
 				)
 			else:  # If task not already exists
 				await frog_factory.add_frog_task(self.bot, payload)
@@ -337,9 +282,7 @@ class Frog(commands.Cog):
 		"""
 		gid = ctx.guild.id
 		await db.frog_spawn.clear(self.bot.pool, gid)
-		await db.task.drop(
-			self.bot.pool, tag=["frog"], payload={"gid": gid}
-		)
+		await frog_factory.clear_guild_frog_task(self.bot, gid)
 		await ctx.message.add_reaction("👍")
 
 	@frog.command(name="consume")
@@ -374,10 +317,8 @@ class Frog(commands.Cog):
 		)
 		frogs_new = frogs_old - amount
 
-		now = pendulum.now()
-		exp_old = await db.member_exp_log.get_seasonal_by_month(
-			self.bot.pool, gid, uid, now.year, now.month
-		)
+		now = pendulum.now("UTC")
+		exp_old = await self.bot.exp_ledger.seasonal(gid, uid, now)
 		exp_new = exp_old + total_exp
 
 		desc = (
@@ -428,16 +369,19 @@ class Frog(commands.Cog):
 				raise commands.BadArgument(msg)
 
 			# Now consume
-			now = pendulum.now()
+			now = pendulum.now("UTC")
 
-			exp_payload = db.table.MemberExpLog(
+			# Goes through the ledger so the seasonal exp it holds stays correct.
+			_, seasonal_exp = await self.bot.exp_ledger.grant(
 				gid,
 				uid,
 				total_exp,
 				now,
 				db.table.MemberExpLogSourceEnum.FROG,
 			)
-			await db.member_exp_log.add(self.bot.pool, exp_payload)
+			self.bot.rankings.update(
+				Board.EXP, gid, uid, now, seasonal=seasonal_exp
+			)
 
 			await db.member_frog.modify_frog(
 				self.bot.pool,
@@ -535,9 +479,26 @@ class Frog(commands.Cog):
 		)
 
 		msg = await ctx.send("Starting frog sync...")
-		await db.member_frog.sync_with_frog_logs(self.bot.pool)
+		await db.member_frog.rebuild_from_frog_logs(self.bot.pool)
+		self.bot.leaderboards.invalidate()
+		self.bot.rankings.invalidate()
 		await msg.edit(content="Synced! ✅")
 
+	@frog.command(name="verify")
+	@commands.is_owner()
+	async def frog_verify(self, ctx: commands.Context):
+		"""Report members whose lifetime captures have drifted from their logs."""
+		drifted = await db.member_frog.verify_with_frog_logs(self.bot.pool)
+		if not drifted:
+			await ctx.send("No drift, captures match the logs ✅")
+			return
+
+		drift = sum(row["capture"] - row["logged"] for row in drifted)
+		await ctx.send(
+			f"{len(drifted)} members have drifted, by {drift:+} captures in "
+			"total. Run `frog resync` to recount captures from the logs."
+		)
+
 
 async def setup(bot: commands.Bot):
 	await bot.add_cog(Frog(bot))
@@ -8,7 +8,7 @@ from typing import TYPE_CHECKING
 
 import discord
 import pendulum
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord.ext.commands.context import Context
 
 from src import db
@@ -30,10 +30,12 @@ _log = logging.getLogger(__name__)
 class Moderation(commands.Cog):
 	def __init__(self, bot):
 		self.bot: CazzuBot = bot
-		self.log_expired.start()
+		self.bot.scheduler.register(
+			"modlog", self.log_expired, concurrency=4
+		)
 
 	def cog_unload(self):
-		self.log_expired.cancel()
+		self.bot.scheduler.unregister("modlog")
 
 	def cog_check(self, ctx: Context) -> bool:
 		"""Check to make sure user satisfies 'moderation' permission.
@@ -118,7 +120,7 @@ class Moderation(commands.Cog):
 				raw,
 			)
 
-			await db.task.add(self.bot.pool, tsk)
+			await self.bot.scheduler.add(tsk)
 
 		# Actually mute here
 		mute_id = await db.guild.get_mute_id(self.bot.pool, ctx.guild.id)
@@ -203,63 +205,46 @@ class Moderation(commands.Cog):
 				raw,
 			)
 
-			await db.task.add(self.bot.pool, tsk)
+			await self.bot.scheduler.add(tsk)
 
 		# Actually ban here
 		await member.ban(reason=reason)
 
-	@tasks.loop(seconds=5.0)
-	async def log_expired(self):
-		"""Handle mute and temp-ban expirations."""
-		now = pendulum.now(tz="UTC")
-		modlog_tasks = await db.task.get(self.bot.pool, tag=["modlog"])
-
-		if not modlog_tasks:
-			return  # no modlogs to handle
-
-		expired_logs = list(filter(lambda t: t[1] < now, modlog_tasks))
-
-		for log in expired_logs:
-			payload_raw = log[2]
-			payload: dict = payload_raw
-			log_type = ModlogTypeEnum(payload["log_type"])
-			uid: int = payload["uid"]
-			gid: int = payload["gid"]
-
-			if log_type == ModlogTypeEnum.MUTE:
-				guild = self.bot.get_guild(gid)
-				mute_id = await db.guild.get_mute_id(self.bot.pool, gid)
-				mute_role = guild.get_role(mute_id)
-
-				member = await guild.fetch_member(uid)
-				await member.remove_roles(
-					mute_role, reason="Mute expired."
-				)
-				await db.task.drop_one(self.bot.pool, log["id"])
-
-				_log.info(
-					"%s's has %s expired, reverting infraction actions...",
-					uid,
-					log_type.value,
-				)
-
-			if log_type == ModlogTypeEnum.TEMPBAN:
-				guild = self.bot.get_guild(gid)
-				user = await self.bot.fetch_user(uid)
-				await guild.unban(user, reason="Tempban expired.")
-				await db.task.drop_one(self.bot.pool, log["id"])
-
-				_log.info(
-					"%s's has %s expired, reverting infraction actions...",
-					uid,
-					log_type.value,
-				)
-
-			# _log.warning("ModLog resolution has not yet been implemented!")
-
-	@log_expired.before_loop
-	async def before_log_expired(self):
-		await self.bot.wait_until_ready()
+	async def log_expired(self, tsk: Task):
+		"""Handle mute and temp-ban expirations, see src.task_scheduler."""
+		payload: dict = tsk.payload
+		log_type = ModlogTypeEnum(payload["log_type"])
+		uid: int = payload["uid"]
+		gid: int = payload["gid"]
+
+		if log_type == ModlogTypeEnum.MUTE:
+			guild = self.bot.get_guild(gid)
+			mute_id = await db.guild.get_mute_id(self.bot.pool, gid)
+			mute_role = guild.get_role(mute_id)
+
+			member = await guild.fetch_member(uid)
+			await member.remove_roles(mute_role, reason="Mute expired.")
+			await self.bot.scheduler.drop_one(tsk.id)
+
+			_log.info(
+				"%s's has %s expired, reverting infraction actions...",
+				uid,
+				log_type.value,
+			)
+
+		if log_type == ModlogTypeEnum.TEMPBAN:
+			guild = self.bot.get_guild(gid)
+			user = await self.bot.fetch_user(uid)
+			await guild.unban(user, reason="Tempban expired.")
+			await self.bot.scheduler.drop_one(tsk.id)
+
+			_log.info(
+				"%s's has %s expired, reverting infraction actions...",
+				uid,
+				log_type.value,
+			)
+
+		# _log.warning("ModLog resolution has not yet been implemented!")
 
 	@commands.group()
 	async def set(self, ctx: Context):
@@ -6,7 +6,7 @@ from typing import TYPE_CHECKING
 
 from discord.ext import commands
 
-from src import db, levels_helper
+from src import db, frog_factory, levels_helper, utility
 
 if TYPE_CHECKING:
 	from main import CazzuBot
@@ -36,6 +36,68 @@ class Owner(commands.Cog):
 	async def init_guild(self, ctx: commands.Context):
 		await db.guild.add(self.bot.pool, db.GuildSchema(ctx.guild.id))
 
+	@commands.command()
+	async def scheduler(self, ctx: commands.Context):
+		"""Show queue depth and lag of every task tag, and frog spawn lateness."""
+		status = "\n".join(
+			[
+				self.bot.scheduler.status(),
+				frog_factory.spawn_metrics.status(),
+				self.bot.usernames.status(),
+			]
+		)
+		await ctx.reply(f"```{status}```")
+
+	@commands.command()
+	async def statements(self, ctx: commands.Context):
+		"""Show calls and latency of the busiest named database statements."""
+		await ctx.reply(f"```{db.statement.status(limit=20)}```")
+
+	@commands.group(invoke_without_command=True)
+	async def partitions(self, ctx: commands.Context):
+		"""Show the monthly partitions of the logs, with estimated row counts."""
+		lines = []
+		for table in db.partition.PARTITIONED:
+			for row in await db.partition.get_all(self.bot.pool, table):
+				lines.append(f"{row['name']:<28}{row['estimate']:>12}")
+
+		await ctx.reply("```" + "\n".join(lines) + "```")
+
+	@partitions.command(name="detach")
+	@utility.author_confirm()
+	async def partitions_detach(
+		self,
+		ctx: commands.Context,
+		table: str,
+		year: int,
+		month: int,
+		drop: bool = False,  # noqa: FBT001, FBT002
+	):
+		"""Detach a month of a log, to be archived, or drop it outright."""
+		try:
+			name = await db.partition.detach(
+				self.bot.pool, table, year, month, drop=drop
+			)
+		except ValueError as err:
+			raise commands.BadArgument(str(err)) from err
+
+		await ctx.reply(f"{'Dropped' if drop else 'Detached'} {name}")
+
+	@partitions.command(name="reclaim")
+	@utility.author_confirm()
+	async def partitions_reclaim(
+		self, ctx: commands.Context, table: str, year: int, month: int
+	):
+		"""Rewrite a compacted month of a log to shrink it, locking it meanwhile."""
+		try:
+			name = await db.partition.reclaim(
+				self.bot.pool, table, year, month
+			)
+		except ValueError as err:
+			raise commands.BadArgument(str(err)) from err
+
+		await ctx.reply(f"Rewrote {name}")
+
 	@commands.group()
 	async def calc(self, ctx: commands.Context):
 		"""Helper for calculating all things related to level."""
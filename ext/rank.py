@@ -3,14 +3,17 @@
 Remember that levels also based on experience.
 """
 
+import asyncio
+import contextlib
 import json
 import logging
 from typing import TYPE_CHECKING
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from src import db, rank, user_json, utility
+from src.rank_reconcile import Reconciliation
 from src.db.table import WindowEnum
 
 if TYPE_CHECKING:
@@ -19,10 +22,85 @@ if TYPE_CHECKING:
 
 _log = logging.getLogger(__name__)
 
+INTEGRITY_SWEEP_INTERVAL = 15  # minutes
+
 
 class Ranks(commands.Cog):
 	def __init__(self, bot):
 		self.bot: CazzuBot = bot
+		self.reconciliations: dict[
+			int, tuple[Reconciliation, asyncio.Task]
+		] = {}
+
+		self.integrity_sweep.start()
+
+	async def cog_load(self):
+		self._resume = asyncio.create_task(self._resume_reconciliations())
+
+	async def cog_unload(self):
+		"""Cancel any tasks on unload.
+
+		Reconciliations have their cursor saved, and resume on the next load.
+		"""
+		self.integrity_sweep.cancel()
+		self._resume.cancel()
+		for _, task in self.reconciliations.values():
+			task.cancel()
+
+	async def _resume_reconciliations(self):
+		await self.bot.wait_until_ready()
+
+		cursors = await db.internal.get_rank_reconcile_cursors(self.bot.pool)
+		for gid, uid in cursors.items():
+			guild = self.bot.get_guild(gid)
+			if guild is None:
+				await db.internal.del_rank_reconcile_cursor(
+					self.bot.pool, gid
+				)
+				continue
+
+			_log.info(
+				"Resuming rank reconciliation of %s after %s", gid, uid
+			)
+			self._start_reconciliation(
+				Reconciliation(self.bot, guild, after=uid)
+			)
+
+	def _start_reconciliation(self, job: Reconciliation) -> asyncio.Task:
+		gid = job.guild.id
+
+		async def run():
+			try:
+				await job.run()
+			except Exception:
+				_log.exception("Rank reconciliation of %s failed", gid)
+			finally:
+				if self.reconciliations.get(gid, (None,))[0] is job:
+					del self.reconciliations[gid]
+
+		task = asyncio.create_task(run())
+		self.reconciliations[gid] = (job, task)
+		return task
+
+	@tasks.loop(minutes=INTEGRITY_SWEEP_INTERVAL)
+	async def integrity_sweep(self):
+		"""Forget applied ranks that members no longer hold, to be redone."""
+		await self.bot.rank_integrity.sweep(self.bot)
+
+	@integrity_sweep.before_loop
+	async def before_integrity_sweep(self):
+		await self.bot.wait_until_ready()
+
+	@commands.Cog.listener()
+	async def on_member_update(
+		self, before: discord.Member, after: discord.Member
+	):
+		if before.roles != after.roles:
+			self.bot.rank_integrity.verify_member(after)
+
+	@commands.Cog.listener()
+	async def on_member_remove(self, member: discord.Member):
+		self.bot.rank_integrity.invalidate_member(member.guild.id, member.id)
 
 	async def cog_check(self, ctx: commands.Context) -> bool:
 		perms = ctx.channel.permissions_for(ctx.author)
@@ -95,6 +173,53 @@ class Ranks(commands.Cog):
 		gid = ctx.guild.id
 		await db.rank_threshold.drop(self.bot.pool, gid, mode)
 
+	@rank.group(name="reconcile", invoke_without_command=True)
+	async def rank_reconcile(self, ctx: commands.Context):
+		"""Re-apply ranks to every member of the guild, in the background.
+
+		Resumes where the last run stopped if it was interrupted.
+		"""
+		gid = ctx.guild.id
+		if gid in self.reconciliations:
+			job, _ = self.reconciliations[gid]
+			await ctx.send(job.status())
+			return
+
+		cursors = await db.internal.get_rank_reconcile_cursors(self.bot.pool)
+		progress = await ctx.send("Reconciling ranks...")
+		self._start_reconciliation(
+			Reconciliation(
+				self.bot,
+				ctx.guild,
+				after=cursors.get(gid, 0),
+				progress=progress,
+			)
+		)
+
+	@rank_reconcile.command(name="restart")
+	async def rank_reconcile_restart(self, ctx: commands.Context):
+		"""Start reconciling from the first member, ignoring any saved progress."""
+		gid = ctx.guild.id
+		if gid in self.reconciliations:
+			await ctx.send("Ranks are already being reconciled, cancel first.")
+			return
+
+		await db.internal.del_rank_reconcile_cursor(self.bot.pool, gid)
+		await self.rank_reconcile(ctx)
+
+	@rank_reconcile.command(name="cancel")
+	async def rank_reconcile_cancel(self, ctx: commands.Context):
+		"""Stop reconciling, discarding the saved progress."""
+		gid = ctx.guild.id
+		if gid in self.reconciliations:
+			job, task = self.reconciliations[gid]
+			task.cancel()
+			with contextlib.suppress(asyncio.CancelledError):
+				await task
+
+		await db.internal.del_rank_reconcile_cursor(self.bot.pool, gid)
+		await ctx.message.add_reaction("👍")
+
 	@rank.group(name="set")
 	async def rank_set(self, ctx):
 		pass
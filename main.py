@@ -29,6 +29,7 @@ from discord.utils import _ColourFormatter, stream_supports_colour
 from dotenv import load_dotenv
 
 from src.cazzubot import CazzuBot
+from src.db import statement
 from src.db.table import (
 	FrogTypeEnum,
 	MemberExpLogSourceEnum,
@@ -221,6 +222,9 @@ async def setup_codecs(con: Connection):
 		"jsonb", encoder=dumps, decoder=loads, schema="pg_catalog"
 	)
 
+	# After the codecs, which prepared statements are bound to
+	await statement.prepare(con)
+
 
 def get_script_dir() -> Path:
 	"""Return the directory of the running script regardless of CWD."""
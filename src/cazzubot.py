@@ -9,7 +9,14 @@ from asyncpg import Pool
 from discord.ext import commands
 
 from src import db
+from src.cooldown import CooldownGate
+from src.exp_ledger import ExpLedger
 from src.json_handler import CustomDecoder, CustomEncoder
+from src.leaderboard_snapshot import LeaderboardSnapshots
+from src.rank_integrity import RankIntegrity
+from src.ranking import Rankings
+from src.task_scheduler import TaskScheduler
+from src.username_resolver import UsernameResolver
 
 _log = logging.getLogger(__name__)
 
@@ -35,6 +42,13 @@ class CazzuBot(commands.Bot):
 		self.is_debug: bool = is_debug
 		self.debug_users: list[int] = debug_users
 		self.is_sandbox: bool = kwargs["is_sandbox"]
+		self.exp_cooldowns: CooldownGate = CooldownGate()
+		self.exp_ledger: ExpLedger = ExpLedger(pool, self.exp_cooldowns)
+		self.rank_integrity: RankIntegrity = RankIntegrity()
+		self.scheduler: TaskScheduler = TaskScheduler(pool, self)
+		self.leaderboards: LeaderboardSnapshots = LeaderboardSnapshots(pool)
+		self.rankings: Rankings = Rankings(pool, self.exp_ledger)
+		self.usernames: UsernameResolver = UsernameResolver(self)
 
 		if self.is_debug:
 			self.add_check(CazzuBot.is_dev_mode)
@@ -81,6 +95,12 @@ class CazzuBot(commands.Bot):
 					_log.error(traceback.format_exc())
 
 	async def setup_hook(self) -> None:
+		_log.info("Applying database migrations...")
+		await db.migration.run(self.pool)
+
+		_log.info("Creating upcoming log partitions...")
+		await db.partition.ensure(self.pool)
+
 		_log.info("Loading extensions...")
 		if not self.is_sandbox:
 			await self._load_extensions()
@@ -91,6 +111,28 @@ class CazzuBot(commands.Bot):
 		self.json_encoder = CustomEncoder()
 		self.json_decoder = CustomDecoder()
 
+		_log.info("Warming experience cooldowns...")
+		records = await db.member_exp.get_active_cooldowns(self.pool)
+		self.exp_cooldowns.warm(
+			[(r["gid"], r["uid"], r["cdr"].timestamp()) for r in records]
+		)
+
+		_log.info("Starting experience ledger...")
+		self.exp_ledger.start()
+
+		_log.info("Starting task scheduler...")
+		self.scheduler.start()
+
+	async def close(self) -> None:
+		"""Unload everything, then write out any experience still buffered."""
+		await super().close()
+
+		_log.info("Stopping task scheduler...")
+		await self.scheduler.stop()
+
+		_log.info("Flushing experience ledger...")
+		await self.exp_ledger.stop()
+
 	async def _load_sandbox(self):
 		try:
 			await self.load_extension("ext.poll")
@@ -0,0 +1,70 @@
+"""In-memory gate for experience cooldowns.
+
+Most messages in a busy channel are sent while their author is still on cooldown.
+Answering that from memory means those messages never reach the ledger, let alone the
+database.
+
+Expiries are kept in a plain dict, which remembers insertion order. Every member gets
+the same cooldown, so insertion order is also expiry order, and expired entries can
+be purged from the front until the first one still cooling down. Keeping the gate
+bounded is then a matter of dropping the oldest entries.
+
+The gate is only ever an optimization. A member missing from it is simply not
+short-circuited, and the ledger still checks their cdr.
+"""
+
+import logging
+import time
+
+_log = logging.getLogger(__name__)
+
+MAX_SIZE = 100_000
+
+
+class CooldownGate:
+	def __init__(self, max_size: int = MAX_SIZE):
+		self.max_size = max_size
+		self._expires: dict[tuple[int, int], float] = {}
+
+	def __len__(self) -> int:
+		return len(self._expires)
+
+	def is_cooling(self, gid: int, uid: int, now: float) -> bool:
+		"""Return True if the member is known to still be on cooldown.
+
+		now is a unix timestamp.
+		"""
+		expires = self._expires.get((gid, uid))
+		return expires is not None and now < expires
+
+	def set(self, gid: int, uid: int, until: float) -> None:
+		"""Put the member on cooldown until the unix timestamp until."""
+		key = (gid, uid)
+		self._expires.pop(key, None)  # re-insert at the back
+		self._expires[key] = until
+
+		self.purge(time.time())
+
+		while len(self._expires) > self.max_size:
+			del self._expires[next(iter(self._expires))]
+
+	def purge(self, now: float) -> None:
+		"""Drop expired entries from the front."""
+		while self._expires:
+			key = next(iter(self._expires))
+			if self._expires[key] > now:
+				break
+
+			del self._expires[key]
+
+	def warm(self, cooldowns: list[tuple[int, int, float]]) -> None:
+		"""Load (gid, uid, until) entries, usually still active cdr from the database."""
+		cooldowns = sorted(cooldowns, key=lambda c: c[2])[-self.max_size :]
+		for gid, uid, until in cooldowns:
+			self._expires[(gid, uid)] = until
+
+		self.purge(time.time())
+		_log.info("Warmed cooldown gate with %s members", len(self))
+
+	def clear(self) -> None:
+		self._expires.clear()
@@ -5,6 +5,8 @@ needs to define in order to operate.
 """
 
 from . import (  # noqa: F401
+	bulk,
+	cache,
 	channel,
 	frog,
 	frog_spawn,
@@ -14,11 +16,15 @@ from . import (  # noqa: F401
 	member,
 	member_exp,
 	member_exp_log,
+	member_exp_season,
 	member_frog,
 	member_frog_log,
+	migration,
 	modlog,
+	partition,
 	rank,
 	rank_threshold,
+	statement,
 	table,
 	task,
 	user,
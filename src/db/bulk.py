@@ -0,0 +1,242 @@
+"""Bulk writes through COPY, for batches of rows rather than one row at a time.
+
+Rows are copied (copy_records_to_table) into a temporary staging table of the
+connection, then moved into their table by one INSERT ... SELECT, which can still
+cast, aggregate, and resolve conflicts as a plain insert would. Each table written
+this way has an Adapter, saying how its db.table rows are staged and inserted.
+
+Columns whose type has a text codec (see setup_codecs in main.py), enums and json,
+are staged as text and cast on insert, as COPY only speaks binary.
+
+If a batch breaks a constraint, its rows are retried one at a time, so only the rows
+at fault are left out. They're returned in the BulkResult rather than raised.
+
+write() writes one batch on a connection, within the caller's transaction if there is
+one. BulkWriter buffers rows to write them in batches, making whoever puts rows wait
+while too many are buffered.
+"""
+
+import asyncio
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from enum import Enum
+
+from asyncpg import Connection, IntegrityConstraintViolationError, Pool
+
+from src.json_handler import dumps
+
+from . import table
+
+_log = logging.getLogger(__name__)
+
+BATCH_SIZE = 5_000
+MAX_PENDING = 50_000  # rows a BulkWriter buffers before put() waits
+
+
+@dataclass(frozen=True)
+class Adapter:
+	"""How rows of a db.table dataclass are written to their table.
+
+	staging declares the staging table's columns in the order the rows unpack. insert
+	moves every staged row, selected FROM staged, into the table.
+	"""
+
+	row: type[table.SnowflakeTable]
+	staging: str
+	insert: str
+
+	@property
+	def name(self) -> str:
+		return f"bulk_{self.row.__name__.lower()}"
+
+	@property
+	def columns(self) -> list[str]:
+		return [col.split()[0] for col in self.staging.split(",")]
+
+	def record(self, row: table.SnowflakeTable) -> tuple:
+		return tuple(_encode(value) for value in row)
+
+
+def _encode(value):
+	if isinstance(value, Enum):
+		return value.value
+
+	if isinstance(value, dict):
+		return dumps(value)
+
+	return value
+
+
+MEMBER_EXP_LOG = Adapter(
+	table.MemberExpLog,
+	"gid bigint, uid bigint, exp bigint, at timestamptz, source text",
+	"""
+	INSERT INTO member_exp_log (gid, uid, exp, at, source)
+	SELECT gid, uid, exp, at, source::member_exp_log_source_enum
+	FROM staged
+	""",
+)
+
+TASK = Adapter(
+	table.Task,
+	"tag character varying[], run_at timestamptz, payload text",
+	"""
+	INSERT INTO task (tag, run_at, payload)
+	SELECT tag, run_at, payload::json
+	FROM staged
+	""",
+)
+
+POLL_VOTE = Adapter(
+	table.PollVote,
+	"gid bigint, pid bigint, iid bigint, uid bigint",
+	"""
+	INSERT INTO poll_vote (gid, pid, iid, uid, count)
+	SELECT gid, pid, iid, uid, COUNT(*)
+	FROM staged
+	GROUP BY gid, pid, iid, uid
+	ON CONFLICT (gid, pid, iid, uid)
+	DO UPDATE SET count = poll_vote.count + EXCLUDED.count
+	""",
+)
+
+
+@dataclass
+class BulkResult:
+	written: list = field(default_factory=list)
+	failed: list[tuple] = field(default_factory=list)  # (row, error)
+
+	def extend(self, other: "BulkResult") -> None:
+		self.written.extend(other.written)
+		self.failed.extend(other.failed)
+
+
+async def write(
+	con: Connection, adapter: Adapter, rows: Iterable
+) -> BulkResult:
+	"""Write rows in one batch, retrying them one at a time should it fail."""
+	rows = list(rows)
+	result = BulkResult()
+	if not rows:
+		return result
+
+	await con.execute(
+		f"CREATE TEMP TABLE IF NOT EXISTS {adapter.name} ({adapter.staging})"
+	)
+
+	try:
+		await _write(con, adapter, rows)
+	except IntegrityConstraintViolationError:
+		for row in rows:
+			try:
+				await _write(con, adapter, [row])
+			except IntegrityConstraintViolationError as err:
+				_log.warning("Failed to write %s: %s", row, err)
+				result.failed.append((row, err))
+			else:
+				result.written.append(row)
+	else:
+		result.written = rows
+
+	return result
+
+
+async def _write(con: Connection, adapter: Adapter, rows: list) -> None:
+	# A savepoint if nested, so a failed batch doesn't abort the caller's transaction
+	async with con.transaction():
+		await con.copy_records_to_table(
+			adapter.name,
+			records=[adapter.record(row) for row in rows],
+			columns=adapter.columns,
+		)
+		await con.execute(
+			f"""
+			WITH staged AS (DELETE FROM {adapter.name} RETURNING *)
+			{adapter.insert}
+			"""
+		)
+
+
+class BulkWriter:
+	"""Buffers rows of one adapter, writing them BATCH_SIZE at a time.
+
+	put() waits while max_pending rows are buffered. Use as an async context manager,
+	or flush() when done, and look at result for rows which failed.
+	"""
+
+	def __init__(
+		self,
+		pool: Pool,
+		adapter: Adapter,
+		*,
+		batch_size: int = BATCH_SIZE,
+		max_pending: int = MAX_PENDING,
+	):
+		self.pool = pool
+		self.adapter = adapter
+		self.batch_size = batch_size
+		self.max_pending = max_pending
+		self.result = BulkResult()
+
+		self._rows = []
+		self._room = asyncio.Condition()
+		self._writing: asyncio.Task | None = None
+
+	def __len__(self) -> int:
+		return len(self._rows)
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.flush()
+
+	async def put(self, row: table.SnowflakeTable) -> None:
+		async with self._room:
+			await self._room.wait_for(
+				lambda: len(self._rows) < self.max_pending
+			)
+			self._rows.append(row)
+
+		if len(self._rows) >= self.batch_size:
+			self._start()
+
+	async def put_many(self, rows: Iterable) -> None:
+		for row in rows:
+			await self.put(row)
+
+	async def flush(self) -> BulkResult:
+		"""Write everything buffered, and return the result of every write so far."""
+		while self._rows or self._writing is not None:
+			await self._start()
+
+		return self.result
+
+	def _start(self) -> asyncio.Task:
+		if self._writing is None:
+			self._writing = asyncio.create_task(self._write_all())
+			self._writing.add_done_callback(self._written)
+
+		return self._writing
+
+	def _written(self, writing: asyncio.Task) -> None:
+		if not writing.cancelled() and writing.exception() is not None:
+			_log.warning(
+				"Failed to write to %s: %s",
+				self.adapter.name,
+				writing.exception(),
+			)
+
+	async def _write_all(self) -> None:
+		try:
+			while self._rows:
+				batch = self._rows[: self.batch_size]
+				async with self.pool.acquire() as con:
+					self.result.extend(await write(con, self.adapter, batch))
+
+				async with self._room:
+					del self._rows[: len(batch)]
+					self._room.notify_all()
+		finally:
+			self._writing = None
@@ -0,0 +1,106 @@
+"""Cache for per-guild settings read on hot paths.
+
+Settings like rank thresholds, level messages and quiet channels are read on every
+level or rank up, but only ever change through a handful of setters in this package.
+Getters decorated with cached() keep their result per guild, and every setter calls
+invalidate() for its namespace once its write is done. Entries also expire after TTL
+seconds as a safety net against writes made outside the bot.
+
+Cached values are handed out as deep copies, since callers such as
+utility.deep_map() format message payloads in place. Records are stored as plain dicts,
+which keep the same .get(), [key] and .values() access callers rely on.
+"""
+
+import copy
+import functools
+import logging
+import time
+
+from asyncpg import Record
+
+_log = logging.getLogger(__name__)
+
+TTL = 300  # seconds
+
+# namespace -> (gid, getter, args, kwargs) -> (expires_at, value)
+_entries: dict[str, dict[tuple, tuple[float, object]]] = {}
+
+# Bumped on every invalidation, so a fetch racing a write never caches what it read.
+# Per guild, and per namespace for invalidations of every guild.
+_generations: dict[tuple[str, int], int] = {}
+_namespace_generations: dict[str, int] = {}
+
+
+def _freeze(value):
+	"""Turn records into dicts so they can be deep copied."""
+	if isinstance(value, Record):
+		return dict(value)
+
+	if isinstance(value, list):
+		return [_freeze(v) for v in value]
+
+	return value
+
+
+def cached(namespace: str, *, copy_value: bool = True):
+	"""Decorate a getter of the form func(pool, gid, ...) to cache its result.
+
+	Place it above utility.retry(), so only what a lazily initialized row settles on is
+	cached. Pass copy_value=False only for values that are never mutated.
+	"""
+
+	def decorator(func):
+		# Getters of a namespace often take the same arguments
+		name = f"{func.__module__}.{func.__qualname__}"
+
+		@functools.wraps(func)
+		async def wrapper(pool, gid, *args, **kwargs):
+			bucket = _entries.setdefault(namespace, {})
+			key = (gid, name, args, tuple(sorted(kwargs.items())))
+			now = time.monotonic()
+
+			hit = bucket.get(key)
+			if hit is not None and hit[0] > now:
+				value = hit[1]
+			else:
+				generation = _generation(namespace, gid)
+				value = _freeze(await func(pool, gid, *args, **kwargs))
+				if generation == _generation(namespace, gid):
+					bucket[key] = (now + TTL, value)
+
+			return copy.deepcopy(value) if copy_value else value
+
+		return wrapper
+
+	return decorator
+
+
+def _generation(namespace: str, gid: int) -> tuple[int, int]:
+	return (
+		_namespace_generations.get(namespace, 0),
+		_generations.get((namespace, gid), 0),
+	)
+
+
+def invalidate(namespace: str, gid: int | None = None) -> None:
+	"""Drop a guild's cached entries in namespace, or every guild's if gid is None."""
+	bucket = _entries.get(namespace)
+
+	if gid is None:
+		_namespace_generations[namespace] = (
+			_namespace_generations.get(namespace, 0) + 1
+		)
+		if bucket:
+			bucket.clear()
+		return
+
+	_generations[(namespace, gid)] = _generations.get((namespace, gid), 0) + 1
+	if bucket:
+		for key in [k for k in bucket if k[0] == gid]:
+			del bucket[key]
+
+
+def clear() -> None:
+	"""Drop everything."""
+	for namespace in list(_entries):
+		invalidate(namespace)
@@ -4,22 +4,24 @@ import logging
 
 from asyncpg import Pool
 
-from . import table, utility
+from . import statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"channel.add",
+	"""
+	INSERT INTO channel (gid, cid)
+	VALUES ($1, $2)
+	""",
+)
+
 
 @utility.fkey_gid
 async def add(pool: Pool, payload: table.Channel):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO channel (gid, cid)
-				VALUES ($1, $2)
-				""",
-				*payload,
-			)
+			await _ADD.execute(con, *payload)
 
 
 def init():
@@ -4,40 +4,44 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import table, utility
+from . import statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"counter.add",
+	"""
+	INSERT INTO counter (gid, mid, count)
+	VALUES ($1, $2, $3)
+	""",
+)
+_GET_COUNTERS = statement.Statement(
+	"counter.get_counters",
+	"""
+	SELECT mid, count
+	FROM counter
+	WHERE gid = $1
+	""",
+)
+_UPDATE_COUNT = statement.Statement(
+	"counter.update_count",
+	"""
+	UPDATE counter
+	SET count = $2
+	WHERE mid = $1
+	""",
+)
+
 async def add(pool: Pool, payload: table.Counter):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO counter (gid, mid, count)
-				VALUES ($1, $2, $3)
-				""",
-				*payload
-			)
+			await _ADD.execute(con, *payload)
 
 async def get_counters(pool: Pool, gid: int) -> [int]:
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT mid, count
-			FROM counter
-			WHERE gid = $1
-			""",
-			gid
-		)
+		return await _GET_COUNTERS.fetch(con, gid)
 
 async def update_count(pool:Pool, mid: int, count: int):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE counter
-				SET count = $2
-				WHERE mid = $1
-				""",
-				mid, count
-			)
+			await _UPDATE_COUNT.execute(con, mid, count)
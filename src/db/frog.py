@@ -4,103 +4,120 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import table, utility
+from . import cache, statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"frog.add",
+	"""
+	INSERT INTO frog (gid)
+	VALUES ($1)
+	""",
+)
+_INIT = statement.Statement(
+	"frog.init",
+	"""
+	INSERT INTO frog (gid)
+	VALUES ($1)
+	""",
+)
+_SET_MESSAGE = statement.Statement(
+	"frog.set_message",
+	"""
+	INSERT INTO frog (gid, message)
+	VALUES($1, $2)
+	ON CONFLICT (gid) DO UPDATE SET
+		message = EXCLUDED.message
+	""",
+)
+_SET_ENABLED = statement.Statement(
+	"frog.set_enabled",
+	"""
+	INSERT INTO frog (gid, enabled)
+	VALUES($1, $2)
+	ON CONFLICT (gid) DO UPDATE SET
+		enabled = EXCLUDED.enabled
+	""",
+)
+_GET_MESSAGE = statement.Statement(
+	"frog.get_message",
+	"""
+	SELECT message
+	FROM frog
+	WHERE gid = $1
+	""",
+)
+_GET_ENABLED = statement.Statement(
+	"frog.get_enabled",
+	"""
+	SELECT enabled
+	FROM frog
+	WHERE gid = $1
+	""",
+)
+_GET_ENABLED_GUILDS = statement.Statement(
+	"frog.get_enabled_guilds",
+	"""
+	SELECT gid
+	FROM frog
+	WHERE enabled = true
+	""",
+)
+
 
 @utility.fkey_gid
 async def add(pool: Pool, payload: table.Frog) -> None:
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog (gid)
-				VALUES ($1)
-				""",
-				*payload,
-			)
+			await _ADD.execute(con, *payload)
+
+	cache.invalidate("frog", payload.gid)
 
 
 @utility.fkey_gid
 async def init(pool: Pool, gid: int, *args, **kwargs) -> None:
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog (gid)
-				VALUES ($1)
-				""",
-				gid,
-			)
+			await _INIT.execute(con, gid)
+
+	cache.invalidate("frog", gid)
 
 
 @utility.fkey_gid
 async def set_message(pool: Pool, gid: int, json_d: dict):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog (gid, message)
-				VALUES($1, $2)
-				ON CONFLICT (gid) DO UPDATE SET
-					message = EXCLUDED.message
-				""",
-				gid,
-				json_d,
-			)
+			await _SET_MESSAGE.execute(con, gid, json_d)
+
+	cache.invalidate("frog", gid)
 
 
 @utility.fkey_gid
 async def set_enabled(pool: Pool, gid: int, val: bool):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog (gid, enabled)
-				VALUES($1, $2)
-				ON CONFLICT (gid) DO UPDATE SET
-					enabled = EXCLUDED.enabled
-				""",
-				gid,
-				val,
-			)
+			await _SET_ENABLED.execute(con, gid, val)
+
+	cache.invalidate("frog", gid)
 
 
+@cache.cached("frog")
 @utility.retry(on_none=init)
 async def get_message(pool: Pool, gid: int) -> list[Record]:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT message
-			FROM frog
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_MESSAGE.fetchval(con, gid)
 
 
+@cache.cached("frog")
 @utility.retry(on_none=init)
 async def get_enabled(pool: Pool, gid: int) -> bool:
 	"""Return if frog spawns are enabled."""
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT enabled
-			FROM frog
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_ENABLED.fetchval(con, gid)
 
 
 async def get_enabled_guilds(pool: Pool) -> list[Record]:
 	"""Return all guilds who have enabled frog spawned."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT gid
-			FROM frog
-			WHERE enabled = true
-			"""
-		)
+		return await _GET_ENABLED_GUILDS.fetch(con)
@@ -4,38 +4,72 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import guild, table, utility
+from . import guild, statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"frog_spawn.add",
+	"""
+	INSERT INTO frog_spawn (gid, cid, interval, persist, fuzzy)
+	VALUES ($1, $2, $3, $4, $5)
+	""",
+)
+_UPSERT = statement.Statement(
+	"frog_spawn.upsert",
+	"""
+	INSERT INTO frog_spawn (gid, cid, interval, persist, fuzzy)
+	VALUES ($1, $2, $3, $4, $5)
+	ON CONFLICT (gid, cid) DO UPDATE SET
+		interval = EXCLUDED.interval,
+		persist = EXCLUDED.persist
+	""",
+)
+_CLEAR = statement.Statement(
+	"frog_spawn.clear",
+	"""
+	DELETE
+	FROM frog_spawn
+	WHERE gid = $1
+	""",
+)
+_GET_ALL = statement.Statement(
+	"frog_spawn.get_all",
+	"""
+	SELECT gid, cid, interval, persist, fuzzy
+	FROM frog_spawn
+	""",
+)
+_GET = statement.Statement(
+	"frog_spawn.get",
+	"""
+	SELECT gid, cid, interval, persist, fuzzy
+	FROM frog_spawn
+	WHERE gid = $1
+	""",
+)
+_SET_MESSAGE = statement.Statement(
+	"frog_spawn.set_message",
+	"""
+	UPDATE frog_spawn
+	SET message = $2
+	WHERE gid = $1
+	""",
+)
+
 
 @utility.fkey_channel
 async def add(pool: Pool, frog: table.FrogSpawn) -> None:
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog_spawn (gid, cid, interval, persist)
-				VALUES ($1, $2, $3, $4, $5)
-				""",
-				*frog,
-			)
+			await _ADD.execute(con, *frog)
 
 
 @utility.fkey_channel
 async def upsert(pool: Pool, spawn: table.FrogSpawn) -> None:
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO frog_spawn (gid, cid, interval, persist, fuzzy)
-				VALUES ($1, $2, $3, $4, $5)
-				ON CONFLICT (gid, cid) DO UPDATE SET
-					interval = EXCLUDED.interval,
-					persist = EXCLUDED.persist
-				""",
-				*spawn,
-			)
+			await _UPSERT.execute(con, *spawn)
 
 
 async def clear(pool: Pool, gid: int) -> None:
@@ -46,38 +80,19 @@ async def clear(pool: Pool, gid: int) -> None:
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE
-				FROM frog_spawn
-				WHERE gid = $1
-				""",
-				gid,
-			)
+			await _CLEAR.execute(con, gid)
 
 
 async def get_all(pool: Pool) -> list[Record]:
 	"""Get all frog settings."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT gid, cid, interval, persist, fuzzy
-			FROM frog_spawn
-			"""
-		)
+		return await _GET_ALL.fetch(con)
 
 
 async def get(pool: Pool, gid: int) -> list[Record]:
 	"""Get a guild's frog settings."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT gid, cid, interval, persist, fuzzy
-			FROM frog_spawn
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET.fetch(con, gid)
 
 
 @utility.fkey_gid
@@ -85,12 +100,4 @@ async def set_message(pool: Pool, gid: int, json_d: dict):
 	"""Set json message for on frog capture."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE frog_spawn
-				SET message = $2
-				WHERE gid = $1
-				""",
-				gid,
-				json_d,
-			)
+			await _SET_MESSAGE.execute(con, gid, json_d)
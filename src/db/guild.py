@@ -12,22 +12,64 @@ import logging
 from asyncpg import Pool, Record
 from discord.ext import commands
 
-from . import member_exp, member_exp_log, table, utility
+from . import member_exp, member_exp_log, statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"guild.add",
+	"""
+	INSERT INTO guild (gid)
+	VALUES ($1)
+	""",
+)
+_SET_MUTE_ID = statement.Statement(
+	"guild.set_mute_id",
+	"""
+	UPDATE guild
+	SET mute_role = ($1)
+	WHERE gid = $2
+	""",
+)
+_GET_MUTE_ID = statement.Statement(
+	"guild.get_mute_id",
+	"""
+	SELECT mute_role
+	FROM guild
+	WHERE gid = $1
+	""",
+)
+_GET = statement.Statement(
+	"guild.get",
+	"""
+	SELECT *
+	FROM guild
+	WHERE gid = $1
+	""",
+)
+_SET_INKTOBER_CID = statement.Statement(
+	"guild.set_inktober_cid",
+	"""
+	UPDATE guild
+	SET inktober_cid = $2
+	WHERE gid = $1
+	""",
+)
+_GET_INKTOBER_CID = statement.Statement(
+	"guild.get_inktober_cid",
+	"""
+	SELECT inktober_cid
+	FROM guild
+	WHERE gid = $1
+	""",
+)
+
 
 async def add(pool: Pool, guild: table.Guild):
 	"""Insert a new entry into guild settings with default values."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO guild (gid)
-				VALUES ($1)
-				""",
-				guild.gid,
-			)
+			await _ADD.execute(con, guild.gid)
 
 
 def req_mute_id():
@@ -46,40 +88,18 @@ async def set_mute_id(pool: Pool, gid: int, role: int):
 	"""Set the mute role on guild settings."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE guild
-				SET mute_role = ($1)
-				WHERE gid = $2
-				""",
-				role,
-				gid,
-			)
+			await _SET_MUTE_ID.execute(con, role, gid)
 
 
 async def get_mute_id(pool: Pool, gid: int) -> int:
 	"""Get a guild's mute role."""
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT mute_role
-			FROM guild
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_MUTE_ID.fetchval(con, gid)
 
 
 async def get(pool: Pool, gid: int):
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT *
-			FROM guild
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET.fetchrow(con, gid)
 
 
 async def get_members_exp_seasonal(
@@ -122,28 +142,13 @@ async def set_inktober_cid(pool: Pool, gid: int, cid: int) -> list[Record]:
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE guild
-				SET inktober_cid = $2
-				WHERE gid = $1
-				""",
-				gid,
-				cid,
-			)
+			await _SET_INKTOBER_CID.execute(con, gid, cid)
 
 
 async def get_inktober_cid(pool: Pool, gid, int) -> list[Record]:
 	"""Get inktober channel id."""
 	async with pool.acquire() as con:
-		ret = await con.fetchval(
-			"""
-			SELECT inktober_cid
-			FROM guild
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		ret = await _GET_INKTOBER_CID.fetchval(con, gid)
 
 	return ret
 
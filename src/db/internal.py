@@ -3,56 +3,179 @@
 import datetime
 import logging
 
-from asyncpg import Pool
+from asyncpg import Connection, Pool
+
+from . import statement
 
 _log = logging.getLogger(__name__)
 
+_GET_LAST_DAILY = statement.Statement(
+	"internal.get_last_daily",
+	"""
+	SELECT value
+	FROM internal
+	WHERE field = 'last_daily'
+	""",
+)
+_SET_LAST_DAILY = statement.Statement(
+	"internal.set_last_daily",
+	"""
+	INSERT INTO internal (field, value)
+	VALUES ('last_daily', $1)
+	ON CONFLICT (field) DO UPDATE SET
+		value = EXCLUDED.value
+	""",
+)
+_GET_LAST_QUARTERLY = statement.Statement(
+	"internal.get_last_quarterly",
+	"""
+	SELECT value
+	FROM internal
+	WHERE field = 'last_quarterly'
+	""",
+)
+_SET_LAST_QUARTERLY = statement.Statement(
+	"internal.set_last_quarterly",
+	"""
+	INSERT INTO internal (field, value)
+	VALUES ('last_quarterly', $1)
+	ON CONFLICT (field) DO UPDATE SET
+		value = EXCLUDED.value
+	""",
+)
+_GET_RANK_RECONCILE_CURSORS = statement.Statement(
+	"internal.get_rank_reconcile_cursors",
+	"""
+	SELECT field, value
+	FROM internal
+	WHERE field LIKE 'rank_reconcile:%'
+	""",
+)
+_SET_RANK_RECONCILE_CURSOR = statement.Statement(
+	"internal.set_rank_reconcile_cursor",
+	"""
+	INSERT INTO internal (field, value)
+	VALUES ($1, $2)
+	ON CONFLICT (field) DO UPDATE SET
+		value = EXCLUDED.value
+	""",
+)
+_DEL_RANK_RECONCILE_CURSOR = statement.Statement(
+	"internal.del_rank_reconcile_cursor",
+	"""
+	DELETE FROM internal
+	WHERE field = $1
+	""",
+)
+_GET_WATERMARK = statement.Statement(
+	"internal.get_watermark",
+	"""
+	SELECT value
+	FROM internal
+	WHERE field = $1
+	""",
+)
+_SET_WATERMARK = statement.Statement(
+	"internal.set_watermark",
+	"""
+	INSERT INTO internal (field, value)
+	VALUES ($1, $2)
+	ON CONFLICT (field) DO UPDATE SET
+		value = EXCLUDED.value
+	""",
+)
+_GET_EXP_COMPACTED_BEFORE = statement.Statement(
+	"internal.get_exp_compacted_before",
+	"""
+	SELECT value
+	FROM internal
+	WHERE field = 'exp_compacted_before'
+	""",
+)
+_SET_EXP_COMPACTED_BEFORE = statement.Statement(
+	"internal.set_exp_compacted_before",
+	"""
+	INSERT INTO internal (field, value)
+	VALUES ('exp_compacted_before', $1)
+	ON CONFLICT (field) DO UPDATE SET
+		value = EXCLUDED.value
+	""",
+)
+
 
 async def get_last_daily(pool: Pool) -> datetime.datetime:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-				SELECT value
-				FROM internal
-				WHERE field = 'last_daily'
-				"""
-		)
+		return await _GET_LAST_DAILY.fetchval(con)
 
 
 async def set_last_daily(pool: Pool, timestamp: datetime.datetime):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(	# does upsert
-				"""
-				INSERT INTO internal (field, value)
-				VALUES ('last_daily', $1)
-				ON CONFLICT (field) DO UPDATE SET
-					value = EXCLUDED.value
-				""",
-				timestamp.isoformat(),
-			)
+			await _SET_LAST_DAILY.execute(con, timestamp.isoformat())
 
 
 async def get_last_quarterly(pool: Pool) -> datetime.datetime:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-				SELECT value
-				FROM internal
-				WHERE field = 'last_quarterly'
-				"""
-		)
+		return await _GET_LAST_QUARTERLY.fetchval(con)
 
 
 async def set_last_quarterly(pool: Pool, timestamp: datetime.datetime):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(	# does upsert
-				"""
-				INSERT INTO internal (field, value)
-				VALUES ('last_quarterly', $1)
-				ON CONFLICT (field) DO UPDATE SET
-					value = EXCLUDED.value
-				""",
-				timestamp.isoformat(),
+			await _SET_LAST_QUARTERLY.execute(con, timestamp.isoformat())
+
+
+async def get_rank_reconcile_cursors(pool: Pool) -> dict[int, int]:
+	"""Return {gid: uid} of every unfinished rank reconciliation.
+
+	The uid is the last member up to which every member was handled.
+	"""
+	async with pool.acquire() as con:
+		rows = await _GET_RANK_RECONCILE_CURSORS.fetch(con)
+
+	return {
+		int(r["field"].partition(":")[2]): int(r["value"]) for r in rows
+	}
+
+
+async def set_rank_reconcile_cursor(pool: Pool, gid: int, uid: int):
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await _SET_RANK_RECONCILE_CURSOR.execute(
+				con, f"rank_reconcile:{gid}", str(uid)
+			)
+
+
+async def del_rank_reconcile_cursor(pool: Pool, gid: int):
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await _DEL_RANK_RECONCILE_CURSOR.execute(
+				con, f"rank_reconcile:{gid}"
 			)
+
+
+async def get_watermark(con: Connection, name: str) -> int:
+	"""Return the highest log id a sync has folded in, 0 if none.
+
+	Takes a connection so it can be read in the same transaction as the sync.
+	"""
+	value = await _GET_WATERMARK.fetchval(con, f"{name}_watermark")
+	return int(value) if value else 0
+
+
+async def set_watermark(con: Connection, name: str, id: int) -> None:
+	await _SET_WATERMARK.execute(con, f"{name}_watermark", str(id))
+
+
+async def get_exp_compacted_before(
+	con: Connection,
+) -> datetime.datetime | None:
+	"""Return when exp logs have been compacted up to, None if never."""
+	value = await _GET_EXP_COMPACTED_BEFORE.fetchval(con)
+	return datetime.datetime.fromisoformat(value) if value else None
+
+
+async def set_exp_compacted_before(
+	con: Connection, timestamp: datetime.datetime
+) -> None:
+	await _SET_EXP_COMPACTED_BEFORE.execute(con, timestamp.isoformat())
@@ -9,10 +9,74 @@ from asyncpg import Pool, Record
 
 from src import levels_helper
 
-from . import guild, member_exp_log, table
+from . import cache, guild, member_exp_log, statement, table
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"level.add",
+	"""
+	INSERT INTO level (gid)
+	VALUES ($1)
+	""",
+)
+_GET = statement.Statement(
+	"level.get",
+	"""
+	SELECT *
+	FROM level
+	WHERE gid = $1
+	""",
+)
+_SET_MESSAGE = statement.Statement(
+	"level.set_message",
+	"""
+	UPDATE level
+	SET message = $2
+	WHERE gid = $1
+	""",
+)
+_GET_MESSAGE = statement.Statement(
+	"level.get_message",
+	"""
+	SELECT message
+	FROM level
+	WHERE gid = $1
+	""",
+)
+_GET_LIFETIME_LEVEL = statement.Statement(
+	"level.get_lifetime_level",
+	"""
+	SELECT lifetime
+	FROM member_exp
+	WHERE gid = $1 AND uid = $2
+	""",
+)
+_ADD_QUIET = statement.Statement(
+	"level.add_quiet",
+	"""
+	UPDATE level
+	SET quiet = array_append(quiet, $2)
+	WHERE gid = $1
+	""",
+)
+_GET_QUIET = statement.Statement(
+	"level.get_quiet",
+	"""
+	SELECT quiet
+	FROM level
+	WHERE gid = $1
+	""",
+)
+_DEL_QUIET = statement.Statement(
+	"level.del_quiet",
+	"""
+	UPDATE level
+	SET quiet = array_remove(quiet, $2)
+	WHERE gid = $1
+	""",
+)
+
 
 async def add(pool: Pool, level: table.Level):
 	if not await guild.get(pool, level.gid):  # guild not yet init
@@ -20,25 +84,14 @@ async def add(pool: Pool, level: table.Level):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO level (gid)
-				VALUES ($1)
-				""",
-				*level,
-			)
+			await _ADD.execute(con, *level)
+
+	cache.invalidate("level", level.gid)
 
 
 async def get(pool: Pool, gid: int) -> list[Record]:
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT *
-			FROM level
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET.fetch(con, gid)
 
 
 async def set_message(pool: Pool, gid: int, encoded_json: str):
@@ -48,45 +101,25 @@ async def set_message(pool: Pool, gid: int, encoded_json: str):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE level
-				SET message = $2
-				WHERE gid = $1
-				""",
-				gid,
-				encoded_json,
-			)
+			await _SET_MESSAGE.execute(con, gid, encoded_json)
+
+	cache.invalidate("level", gid)
 
 
+@cache.cached("level")
 async def get_message(pool: Pool, gid: int) -> list[Record]:
 	if not await get(pool, gid):  # this not yet init
 		payload = table.Level(gid, None, None)
 		await add(pool, payload)
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT message
-			FROM level
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_MESSAGE.fetchval(con, gid)
 
 
 async def get_lifetime_level(pool: Pool, gid: int, uid: int) -> int:
 	"""Fetch and calculate level from a member's lifetime experience."""
 	async with pool.acquire() as con:
-		exp = await con.fetchval(
-			"""
-			SELECT lifetime
-			FROM member_exp
-			WHERE gid = $1 AND uid = $2
-			""",
-			gid,
-			uid,
-		)
+		exp = await _GET_LIFETIME_LEVEL.fetchval(con, gid, uid)
 
 	return levels_helper.level_from_exp(exp)
 
@@ -131,16 +164,12 @@ async def add_quiet(pool: Pool, gid: int, cid: int):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE level
-				SET quiet = array_append(quiet, $2)
-				WHERE gid = $1
-				""",
-				gid,
-				cid,
-			)
+			await _ADD_QUIET.execute(con, gid, cid)
 
+	cache.invalidate("level", gid)
+
+
+@cache.cached("level")
 async def get_quiet(pool: Pool, gid: int) -> list[int]:
 	"""Get the quiet array of quiet channels from the guild."""
 	if not await get(pool, gid):  # this not yet init
@@ -148,14 +177,7 @@ async def get_quiet(pool: Pool, gid: int) -> list[int]:
 		await add(pool, payload)
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT quiet
-			FROM level
-			WHERE gid = $1
-			""",
-			gid
-		)
+		return await _GET_QUIET.fetchval(con, gid)
 
 async def del_quiet(pool: Pool, gid: int, cid:int):
 	"""Delete the channel from the database."""
@@ -165,12 +187,6 @@ async def del_quiet(pool: Pool, gid: int, cid:int):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE level
-				SET quiet = array_remove(quiet, $2)
-				WHERE gid = $1
-				""",
-				gid,
-				cid,
-			)
+			await _DEL_QUIET.execute(con, gid, cid)
+
+	cache.invalidate("level", gid)
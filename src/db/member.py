@@ -2,25 +2,70 @@
 
 import logging
 
-from asyncpg import Pool
+from asyncpg import Connection, Pool
 
-from . import table, utility
+from . import statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ENSURE_GUILDS = statement.Statement(
+	"member.ensure_guilds",
+	"""
+	INSERT INTO guild (gid)
+	SELECT DISTINCT unnest($1::bigint[])
+	ON CONFLICT DO NOTHING
+	""",
+	hot=True,
+)
+_ENSURE_USERS = statement.Statement(
+	"member.ensure_users",
+	"""
+	INSERT INTO "user" (uid)
+	SELECT DISTINCT unnest($1::bigint[])
+	ON CONFLICT DO NOTHING
+	""",
+	hot=True,
+)
+_ENSURE_MEMBERS = statement.Statement(
+	"member.ensure_members",
+	"""
+	INSERT INTO member (gid, uid)
+	SELECT * FROM unnest($1::bigint[], $2::bigint[])
+	ON CONFLICT DO NOTHING
+	""",
+	hot=True,
+)
+_ADD = statement.Statement(
+	"member.add",
+	"""
+	INSERT INTO member (gid, uid)
+	VALUES ($1, $2)
+	""",
+)
+
 
 @utility.fkey_uid
 @utility.fkey_gid
 async def add(pool: Pool, payload: table.Member):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member (gid, uid)
-				VALUES ($1, $2)
-				""",
-				*payload,
-			)
+			await _ADD.execute(con, *payload)
+
+
+async def ensure_many(con: Connection, pairs: list[tuple[int, int]]):
+	"""Insert any missing (gid, uid) along with their guild and user.
+
+	Takes a connection rather than a pool so batched writers can satisfy foreign keys
+	inside their own transaction. Existing rows are left untouched.
+	"""
+	if not pairs:
+		return
+
+	gids, uids = zip(*set(pairs))
+
+	await _ENSURE_GUILDS.execute(con, gids)
+	await _ENSURE_USERS.execute(con, uids)
+	await _ENSURE_MEMBERS.execute(con, gids, uids)
 
 
 def init():
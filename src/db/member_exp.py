@@ -9,37 +9,150 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import table, utility
+from . import (
+	bulk,
+	internal,
+	member,
+	member_exp_season,
+	statement,
+	table,
+	utility,
+)
 
 _log = logging.getLogger(__name__)
 
+_GET_ONE = statement.Statement(
+	"member_exp.get_one",
+	"""
+	SELECT *
+	FROM member_exp
+	WHERE uid = $1 AND gid = $2
+	LIMIT 1
+	""",
+	hot=True,
+)
+_APPLY_LEDGER = statement.Statement(
+	"member_exp.apply_ledger",
+	"""
+	INSERT INTO member_exp (gid, uid, lifetime, msg_cnt, cdr, msg_day)
+	VALUES ($1, $2, $3, $4, $5, $6)
+	ON CONFLICT (gid, uid) DO UPDATE SET
+		lifetime = member_exp.lifetime + EXCLUDED.lifetime,
+		msg_cnt = EXCLUDED.msg_cnt,
+		cdr = EXCLUDED.cdr,
+		msg_day = EXCLUDED.msg_day
+	""",
+	hot=True,
+)
+_EXP_BULK_RANKED = statement.Statement(
+	"member_exp.get_exp_bulk_ranked",
+	"""
+	SELECT RANK() OVER (ORDER BY lifetime DESC) AS rank, uid, lifetime
+	FROM member_exp
+	WHERE gid = $1
+	ORDER BY lifetime DESC
+	""",
+)
+_ADD = statement.Statement(
+	"member_exp.add",
+	"""
+	INSERT INTO member_exp (gid, uid, lifetime, msg_cnt, cdr)
+	VALUES ($1, $2, $3, $4, $5)
+	""",
+)
+_GET_ACTIVE_COOLDOWNS = statement.Statement(
+	"member_exp.get_active_cooldowns",
+	"""
+	SELECT gid, uid, cdr
+	FROM member_exp
+	WHERE cdr > NOW()
+	""",
+)
+_UPDATE_EXP = statement.Statement(
+	"member_exp.update_exp",
+	"""
+	UPDATE member_exp
+	SET lifetime = $1,
+		cdr = $2,
+		msg_cnt = $3
+	WHERE uid = $4 AND gid = $5
+	""",
+)
+_SYNC_TOP = statement.Statement(
+	"member_exp.sync_top",
+	"""
+	SELECT MAX(id) FROM member_exp_log WHERE id > $1
+	""",
+)
+_SYNC = statement.Statement(
+	"member_exp.sync",
+	"""
+	UPDATE member_exp
+	SET lifetime = member_exp.lifetime + source.exp
+	FROM (
+		SELECT gid, uid, SUM(exp) AS exp
+		FROM member_exp_log
+		WHERE id > $1 AND id <= $2 AND source <> 'message'
+		GROUP BY gid, uid
+		) AS source
+	WHERE member_exp.uid = source.uid AND member_exp.gid = source.gid
+	RETURNING member_exp.gid
+	""",
+)
+_REBUILD = statement.Statement(
+	"member_exp.rebuild",
+	"""
+	UPDATE member_exp
+	SET lifetime = source.exp
+	FROM (
+		SELECT uid, gid, sum(exp) as exp
+		FROM member_exp_log
+		GROUP BY uid, gid
+		) as source
+	WHERE member_exp.uid = source.uid and member_exp.gid = source.gid
+	""",
+)
+_LOG_TOP = statement.Statement(
+	"member_exp.log_top",
+	"""
+	SELECT MAX(id) FROM member_exp_log
+	""",
+)
+_VERIFY = statement.Statement(
+	"member_exp.verify",
+	"""
+	SELECT member_exp.gid, member_exp.uid, lifetime, logged
+	FROM member_exp
+	JOIN (
+		SELECT gid, uid, SUM(exp) AS logged
+		FROM member_exp_log
+		WHERE id <= $1 OR source = 'message'
+		GROUP BY gid, uid
+		) AS source
+	ON member_exp.uid = source.uid AND member_exp.gid = source.gid
+	WHERE lifetime <> logged
+	ORDER BY member_exp.gid, member_exp.uid
+	""",
+)
+
 
 @utility.fkey_member
 async def add(pool: Pool, member_exp: table.MemberExp) -> None:
 	# Foreign constraint dependencies
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_exp (gid, uid, lifetime, msg_cnt, cdr)
-				VALUES ($1, $2, $3, $4, $5)
-				""",
-				*member_exp,
-			)
+			await _ADD.execute(con, *member_exp)
 
 
 async def get_one(pool: Pool, gid: int, uid: int) -> Record:
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT *
-			FROM member_exp
-			WHERE uid = $1 AND gid = $2
-			LIMIT 1
-			""",
-			uid,
-			gid,
-		)
+		return await _GET_ONE.fetchrow(con, uid, gid)
+
+
+async def get_active_cooldowns(pool: Pool) -> list[Record]:
+	"""Return (gid, uid, cdr) of every member whose cooldown has not expired."""
+	async with pool.acquire() as con:
+		return await _GET_ACTIVE_COOLDOWNS.fetch(con)
 
 
 async def update_exp(pool: Pool, member_exp: table.MemberExp) -> None:
@@ -49,14 +162,8 @@ async def update_exp(pool: Pool, member_exp: table.MemberExp) -> None:
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE member_exp
-				SET lifetime = $1,
-					cdr = $2,
-					msg_cnt = $3
-				WHERE uid = $4 AND gid = $5
-				""",
+			await _UPDATE_EXP.execute(
+				con,
 				member_exp.lifetime,
 				member_exp.cdr,
 				member_exp.msg_cnt,
@@ -65,6 +172,61 @@ async def update_exp(pool: Pool, member_exp: table.MemberExp) -> None:
 			)
 
 
+async def apply_ledger(
+	pool: Pool,
+	members: list[tuple],
+	logs: list[table.MemberExpLog],
+) -> list[table.MemberExpLog]:
+	"""Write a batch of buffered experience gains in one transaction.
+
+	members are (gid, uid, lifetime_gain, msg_cnt, cdr, msg_day). The gain is added
+	onto the stored lifetime, while the rest overwrite what is stored. Members that do
+	not exist yet are inserted.
+
+	Returns the logs which couldn't be written (see db.bulk). Message exp of those is
+	held back from lifetime, so lifetime stays in step with the logs until they are
+	written again.
+
+	See src.exp_ledger for where these batches come from.
+	"""
+	pairs = [(m[0], m[1]) for m in members]
+	pairs += [(log.gid, log.uid) for log in logs]
+	failed = []
+
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await member.ensure_many(con, pairs)
+
+			if logs:
+				result = await bulk.write(con, bulk.MEMBER_EXP_LOG, logs)
+				await member_exp_season.add_many(con, result.written)
+				failed = [row for row, _ in result.failed]
+
+			if failed:
+				members = _hold_back(members, failed)
+
+			if members:
+				await _APPLY_LEDGER.executemany(con, members)
+
+	return failed
+
+
+def _hold_back(
+	members: list[tuple], logs: list[table.MemberExpLog]
+) -> list[tuple]:
+	"""Take the message exp of logs off the lifetime gain of members."""
+	held = {}
+	for log in logs:
+		if log.source is table.MemberExpLogSourceEnum.MESSAGE:
+			key = (log.gid, log.uid)
+			held[key] = held.get(key, 0) + log.exp
+
+	return [
+		(gid, uid, gain - held.get((gid, uid), 0), *rest)
+		for gid, uid, gain, *rest in members
+	]
+
+
 async def create_partition_gid(pool: Pool, gid: int) -> None:
 	"""Parition the experience database by gid.
 
@@ -87,54 +249,54 @@ async def create_partition_gid(pool: Pool, gid: int) -> None:
 async def get_exp_bulk_ranked(pool: Pool, gid: int) -> list[Record]:
 	"""Get lifetime experience from given gid ordered descending."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT RANK() OVER (ORDER BY lifetime DESC) AS rank, uid, lifetime
-			FROM member_exp
-			WHERE gid = $1
-			ORDER BY lifetime DESC
-			""",
-			gid,
-		)
-
-
-async def reset_all_msg_cnt(pool: Pool):
-	"""Set all msg_cnt to 1 for daily reset."""
+		return await _EXP_BULK_RANKED.fetch(con, gid)
+
+
+async def sync_with_exp_logs(pool: Pool) -> set[int]:
+	"""Fold exp logged since the last sync into lifetime, return the gids changed.
+
+	Message exp is added to lifetime by the ledger as it's logged, so only exp from
+	other sources (frog consumption) is folded in. The highest log id folded is kept as
+	a watermark in the internal table, so each sync only reads what is new.
+	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE member_exp
-				SET msg_cnt = 1
-				"""
+			# Waits out writers mid-transaction, so no lower id commits behind us
+			await con.execute("LOCK TABLE member_exp_log IN SHARE MODE")
+
+			watermark = await internal.get_watermark(con, "exp_sync")
+			top = await _SYNC_TOP.fetchval(con, watermark)
+			if top is None:
+				return set()
+
+			changed = await _SYNC.fetch(
+				con, watermark, top
 			)
+			await internal.set_watermark(con, "exp_sync", top)
+
+	return {row["gid"] for row in changed}
 
 
-async def reset_all_cdr(pool: Pool) -> None:
-	"""Set all cdr to now."""
+async def rebuild_from_exp_logs(pool: Pool) -> None:
+	"""Sum exp per member from every exp log and set to lifetime.
+
+	Rewrites every member, prefer sync_with_exp_logs() unless verify_with_exp_logs()
+	has found drift.
+	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-					UPDATE member_exp
-					SET cdr = NOW()
-					"""
-			)
+			await con.execute("LOCK TABLE member_exp_log IN SHARE MODE")
+			await _REBUILD.execute(con)
+			top = await _LOG_TOP.fetchval(con)
+			await internal.set_watermark(con, "exp_sync", top or 0)
 
 
-async def sync_with_exp_logs(pool: Pool) -> None:
-	"""Sum exp per member from message exp logs and set to lifetime."""
+async def verify_with_exp_logs(pool: Pool) -> list[Record]:
+	"""Return (gid, uid, lifetime, logged) of members whose lifetime isn't their logs.
+
+	Only exp already folded in, up to the watermark, is compared. Nothing is written.
+	"""
 	async with pool.acquire() as con:
-		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE member_exp
-				SET lifetime = source.exp
-				FROM (
-					SELECT uid, gid, sum(exp) as exp
-					FROM member_exp_log
-					GROUP BY uid, gid
-					) as source
-				WHERE member_exp.uid = source.uid and member_exp.gid = source.gid
-				"""
-			)
+		async with con.transaction(isolation="repeatable_read"):
+			watermark = await internal.get_watermark(con, "exp_sync")
+			return await _VERIFY.fetch(con, watermark)
@@ -6,107 +6,122 @@ additional computation to calculate each member's cumulative experience per time
 
 There may potentially be a "lifetime" exp stored on the member, which can speed things.
 
-If query performance is slow, consider building and keeping an internal cache of
-pre-computed experiences.
+Seasonal totals are precomputed in member_exp_season, which is kept up to date in the
+same transaction as every insert here. Seasonal queries read from it rather than
+summing the raw rows.
 
-Partitioned by gid, indexed by date.
+Partitioned by month of at, see db.partition. Ranges of at are queried half-open
+(at >= start AND at < end), so only the months in range are scanned.
 
-We index the date to allow for speedy variable range searches. Partition by gid since
-we will always bucket logs into a particular gid.
+Months older than COMPACT_AFTER are compacted to one row per (gid, uid, day, source),
+at the start of the day (UTC), see compact(). Every query here sums over whole months
+or seasons, so their answers are the same either way.
 """
 
 import logging
 
 import pendulum
-from asyncpg import Pool
+from asyncpg import Connection, Pool, Record
 
-from . import table, utility
+from . import (
+	internal,
+	member_exp_season,
+	partition,
+	statement,
+	table,
+	utility,
+)
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"member_exp_log.add",
+	"""
+	INSERT INTO member_exp_log (gid, uid, exp, at, source)
+	VALUES ($1, $2, $3, $4, $5)
+	""",
+)
+_GET_MONTHLY = statement.Statement(
+	"member_exp_log.get_monthly",
+	"""
+	SELECT sum(exp)
+	FROM member_exp_log
+	WHERE gid = $1 AND uid = $2 AND at >= $3 AND at < $4
+	""",
+)
+_GET_TOTAL_MEMBERS = statement.Statement(
+	"member_exp_log.get_total_members",
+	"""
+	SELECT COUNT(*)
+	FROM member_exp
+	WHERE gid = $1
+	""",
+)
+_OLDEST = statement.Statement(
+	"member_exp_log.oldest",
+	"""
+	SELECT MIN(at) FROM member_exp_log
+	""",
+)
+_PARTITION_EXISTS = statement.Statement(
+	"member_exp_log.partition_exists",
+	"""
+	SELECT to_regclass($1)
+	""",
+)
+_COMPACT_MONTH = statement.Statement(
+	"member_exp_log.compact_month",
+	"""
+	WITH moved AS (
+		DELETE FROM member_exp_log
+		WHERE at >= $1 AND at < $2 AND id <= $3
+		RETURNING id, gid, uid, exp, at, source
+	), compacted AS (
+		INSERT INTO member_exp_log (id, gid, uid, exp, at, source)
+		SELECT
+			MAX(id), gid, uid, SUM(exp), date_trunc('day', at, 'UTC'), source
+		FROM moved
+		GROUP BY gid, uid, date_trunc('day', at, 'UTC'), source
+		RETURNING 1
+	)
+	SELECT (SELECT COUNT(*) FROM moved) - (SELECT COUNT(*) FROM compacted)
+	""",
+)
+_UNSYNCED_LEFT = statement.Statement(
+	"member_exp_log.unsynced_left",
+	"""
+	SELECT EXISTS (
+		SELECT 1 FROM member_exp_log
+		WHERE at >= $1 AND at < $2 AND id > $3
+	)
+	""",
+)
+_CHECKSUM = statement.Statement(
+	"member_exp_log._checksum",
+	"""
+	SELECT md5(string_agg(
+		concat_ws(':', gid, uid, day, source, exp), ','
+		ORDER BY gid, uid, day, source
+	))
+	FROM (
+		SELECT gid, uid, date_trunc('day', at, 'UTC') AS day, source, SUM(exp) AS exp
+		FROM member_exp_log
+		WHERE at >= $1 AND at < $2
+		GROUP BY gid, uid, date_trunc('day', at, 'UTC'), source
+	) AS days
+	""",
+)
+
+COMPACT_AFTER = pendulum.duration(days=90)
+
 
 @utility.fkey_member
 async def add(pool: Pool, payload: table.MemberExpLog) -> None:
 	"""Log expereience gain entry."""
-	# await create_partition(pool, payload.gid)
-
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_exp_log (gid, uid, exp, at, source)
-				VALUES ($1, $2, $3, $4, $5)
-				""",
-				*payload,
-			)
-
-
-# async def create_partition(pool: Pool, gid: int) -> None:
-#	  """Partition member exp log as needed."""
-#	  now = pendulum.now()
-#	  start = pendulum.datetime(now.year, now.month, 1)
-#	  end = start.add(months=1)
-
-#	  await create_partition_monthly(pool, start, end)
-#	  await create_index_on_date(pool, start)
-
-
-# async def create_partition_monthly(
-#	  pool: Pool, start: pendulum.DateTime, end: pendulum.DateTime
-# ) -> None:
-#	  """Parition the experience log database by this month.
-
-#	  Only creates the parition if it doesn't yet exist.
-#	  """
-#	  start_str = f"{start.year}_{start.month}"
-
-#	  async with pool.acquire() as con:
-#		  async with con.transaction():
-#			  with contextlib.suppress(InvalidObjectDefinitionError):  # Already exists
-#				  await con.execute(
-#					  f"""
-#					  CREATE TABLE IF NOT EXISTS exp_log_{start_str}
-#						  PARTITION OF member_exp_log
-#						  FOR VALUES FROM ('{start.to_date_string()}') TO ('{end.to_date_string()}')
-#					  ;
-#					  """
-#				  )
-
-
-# async def create_partition_gid(pool: Pool, gid: int, date: pendulum.DateTime) -> None:
-#	  """Parition the experience log database by gid.
-
-#	  Only creates the parition if it doesn't yet exist.
-
-#	  2023-11-2: Partitioning doesn't seem to increase performance, and perhaps seems to
-#		  bloat design. Partitioning by month makes sense, but partitioning by month and
-#		  gid? I think an index would be better suited for gid lookups...
-#	  """
-#	  start_str = f"{date.year}_{date.month}"
-
-#	  async with pool.acquire() as con:
-#		  async with con.transaction():
-#			  await con.execute(
-#				  f"""
-#				  CREATE TABLE IF NOT EXISTS exp_log_{start_str}_{gid}
-#					  PARTITION OF exp_log_{start_str}
-#					  FOR VALUES IN ({gid});
-#				  """
-#			  )
-
-
-# async def create_index_on_date(pool: Pool, date: pendulum.DateTime) -> None:
-#	  """Index the selected partition."""
-#	  start_str = f"{date.year}_{date.month}"
-
-#	  async with pool.acquire() as con:
-#		  async with con.transaction():
-#			  await con.execute(
-#				  f"""
-#				  CREATE INDEX IF NOT EXISTS idx_exp_log_{start_str}
-#				  ON exp_log_{start_str} (gid, uid)
-#				  """
-#			  )
+			await _ADD.execute(con, *payload)
+			await member_exp_season.add_many(con, [payload])
 
 
 async def get_monthly(
@@ -117,15 +132,7 @@ async def get_monthly(
 	date_end = date.add(months=1)
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			f"""
-			SELECT sum(exp)
-			FROM member_exp_log
-			WHERE gid = $1 AND uid = $2 AND at BETWEEN {date} AND {date_end}
-			""",
-			gid,
-			uid,
-		)
+		return await _GET_MONTHLY.fetchval(con, gid, uid, date, date_end)
 
 
 async def get_seasonal_by_month(
@@ -159,24 +166,7 @@ async def get_seasonal(
 		_log.error(msg)
 		raise ValueError(msg)
 
-	start_month = 1 + 3 * season  # season months start 1 4 7 10
-	interval = [pendulum.datetime(year, start_month, 1)]
-	interval.append(
-		interval[0] + pendulum.duration(months=3)
-	)  # [from, to]
-
-	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT sum(exp)
-			FROM member_exp_log
-			WHERE gid = $1 AND uid = $2 AND at BETWEEN $3 AND $4
-			""",
-			gid,
-			uid,
-			interval[0],
-			interval[1],
-		)
+	return await member_exp_season.get(pool, gid, uid, year, season)
 
 
 async def get_seasonal_bulk_ranked(
@@ -193,28 +183,29 @@ async def get_seasonal_bulk_ranked(
 		_log.error(msg)
 		raise ValueError(msg)
 
-	start_month = 1 + 3 * season  # season months start 1 4 7 10
-	interval = [pendulum.datetime(year, start_month, 1)]
-	interval.append(
-		interval[0] + pendulum.duration(months=3)
-	)  # [from, to]
+	return await member_exp_season.get_bulk_ranked(
+		pool, gid, year, season
+	)
 
-	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT RANK() OVER (ORDER BY exp_sum DESC) AS rank, uid, exp_sum
-			FROM (
-				SELECT uid, SUM(exp) AS exp_sum
-				FROM member_exp_log
-				WHERE gid = $1 AND at BETWEEN $2 AND $3
-				GROUP BY uid
-			) AS subquery
-			ORDER BY exp_sum DESC;
-			""",
-			gid,
-			interval[0],
-			interval[1],
-		)
+
+async def get_focus_window(
+	pool: Pool, gid: int, uid: int, year: int, season: int, size: int = 2
+) -> list[Record]:
+	"""Fetch the member's row of the ranked season and size rows either side of it.
+
+	Seasons start from 0 and go to to 3.
+
+	Return records are 'formatted' as records [[rank, uid, exp, total]], where total
+	is the count of all participants this season.
+	"""
+	if season < 0 or season > 3:  # noqa: PLR2004
+		msg = "Seasons must be in the range of 0-3"
+		_log.error(msg)
+		raise ValueError(msg)
+
+	return await member_exp_season.get_focus_window(
+		pool, gid, uid, year, season, size
+	)
 
 
 async def get_seasonal_total_members(
@@ -226,26 +217,9 @@ async def get_seasonal_total_members(
 		_log.error(msg)
 		raise ValueError(msg)
 
-	start_month = 1 + 3 * season  # season months start 1 4 7 10
-	interval = [pendulum.datetime(year, start_month, 1)]
-	interval.append(
-		interval[0] + pendulum.duration(months=3)
-	)  # [from, to]
-
-	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT COUNT(*)
-			FROM (
-				SELECT DISTINCT uid
-				FROM member_exp_log
-				WHERE gid = $1 AND at BETWEEN $2 AND $3
-			)
-			""",
-			gid,
-			interval[0],
-			interval[1],
-		)
+	return await member_exp_season.get_total_members(
+		pool, gid, year, season
+	)
 
 
 async def get_seasonal_total_members_by_month(
@@ -262,11 +236,91 @@ async def get_total_members(
 	gid: int,
 ) -> int:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT COUNT(*)
-			FROM member_exp
-			WHERE gid = $1
-			""",
-			gid,
+		return await _GET_TOTAL_MEMBERS.fetchval(con, gid)
+
+
+async def compact(
+	pool: Pool,
+	now: pendulum.DateTime = None,
+	*,
+	after: pendulum.Duration = COMPACT_AFTER,
+) -> int:
+	"""Compact every month which ended more than after ago, return rows removed.
+
+	Only logs already folded into lifetime exp (see member_exp.sync_with_exp_logs)
+	are compacted, each day's row keeping the highest id of the rows it replaces, so
+	the sync watermark still holds. A month with logs yet to be synced is compacted
+	again on a later run, and holds back the months after it until then.
+
+	Each month is compacted in its own transaction, and rolled back should its
+	per-day sums not match afterwards. The partition is then vacuumed, which doesn't
+	block the log, but only shrinks it on disk once rewritten by partition.reclaim().
+	"""
+	now = now or pendulum.now("UTC")
+	horizon = now - after
+
+	async with pool.acquire() as con:
+		start = await internal.get_exp_compacted_before(con)
+		if start is None:
+			start = await _OLDEST.fetchval(con)
+			if start is None:
+				return 0
+
+		start = pendulum.instance(start).in_tz("UTC").start_of("month")
+
+		removed = 0
+		while start.add(months=1) <= horizon:
+			rows, done = await _compact_month(con, start)
+			removed += rows
+
+			name = partition.partition_name(
+				"member_exp_log", start.year, start.month
+			)
+			if rows and await _PARTITION_EXISTS.fetchval(con, name):
+				await con.execute(f"VACUUM (ANALYZE) {name}")
+
+			if not done:
+				_log.info(
+					"Exp logs of %s aren't all synced yet, compacting them later",
+					f"{start:%Y-%m}",
+				)
+				break
+
+			start = start.add(months=1)
+
+	return removed
+
+
+async def _compact_month(
+	con: Connection, start: pendulum.DateTime
+) -> tuple[int, bool]:
+	"""Return rows removed, and whether every log of the month is compacted."""
+	end = start.add(months=1)
+
+	async with con.transaction():
+		watermark = await internal.get_watermark(con, "exp_sync")
+		checksum = await _checksum(con, start, end)
+
+		rows = await _COMPACT_MONTH.fetchval(con, start, end, watermark)
+
+		if await _checksum(con, start, end) != checksum:
+			msg = f"Compacting exp logs of {start:%Y-%m} changed their sums"
+			raise RuntimeError(msg)
+
+		done = not await _UNSYNCED_LEFT.fetchval(
+			con, start, end, watermark
 		)
+		if done:
+			await internal.set_exp_compacted_before(con, end)
+
+	_log.info(
+		"Compacted exp logs of %s, %s rows removed", f"{start:%Y-%m}", rows
+	)
+	return rows, done
+
+
+async def _checksum(
+	con: Connection, start: pendulum.DateTime, end: pendulum.DateTime
+) -> str:
+	"""Return a digest of the exp of every (gid, uid, day, source) in [start, end)."""
+	return await _CHECKSUM.fetchval(con, start, end)
@@ -0,0 +1,179 @@
+"""Manages the seasonal rollup of member experience.
+
+member_exp_log keeps one row per gain, which made every seasonal query a SUM over
+everything a guild logged that season. This table keeps the running total per
+(gid, uid, year, season) instead. It is updated in the same transaction as the log
+rows it summarizes, so the two never disagree.
+
+Seasons start from 0 and go to 3, and are bucketed on UTC.
+"""
+
+import datetime
+import logging
+from collections import defaultdict
+
+from asyncpg import Connection, Pool, Record
+
+from . import statement, table
+
+_log = logging.getLogger(__name__)
+
+_ADD_MANY = statement.Statement(
+	"member_exp_season.add_many",
+	"""
+	INSERT INTO member_exp_season (gid, uid, year, season, exp)
+	VALUES ($1, $2, $3, $4, $5)
+	ON CONFLICT (gid, uid, year, season) DO UPDATE SET
+		exp = member_exp_season.exp + EXCLUDED.exp
+	""",
+	hot=True,
+)
+_GET = statement.Statement(
+	"member_exp_season.get",
+	"""
+	SELECT exp
+	FROM member_exp_season
+	WHERE gid = $1 AND uid = $2 AND year = $3 AND season = $4
+	""",
+	hot=True,
+)
+_GET_BULK_RANKED = statement.Statement(
+	"member_exp_season.get_bulk_ranked",
+	"""
+	SELECT RANK() OVER (ORDER BY exp DESC) AS rank, uid, exp AS exp_sum
+	FROM member_exp_season
+	WHERE gid = $1 AND year = $2 AND season = $3
+	ORDER BY exp DESC
+	""",
+)
+_GET_FOCUS_WINDOW = statement.Statement(
+	"member_exp_season.get_focus_window",
+	"""
+	WITH ranked AS (
+		SELECT
+			RANK() OVER (ORDER BY exp DESC) AS rank,
+			ROW_NUMBER() OVER (ORDER BY exp DESC, uid) AS pos,
+			COUNT(*) OVER () AS total,
+			uid,
+			exp
+		FROM member_exp_season
+		WHERE gid = $1 AND year = $3 AND season = $4
+	), focus AS (
+		SELECT GREATEST(1, LEAST(pos - $5, total - 2 * $5)) AS lower
+		FROM ranked
+		WHERE uid = $2
+	)
+	SELECT rank, uid, exp AS exp_sum, total
+	FROM ranked, focus
+	WHERE pos BETWEEN focus.lower AND focus.lower + 2 * $5
+	ORDER BY pos
+	""",
+	hot=True,
+)
+_GET_TOTAL_MEMBERS = statement.Statement(
+	"member_exp_season.get_total_members",
+	"""
+	SELECT COUNT(*)
+	FROM member_exp_season
+	WHERE gid = $1 AND year = $2 AND season = $3
+	""",
+)
+_CLEAR = statement.Statement(
+	"member_exp_season.clear",
+	"""
+	DELETE FROM member_exp_season
+	""",
+)
+_BACKFILL = statement.Statement(
+	"member_exp_season.backfill",
+	"""
+	INSERT INTO member_exp_season (gid, uid, year, season, exp)
+	SELECT
+		gid,
+		uid,
+		EXTRACT(YEAR FROM at AT TIME ZONE 'UTC')::int,
+		(EXTRACT(MONTH FROM at AT TIME ZONE 'UTC')::int - 1) / 3,
+		SUM(exp)
+	FROM member_exp_log
+	GROUP BY 1, 2, 3, 4
+	""",
+)
+
+
+def season_of(at) -> tuple[int, int]:
+	"""Return the (year, season) a timestamp is bucketed into."""
+	if at.tzinfo is not None:
+		at = at.astimezone(datetime.timezone.utc)
+
+	return at.year, (at.month - 1) // 3
+
+
+async def add_many(con: Connection, logs: list[table.MemberExpLog]) -> None:
+	"""Fold freshly inserted log rows into the rollup.
+
+	Takes a connection so it can be called inside the transaction inserting the logs.
+	"""
+	totals = defaultdict(int)
+	for log in logs:
+		year, season = season_of(log.at)
+		totals[(log.gid, log.uid, year, season)] += log.exp
+
+	if not totals:
+		return
+
+	# Stable ordering so concurrent writers lock rows in the same order.
+	rows = [(*key, exp) for key, exp in sorted(totals.items())]
+
+	await _ADD_MANY.executemany(con, rows)
+
+
+async def get(pool: Pool, gid: int, uid: int, year: int, season: int) -> int:
+	"""Return a member's exp for the season, None if they have none logged."""
+	async with pool.acquire() as con:
+		return await _GET.fetchval(con, gid, uid, year, season)
+
+
+async def get_bulk_ranked(
+	pool: Pool, gid: int, year: int, season: int
+) -> list[Record]:
+	"""Return [[rank, uid, exp_sum]] of a guild's season, ordered descending."""
+	async with pool.acquire() as con:
+		return await _GET_BULK_RANKED.fetch(con, gid, year, season)
+
+
+async def get_focus_window(
+	pool: Pool, gid: int, uid: int, year: int, season: int, size: int
+) -> list[Record]:
+	"""Return [[rank, uid, exp_sum, total]] of the member and size others either side.
+
+	Like leaderboard.create_focus_subset, the window is shifted rather than cut short
+	at either end of the leaderboard. total is how many members are ranked. Empty if
+	the member has no exp this season.
+	"""
+	async with pool.acquire() as con:
+		return await _GET_FOCUS_WINDOW.fetch(
+			con, gid, uid, year, season, size
+		)
+
+
+async def get_total_members(
+	pool: Pool, gid: int, year: int, season: int
+) -> int:
+	"""Return the count of members who gained exp during the season."""
+	async with pool.acquire() as con:
+		return await _GET_TOTAL_MEMBERS.fetchval(con, gid, year, season)
+
+
+async def backfill(pool: Pool) -> None:
+	"""Rebuild the whole rollup from member_exp_log.
+
+	The rollup is locked first, so log writers wait for the rebuild and are then folded
+	in on top of it rather than counted twice or lost.
+	"""
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await con.execute(
+				"LOCK TABLE member_exp_season IN EXCLUSIVE MODE"
+			)
+			await _CLEAR.execute(con)
+			await _BACKFILL.execute(con)
@@ -2,39 +2,183 @@
 
 import logging
 
-from asyncpg import Pool, Record
+import pendulum
+from asyncpg import ForeignKeyViolationError, Pool, Record
+from pendulum import DateTime
 
-from . import member_frog_log, table, utility
+from . import internal, member, member_frog_log, statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+# Frog types are columns, so these are declared once per type
+_MODIFY_FROG = {
+	frog_type: statement.Statement(
+		f"member_frog.modify_frog.{frog_type.value}",
+		f"""
+		INSERT INTO member_frog (gid, uid, {frog_type.value})
+		VALUES ($1, $2, $3)
+		ON CONFLICT (gid, uid) DO UPDATE SET
+			{frog_type.value} = member_frog.{frog_type.value} + $3
+		""",
+	)
+	for frog_type in table.FrogTypeEnum
+}
+_RECORD_CAPTURE = {
+	frog_type: statement.Statement(
+		f"member_frog.record_capture.{frog_type.value}",
+		f"""
+		WITH logged AS (
+			INSERT INTO member_frog_log (gid, uid, type, at, waited_for)
+			VALUES ($1, $2, $3, $4, $5)
+		), inventory AS (
+			INSERT INTO member_frog (gid, uid, {frog_type.value}, capture)
+			VALUES ($1, $2, 1, 1)
+			ON CONFLICT (gid, uid) DO UPDATE SET
+				{frog_type.value} = member_frog.{frog_type.value} + 1,
+				capture = member_frog.capture + 1
+			RETURNING {frog_type.value} AS frogs, capture
+		)
+		SELECT
+			inventory.frogs,
+			inventory.capture,
+			(
+				SELECT COUNT(*)
+				FROM member_frog_log
+				WHERE gid = $1 AND uid = $2 AND at >= $6 AND at < $7
+			) + 1 AS seasonal
+		FROM inventory
+		""",
+		hot=True,
+	)
+	for frog_type in table.FrogTypeEnum
+}
+_GET_FROGS = {
+	frog_type: statement.Statement(
+		f"member_frog.get_frogs.{frog_type.value}",
+		f"""
+		SELECT {frog_type.value}
+		FROM member_frog
+		WHERE gid = $1 AND uid = $2
+		""",
+		hot=True,
+	)
+	for frog_type in table.FrogTypeEnum
+}
+_ALL_RANKED = statement.Statement(
+	"member_frog.get_all_member_frogs_ranked",
+	"""
+	SELECT RANK() OVER (ORDER BY capture DESC) AS rank, uid, capture
+	FROM member_frog
+	WHERE gid = $1
+	ORDER BY capture DESC
+	""",
+)
+_ADD = statement.Statement(
+	"member_frog.add",
+	"""
+	INSERT INTO member_frog (gid, uid, normal, frozen)
+	VALUES ($1, $2, $3, $4)
+	""",
+)
+_UPSERT = statement.Statement(
+	"member_frog.upsert",
+	"""
+	INSERT INTO member_frog (gid, uid, frog)
+	VALUES ($1, $2, $3)
+	ON CONFLICT (gid, uid) DO UPDATE SET
+		frog = EXCLUDED.frog
+	""",
+)
+_MODIFY_CAPTURE = statement.Statement(
+	"member_frog.modify_capture",
+	"""
+	INSERT INTO member_frog (gid, uid, capture)
+	VALUES ($1, $2, $3)
+	ON CONFLICT (gid, uid) DO UPDATE SET
+		capture = member_frog.capture + $3
+	""",
+)
+_SYNC_TOP = statement.Statement(
+	"member_frog.sync_top",
+	"""
+	SELECT MAX(id) FROM member_frog_log WHERE id > $1
+	""",
+)
+_SYNC = statement.Statement(
+	"member_frog.sync",
+	"""
+	UPDATE member_frog
+	SET capture = source.capture
+	FROM (
+		SELECT gid, uid, COUNT(*) as capture
+		FROM member_frog_log
+		WHERE (gid, uid) IN (
+			SELECT gid, uid
+			FROM member_frog_log
+			WHERE id > $1 AND id <= $2
+		)
+		GROUP BY uid, gid
+		) as source
+	WHERE member_frog.uid = source.uid and member_frog.gid = source.gid
+	RETURNING member_frog.gid
+	""",
+)
+_REBUILD = statement.Statement(
+	"member_frog.rebuild",
+	"""
+	UPDATE member_frog
+	SET capture = source.capture
+	FROM (
+		SELECT gid, uid, COUNT(*) as capture
+		FROM member_frog_log
+		GROUP BY uid, gid
+		) as source
+	WHERE member_frog.uid = source.uid and member_frog.gid = source.gid
+	""",
+)
+_LOG_TOP = statement.Statement(
+	"member_frog.log_top",
+	"""
+	SELECT MAX(id) FROM member_frog_log
+	""",
+)
+_VERIFY = statement.Statement(
+	"member_frog.verify",
+	"""
+	SELECT member_frog.gid, member_frog.uid, capture, logged
+	FROM member_frog
+	JOIN (
+		SELECT gid, uid, COUNT(*) AS logged
+		FROM member_frog_log
+		GROUP BY gid, uid
+		) AS source
+	ON member_frog.uid = source.uid AND member_frog.gid = source.gid
+	WHERE capture <> logged
+	ORDER BY member_frog.gid, member_frog.uid
+	""",
+)
+_FREEZE_FROGS = statement.Statement(
+	"member_frog.freeze_frogs",
+	"""
+	UPDATE member_frog
+	SET frozen = frozen + normal,
+		normal = 1
+	""",
+)
+
 
 @utility.fkey_member
 async def add(pool: Pool, payload: table.MemberFrog):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_frog (gid, uid, normal, frozen)
-				VALUES ($1, $2, $3, $4)
-				""",
-				*payload,
-			)
+			await _ADD.execute(con, *payload)
 
 
 @utility.fkey_member
 async def upsert(pool: Pool, payload: table.MemberFrog):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_frog (gid, uid, frog)
-				VALUES ($1, $2, $3)
-				ON CONFLICT (gid, uid) DO UPDATE SET
-					frog = EXCLUDED.frog
-				""",
-				*payload,
-			)
+			await _UPSERT.execute(con, *payload)
 
 
 @utility.fkey_member
@@ -49,17 +193,7 @@ async def modify_frog(
 	"""Upsert a member's inventory of frogs."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				f"""
-				INSERT INTO member_frog (gid, uid, {frog_type.value})
-				VALUES ($1, $2, $3)
-				ON CONFLICT (gid, uid) DO UPDATE SET
-					{frog_type.value} = member_frog.{frog_type.value} + $3
-				""",
-				gid,
-				uid,
-				modify,
-			)
+			await _MODIFY_FROG[frog_type].execute(con, gid, uid, modify)
 
 
 @utility.fkey_member
@@ -72,17 +206,51 @@ async def modify_capture(
 	"""Upsert a member's lifetime capture."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_frog (gid, uid, capture)
-				VALUES ($1, $2, $3)
-				ON CONFLICT (gid, uid) DO UPDATE SET
-					capture = member_frog.capture + $3
-				""",
-				gid,
-				uid,
-				modify,
-			)
+			await _MODIFY_CAPTURE.execute(con, gid, uid, modify)
+
+
+async def record_capture(
+	pool: Pool,
+	gid: int,
+	uid: int,
+	frog_type: table.FrogTypeEnum,
+	at: DateTime,
+	waited_for: float,
+) -> Record:
+	"""Log a capture and count it towards a member's inventory and lifetime capture.
+
+	Returns the member's new inventory of frog_type as frogs, lifetime captures as
+	capture and captures this season as seasonal, all in one statement. The seasonal
+	count can't see the log row inserted alongside it, so it's counted as the + 1.
+
+	Like fkey_member, the member is only created should the foreign keys fail.
+	"""
+	at = pendulum.instance(at).in_tz("UTC")
+	start = pendulum.datetime(at.year, 1 + 3 * ((at.month - 1) // 3), 1)
+	end = start.add(months=3)
+
+	async def record():
+		async with pool.acquire() as con:
+			async with con.transaction():
+				return await _RECORD_CAPTURE[frog_type].fetchrow(
+					con,
+					gid,
+					uid,
+					frog_type,
+					at,
+					waited_for,
+					start,
+					end,
+				)
+
+	try:
+		return await record()
+	except ForeignKeyViolationError:
+		async with pool.acquire() as con:
+			async with con.transaction():
+				await member.ensure_many(con, [(gid, uid)])
+
+		return await record()
 
 
 async def get_frogs(
@@ -93,15 +261,7 @@ async def get_frogs(
 ) -> int:
 	"""Return the total amount of normal frogs a user has."""
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			f"""
-			SELECT {frog_type.value}
-			FROM member_frog
-			WHERE gid = $1 AND uid = $2
-			""",
-			gid,
-			uid,
-		)
+		return await _GET_FROGS[frog_type].fetchval(con, gid, uid)
 
 
 async def get_members_frog_seasonal(
@@ -134,33 +294,53 @@ async def get_all_member_frogs_ranked(
 ) -> list[Record]:
 	"""Return all member's frog information for a guild."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-				SELECT RANK() OVER (ORDER BY capture DESC) AS rank, uid, capture
-				FROM member_frog
-				WHERE gid = $1
-				ORDER BY capture DESC
-				""",
-			gid,
-		)
+		return await _ALL_RANKED.fetch(con, gid)
 
 
-async def sync_with_frog_logs(pool: Pool) -> None:
-	"""Sum count frogs and set to lifetime."""
+async def sync_with_frog_logs(pool: Pool) -> set[int]:
+	"""Recount lifetime captures of members who captured since the last sync.
+
+	Returns the gids of the members recounted.
+
+	Captures are counted as they're logged (see record_capture), so this only repairs
+	drift of active members. The highest log id seen is kept as a watermark in the
+	internal table, so each sync only looks at what is new.
+	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE member_frog
-				SET capture = source.capture
-				FROM (
-					SELECT gid, uid, COUNT(*) as capture
-					FROM member_frog_log
-					GROUP BY uid, gid
-					) as source
-				WHERE member_frog.uid = source.uid and member_frog.gid = source.gid
-				"""
+			# Waits out writers mid-transaction, so no lower id commits behind us
+			await con.execute("LOCK TABLE member_frog_log IN SHARE MODE")
+
+			watermark = await internal.get_watermark(con, "frog_sync")
+			top = await _SYNC_TOP.fetchval(con, watermark)
+			if top is None:
+				return set()
+
+			changed = await _SYNC.fetch(
+				con, watermark, top
 			)
+			await internal.set_watermark(con, "frog_sync", top)
+
+	return {row["gid"] for row in changed}
+
+
+async def rebuild_from_frog_logs(pool: Pool) -> None:
+	"""Count captures of every member from the logs and set to lifetime."""
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await con.execute("LOCK TABLE member_frog_log IN SHARE MODE")
+			await _REBUILD.execute(con)
+			top = await _LOG_TOP.fetchval(con)
+			await internal.set_watermark(con, "frog_sync", top or 0)
+
+
+async def verify_with_frog_logs(pool: Pool) -> list[Record]:
+	"""Return (gid, uid, capture, logged) of members whose capture isn't their logs.
+
+	Nothing is written.
+	"""
+	async with pool.acquire() as con:
+		return await _VERIFY.fetch(con)
 
 
 async def freeze_frogs(pool: Pool):
@@ -173,8 +353,4 @@ async def freeze_frogs(pool: Pool):
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute("""
-			UPDATE member_frog
-			SET frozen = frozen + normal,
-				normal = 1
-			""")
+			await _FREEZE_FROGS.execute(con)
@@ -1,6 +1,7 @@
 """Manages everything related to logging frog captures.
 
-Similar to member_frog_log, we partition by gid and index by date.
+Partitioned by month of at, see db.partition. Ranges of at are queried half-open
+(at >= start AND at < end), so a season only scans its three months.
 """
 
 import logging
@@ -8,71 +9,73 @@ import logging
 import pendulum
 from asyncpg import Pool
 
-from . import table, utility
+from . import statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_GET_SEASONAL = statement.Statement(
+	"member_frog_log.get_seasonal",
+	"""
+	SELECT COUNT(*)
+	FROM member_frog_log
+	WHERE gid = $1 AND uid = $2 AND at >= $3 AND at < $4
+	""",
+)
+_GET_SEASONAL_BULK_RANKED = statement.Statement(
+	"member_frog_log.get_seasonal_bulk_ranked",
+	"""
+	SELECT RANK() OVER (ORDER BY capture_count DESC) AS rank, uid, capture_count
+	FROM (
+		SELECT uid, COUNT(*) AS capture_count
+		FROM member_frog_log
+		WHERE gid = $1 AND at >= $2 AND at < $3
+		GROUP BY uid
+	) AS subquery
+	ORDER BY capture_count DESC
+	""",
+)
+_GET_SEASONAL_TOTAL_MEMBERS = statement.Statement(
+	"member_frog_log.get_seasonal_total_members",
+	"""
+	SELECT COUNT(*)
+	FROM (
+		SELECT DISTINCT uid
+		FROM member_frog_log
+		WHERE gid = $1 AND at >= $2 AND at < $3
+	)
+	""",
+)
+_ADD = statement.Statement(
+	"member_frog_log.add",
+	"""
+	INSERT INTO member_frog_log (gid, uid, type, at, waited_for)
+	VALUES ($1, $2, $3, $4, $5)
+	""",
+)
+_GET_MONTHLY = statement.Statement(
+	"member_frog_log.get_monthly",
+	"""
+	SELECT count(*)
+	FROM member_frog_log
+	WHERE gid = $1 AND uid = $2 AND at >= $3 AND at < $4
+	""",
+)
+_GET_TOTAL_MEMBERS = statement.Statement(
+	"member_frog_log.get_total_members",
+	"""
+	SELECT COUNT(*)
+	FROM member_frog
+	WHERE gid = $1
+	""",
+)
+
 
 @utility.fkey_member
 async def add(pool: Pool, payload: table.MemberFrogLog) -> None:
 	"""Log frog capture."""
-	# await create_partition(pool, payload.gid)
-
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO member_frog_log (gid, uid, type, at, waited_for)
-				VALUES ($1, $2, $3, $4, $5)
-				""",
-				*payload,
-			)
-
-
-# async def create_partition(pool: Pool, gid: int) -> None:
-#	  """Partition member frog log as needed."""
-#	  now = pendulum.now()
-#	  start = pendulum.datetime(now.year, now.month, 1)
-#	  end = start.add(months=1)
-
-#	  await create_partition_monthly(pool, start, end)
-#	  await create_index_on_date(pool, start)
-
-
-# async def create_partition_monthly(
-#	  pool: Pool, start: pendulum.DateTime, end: pendulum.DateTime
-# ) -> None:
-#	  """Parition the frog capture log database by this month.
-
-#	  Only creates the parition if it doesn't yet exist.
-#	  """
-#	  start_str = f"{start.year}_{start.month}"
-
-#	  async with pool.acquire() as con:
-#		  async with con.transaction():
-#			  with contextlib.suppress(InvalidObjectDefinitionError):  # Already exists
-#				  await con.execute(
-#					  f"""
-#					  CREATE TABLE IF NOT EXISTS frog_log_{start_str}
-#						  PARTITION OF member_frog_log
-#						  FOR VALUES FROM ('{start.to_date_string()}') TO ('{end.to_date_string()}')
-#					  ;
-#					  """
-#				  )
-
-
-# async def create_index_on_date(pool: Pool, date: pendulum.DateTime) -> None:
-#	  """Index the selected partition."""
-#	  start_str = f"{date.year}_{date.month}"
-
-#	  async with pool.acquire() as con:
-#		  async with con.transaction():
-#			  await con.execute(
-#				  f"""
-#				  CREATE INDEX IF NOT EXISTS idx_frog_log_{start_str}
-#				  ON frog_log_{start_str} (gid, uid)
-#				  """
-#			  )
+			await _ADD.execute(con, *payload)
 
 
 async def get_monthly(
@@ -83,19 +86,10 @@ async def get_monthly(
 	!! CURRENTLY DOES NOT DISCRIMINIATE BETWEEN FROG TYPES !!
 	"""
 	date = pendulum.datetime(year, month, 1)
-	date_end = date.add(months=3)
-	date_str = f"{date.year}_{date.month}"
+	date_end = date.add(months=1)
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			f"""
-			SELECT count(*)
-			FROM member_frog_log
-			WHERE gid = $1 AND uid = $2 AND at BETWEEN {date} AND {date_end}
-			""",
-			gid,
-			uid,
-		)
+		return await _GET_MONTHLY.fetchval(con, gid, uid, date, date_end)
 
 
 async def get_seasonal_by_month(
@@ -140,16 +134,8 @@ async def get_seasonal(
 	)  # [from, to]
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT COUNT(*)
-			FROM member_frog_log
-			WHERE gid = $1 AND uid = $2 AND at BETWEEN $3 AND $4
-			""",
-			gid,
-			uid,
-			interval[0],
-			interval[1],
+		return await _GET_SEASONAL.fetchval(
+			con, gid, uid, interval[0], interval[1]
 		)
 
 
@@ -174,20 +160,8 @@ async def get_seasonal_bulk_ranked(
 	)  # [from, to]
 
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT RANK() OVER (ORDER BY capture_count DESC) AS rank, uid, capture_count
-			FROM (
-				SELECT uid, COUNT(*) AS capture_count
-				FROM member_frog_log
-				WHERE gid = $1 AND at BETWEEN $2 AND $3
-				GROUP BY uid
-			) AS subquery
-			ORDER BY capture_count DESC;
-			""",
-			gid,
-			interval[0],
-			interval[1],
+		return await _GET_SEASONAL_BULK_RANKED.fetch(
+			con, gid, interval[0], interval[1]
 		)
 
 
@@ -207,18 +181,8 @@ async def get_seasonal_total_members(
 	)  # [from, to]
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT COUNT(*)
-			FROM (
-				SELECT DISTINCT uid
-				FROM member_frog_log
-				WHERE gid = $1 AND at BETWEEN $2 AND $3
-			)
-			""",
-			gid,
-			interval[0],
-			interval[1],
+		return await _GET_SEASONAL_TOTAL_MEMBERS.fetchval(
+			con, gid, interval[0], interval[1]
 		)
 
 
@@ -236,11 +200,4 @@ async def get_total_members(
 	gid: int,
 ) -> int:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT COUNT(*)
-			FROM member_frog
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_TOTAL_MEMBERS.fetchval(con, gid)
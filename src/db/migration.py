@@ -0,0 +1,243 @@
+"""Versioned schema changes, applied when the bot starts.
+
+The bot does not create its base schema (see the readme), but anything it adds on top
+of it is declared here so every deployment ends up with the same tables. Migrations
+run once each, in order, each inside its own transaction. The last version applied is
+stored in the internal table under 'schema_version'.
+
+Never edit a migration that has shipped, append a new one instead.
+"""
+
+import logging
+
+from asyncpg import Pool
+
+from . import statement
+
+_log = logging.getLogger(__name__)
+
+
+# (version, description, sql)
+MIGRATIONS: list[tuple[int, str, str]] = [
+	(
+		1,
+		"seasonal exp rollup",
+		"""
+		CREATE TABLE IF NOT EXISTS member_exp_season (
+			gid bigint NOT NULL,
+			uid bigint NOT NULL,
+			year integer NOT NULL,
+			season integer NOT NULL,
+			exp bigint NOT NULL DEFAULT 0,
+			PRIMARY KEY (gid, uid, year, season)
+		);
+
+		CREATE INDEX IF NOT EXISTS idx_member_exp_season_ranked
+		ON member_exp_season (gid, year, season, exp DESC);
+
+		INSERT INTO member_exp_season (gid, uid, year, season, exp)
+		SELECT
+			gid,
+			uid,
+			EXTRACT(YEAR FROM at AT TIME ZONE 'UTC')::int,
+			(EXTRACT(MONTH FROM at AT TIME ZONE 'UTC')::int - 1) / 3,
+			SUM(exp)
+		FROM member_exp_log
+		GROUP BY 1, 2, 3, 4
+		ON CONFLICT DO NOTHING;
+		""",
+	),
+	(
+		2,
+		"indexed task lookups",
+		"""
+		ALTER TABLE task
+			ADD COLUMN IF NOT EXISTS kind character varying
+				GENERATED ALWAYS AS (tag[1]) STORED,
+			ADD COLUMN IF NOT EXISTS gid bigint
+				GENERATED ALWAYS AS ((payload->>'gid')::bigint) STORED,
+			ADD COLUMN IF NOT EXISTS cid bigint
+				GENERATED ALWAYS AS ((payload->>'cid')::bigint) STORED;
+
+		CREATE INDEX IF NOT EXISTS idx_task_kind_run_at
+		ON task (kind, run_at);
+
+		CREATE INDEX IF NOT EXISTS idx_task_kind_key
+		ON task (kind, gid, cid);
+		""",
+	),
+	(
+		3,
+		"indexed member frog captures",
+		"""
+		CREATE INDEX IF NOT EXISTS idx_member_frog_log_member_at
+		ON member_frog_log (gid, uid, at);
+		""",
+	),
+	(
+		4,
+		"day of member message counts",
+		"""
+		ALTER TABLE member_exp
+			ADD COLUMN IF NOT EXISTS msg_day integer NOT NULL DEFAULT 0;
+
+		-- Counts as they are belong to the day of the last daily reset
+		UPDATE member_exp
+		SET msg_day = (
+			SELECT FLOOR(EXTRACT(EPOCH FROM value::timestamptz) / 86400)::int
+			FROM internal
+			WHERE field = 'last_daily'
+		)
+		WHERE EXISTS (SELECT 1 FROM internal WHERE field = 'last_daily');
+		""",
+	),
+	(
+		5,
+		"log ids for incremental lifetime syncs",
+		"""
+		ALTER TABLE member_exp_log ADD COLUMN IF NOT EXISTS id bigserial;
+		ALTER TABLE member_frog_log ADD COLUMN IF NOT EXISTS id bigserial;
+
+		CREATE INDEX IF NOT EXISTS idx_member_exp_log_id
+		ON member_exp_log (id);
+
+		CREATE INDEX IF NOT EXISTS idx_member_frog_log_id
+		ON member_frog_log (id);
+
+		-- The last nightly full resync folded in everything logged before it
+		INSERT INTO internal (field, value)
+		SELECT 'exp_sync_watermark', COALESCE(MAX(id), 0)::text
+		FROM member_exp_log
+		WHERE at <= COALESCE(
+			(SELECT value::timestamptz FROM internal WHERE field = 'last_daily'),
+			'infinity'
+		)
+		ON CONFLICT (field) DO NOTHING;
+
+		INSERT INTO internal (field, value)
+		SELECT 'frog_sync_watermark', COALESCE(MAX(id), 0)::text
+		FROM member_frog_log
+		ON CONFLICT (field) DO NOTHING;
+		""",
+	),
+	(
+		6,
+		"monthly partitions of the logs",
+		"""
+		-- Rebuilds each log as a table partitioned by month of at, see db.partition.
+		-- Months are created from the oldest log up to three months ahead.
+		DO $$
+		DECLARE
+			tbl text;
+			legacy text;
+			seq text;
+			fk record;
+			month date;
+			last_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date
+				+ interval '3 months';
+		BEGIN
+			FOREACH tbl IN ARRAY ARRAY['member_exp_log', 'member_frog_log'] LOOP
+				CONTINUE WHEN (
+					SELECT relkind FROM pg_class WHERE oid = tbl::regclass
+				) = 'p';
+
+				legacy := tbl || '_legacy';
+				EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+				EXECUTE format(
+					'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+					PARTITION BY RANGE (at)',
+					tbl,
+					legacy
+				);
+
+				-- Otherwise the id sequence is dropped along with the legacy table
+				seq := pg_get_serial_sequence(quote_ident(legacy), 'id');
+				EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, tbl);
+
+				-- LIKE leaves out foreign keys
+				FOR fk IN
+					SELECT conname, pg_get_constraintdef(oid) AS def
+					FROM pg_constraint
+					WHERE conrelid = legacy::regclass AND contype = 'f'
+				LOOP
+					EXECUTE format(
+						'ALTER TABLE %I ADD CONSTRAINT %I %s', tbl, fk.conname, fk.def
+					);
+				END LOOP;
+
+				EXECUTE format(
+					'SELECT date_trunc(''month'', MIN(at) AT TIME ZONE ''UTC'')::date
+					FROM %I',
+					legacy
+				) INTO month;
+				month := COALESCE(month, date_trunc('month', now() AT TIME ZONE 'UTC'));
+
+				WHILE month <= last_month LOOP
+					EXECUTE format(
+						'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+						tbl || to_char(month, '"_y"YYYY"m"MM'),
+						tbl,
+						month::timestamp AT TIME ZONE 'UTC',
+						(month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+					);
+					month := month + interval '1 month';
+				END LOOP;
+
+				EXECUTE format('INSERT INTO %I SELECT * FROM %I', tbl, legacy);
+				EXECUTE format('DROP TABLE %I', legacy);
+
+				-- Created on every partition, and on partitions attached later
+				EXECUTE format(
+					'CREATE INDEX %I ON %I (gid, uid, at)', 'idx_' || tbl || '_member_at', tbl
+				);
+				EXECUTE format(
+					'CREATE INDEX %I ON %I (gid, at)', 'idx_' || tbl || '_gid_at', tbl
+				);
+				EXECUTE format('CREATE INDEX %I ON %I (id)', 'idx_' || tbl || '_id', tbl);
+			END LOOP;
+		END
+		$$;
+		""",
+	),
+]
+
+
+async def get_version(pool: Pool) -> int:
+	async with pool.acquire() as con:
+		version = await con.fetchval(
+			"""
+			SELECT value
+			FROM internal
+			WHERE field = 'schema_version'
+			"""
+		)
+
+	return int(version) if version else 0
+
+
+async def run(pool: Pool) -> None:
+	"""Apply every migration newer than the stored schema version."""
+	current = await get_version(pool)
+	applied = False
+
+	async with pool.acquire() as con:
+		for version, description, sql in MIGRATIONS:
+			if version <= current:
+				continue
+
+			applied = True
+			_log.info("|\t> migration %s: %s", version, description)
+			async with con.transaction():
+				await con.execute(sql)
+				await con.execute(  # does upsert
+					"""
+					INSERT INTO internal (field, value)
+					VALUES ('schema_version', $1)
+					ON CONFLICT (field) DO UPDATE SET
+						value = EXCLUDED.value
+					""",
+					str(version),
+				)
+
+	if applied:
+		statement.migrated()
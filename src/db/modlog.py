@@ -4,10 +4,26 @@ import logging
 
 from asyncpg import Pool
 
-from . import guild, table, user
+from . import guild, statement, table, user
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"modlog.add",
+	"""
+	INSERT INTO modlog
+		(gid, uid, log_type, given_on, status, expires_on, reason)
+	VALUES ($1, $2, $3, $4, $5, $6, $7)
+	""",
+)
+_GET = statement.Statement(
+	"modlog.get",
+	"""
+	SELECT * FROM modlog
+	WHERE gid = $1
+	""",
+)
+
 
 async def add(pool: Pool, log: table.Modlog):
 	"""Add modlog into database.
@@ -23,14 +39,7 @@ async def add(pool: Pool, log: table.Modlog):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO modlog
-					(gid, uid, log_type, given_on, status, expires_on, reason)
-				VALUES ($1, $2, $3, $4, $5, $6, $7)
-				""",
-				*log,
-			)
+			await _ADD.execute(con, *log)
 
 
 async def get(db: Pool, gid: int) -> dict:
@@ -38,13 +47,7 @@ async def get(db: Pool, gid: int) -> dict:
 	# return await settings.search(db, Table.MODLOG, where("gid") == gid)
 	async with db.acquire() as con:
 		async with con.transaction():
-			data = await con.fetch(
-				"""
-				SELECT * FROM modlog
-				WHERE gid = $1
-				""",
-				gid,
-			)
+			data = await _GET.fetch(con, gid)
 
 
 # async def create_partition_gid(pool: Pool, gid: int):
@@ -0,0 +1,179 @@
+"""Monthly partitions of member_exp_log and member_frog_log.
+
+Both logs are partitioned by range of at, one partition per month (UTC), named like
+member_exp_log_y2024m01. Queries over a range of at, such as a season, only scan the
+partitions the range falls in. Indexes are declared on the logs themselves, so every
+partition gets its own.
+
+Inserts into a month without a partition fail, so months are created MONTHS_AHEAD
+ahead, when the bot starts and again every day (see ext.daily). There is purposely no
+default partition, as it would keep old months from being detached concurrently.
+
+A detached month is a plain table again, to be archived (pg_dump) and dropped. Its
+logs no longer count towards rebuilding or verifying lifetime totals, nor backfilling
+member_exp_season, so only detach months long past.
+"""
+
+import logging
+
+import pendulum
+from asyncpg import Connection, Pool, Record
+
+_log = logging.getLogger(__name__)
+
+PARTITIONED = ("member_exp_log", "member_frog_log")
+MONTHS_AHEAD = 3
+BRIN = False  # also index at with BRIN, for scans within a month
+
+
+def partition_name(table: str, year: int, month: int) -> str:
+	return f"{table}_y{year}m{month:02d}"
+
+
+def _check_table(table: str) -> None:
+	if table not in PARTITIONED:
+		msg = f"{table} is not a partitioned log"
+		raise ValueError(msg)
+
+
+async def ensure(
+	pool: Pool,
+	now: pendulum.DateTime = None,
+	*,
+	ahead: int = MONTHS_AHEAD,
+	brin: bool = BRIN,
+) -> list[str]:
+	"""Create partitions from the month of now up to ahead months after it.
+
+	Return the names of those created.
+	"""
+	now = now or pendulum.now("UTC")
+	first = pendulum.datetime(now.year, now.month, 1)
+
+	created = []
+	async with pool.acquire() as con:
+		for table in PARTITIONED:
+			if brin:
+				await con.execute(
+					f"""
+					CREATE INDEX IF NOT EXISTS idx_{table}_at_brin
+					ON {table} USING brin (at)
+					"""
+				)
+
+			for i in range(ahead + 1):
+				start = first.add(months=i)
+				if await create(con, table, start.year, start.month):
+					created.append(
+						partition_name(table, start.year, start.month)
+					)
+
+	for name in created:
+		_log.info("Created log partition %s", name)
+
+	return created
+
+
+async def create(
+	con: Connection, table: str, year: int, month: int
+) -> bool:
+	"""Create the partition of a month unless it exists, return if it was created.
+
+	The partition is created on its own and then attached, which unlike CREATE TABLE
+	... PARTITION OF doesn't block inserts into the log while it happens.
+	"""
+	_check_table(table)
+	name = partition_name(table, year, month)
+	start = pendulum.datetime(year, month, 1)
+	end = start.add(months=1)
+
+	async with con.transaction():
+		if await con.fetchval("SELECT to_regclass($1)", name) is not None:
+			return False
+
+		await con.execute(
+			f"""
+			CREATE TABLE {name}
+			(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+			"""
+		)
+		await con.execute(
+			f"""
+			ALTER TABLE {table} ATTACH PARTITION {name}
+			FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+			"""
+		)
+
+	return True
+
+
+async def get_all(pool: Pool, table: str) -> list[Record]:
+	"""Return (name, bounds, estimate) of every partition of table, oldest first.
+
+	estimate is the planner's row estimate, -1 if never analyzed.
+	"""
+	_check_table(table)
+	async with pool.acquire() as con:
+		return await con.fetch(
+			"""
+			SELECT
+				c.relname AS name,
+				pg_get_expr(c.relpartbound, c.oid) AS bounds,
+				c.reltuples::bigint AS estimate
+			FROM pg_inherits i
+			JOIN pg_class c ON c.oid = i.inhrelid
+			WHERE i.inhparent = to_regclass($1)
+			ORDER BY c.relname
+			""",
+			table,
+		)
+
+
+async def reclaim(pool: Pool, table: str, year: int, month: int) -> str:
+	"""Rewrite the partition of a month to give back the space of deleted rows.
+
+	Takes an exclusive lock on the partition while it's rewritten, blocking reads and
+	writes of its month, so only run it when the bot is quiet. Return its name.
+	"""
+	_check_table(table)
+	name = partition_name(table, year, month)
+	async with pool.acquire() as con:
+		if not await con.fetchval("SELECT to_regclass($1)", name):
+			msg = f"{name} doesn't exist"
+			raise ValueError(msg)
+
+		await con.execute(f"VACUUM (FULL, ANALYZE) {name}")
+		_log.info("Rewrote log partition %s", name)
+
+	return name
+
+
+async def detach(
+	pool: Pool, table: str, year: int, month: int, *, drop: bool = False
+) -> str:
+	"""Detach the partition of a month from table, and drop it if drop.
+
+	Months of the current season can't be detached. Detaching is done concurrently,
+	so it doesn't block the log, and so can't be done in a transaction. Return the
+	name of the detached table.
+	"""
+	_check_table(table)
+	now = pendulum.now("UTC")
+	first_month = 1 + (now.month - 1) // 3 * 3
+	season_start = pendulum.datetime(now.year, first_month, 1)
+	if pendulum.datetime(year, month, 1) >= season_start:
+		msg = "Months of the current season can't be detached"
+		raise ValueError(msg)
+
+	name = partition_name(table, year, month)
+	async with pool.acquire() as con:
+		await con.execute(
+			f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"
+		)
+		_log.info("Detached log partition %s", name)
+
+		if drop:
+			await con.execute(f"DROP TABLE {name}")
+			_log.info("Dropped log partition %s", name)
+
+	return name
@@ -4,10 +4,93 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import table, user
+from . import bulk, statement, table, user
 
 _log = logging.getLogger(__name__)
 
+_ADD_POLL = statement.Statement(
+	"poll.add_poll",
+	"""
+	INSERT INTO poll (gid, title, description, max_vote)
+	VALUES ($1, $2, $3, $4)
+	RETURNING id
+	""",
+)
+_GET_POLL = statement.Statement(
+	"poll.get_poll",
+	"""
+	SELECT *
+	FROM poll
+	WHERE gid = $1 and id = $2
+	""",
+)
+_SET_MID = statement.Statement(
+	"poll.set_mid",
+	"""
+	UPDATE poll
+	SET mid = $3
+	WHERE gid = $1 and id = $2
+	""",
+)
+_OPEN = statement.Statement(
+	"poll.open",
+	"""
+	UPDATE poll
+	SET open = true
+	WHERE gid = $1 and id = $2
+	""",
+)
+_ADD_ITEM = statement.Statement(
+	"poll.add_item",
+	"""
+	INSERT INTO poll_item (gid, pid)
+	VALUES ($1, $2)
+	""",
+)
+_ADD_ITEMS_DUMMY = statement.Statement(
+	"poll.add_items_dummy",
+	"""
+	INSERT INTO poll_item (gid, pid)
+	VALUES ($1, $2)
+	RETURNING id
+	""",
+)
+_GET_ITEMS = statement.Statement(
+	"poll.get_items",
+	"""
+	SELECT *
+	FROM poll_item
+	WHERE gid = $1 AND pid = $2
+	""",
+)
+_ADD_VOTE = statement.Statement(
+	"poll.add_vote",
+	"""
+	INSERT INTO poll_vote (gid, pid, iid, uid)
+	VALUES ($1, $2, $3, $4)
+	ON CONFLICT (gid, pid, iid, uid)
+	DO UPDATE SET count = poll_vote.count + 1
+	""",
+)
+_DROP_USER_ON_POLL = statement.Statement(
+	"poll.drop_user_on_poll",
+	"""
+	DELETE FROM poll_vote
+	WHERE gid = $1 and pid = $2 and uid = $3
+	""",
+)
+_GET_RESULTS = statement.Statement(
+	"poll.get_results",
+	"""
+	SELECT vote.iid, SUM(vote.count) AS count, item.description
+	FROM poll_vote as vote
+	INNER JOIN poll_item AS item ON vote.iid = item.id AND vote.pid = item.pid
+	WHERE vote.gid = $1 AND vote.pid = $2
+	GROUP BY vote.iid, item.description
+	ORDER BY count DESC
+	""",
+)
+
 
 async def add_poll(pool: Pool, payload: table.Poll) -> int:
 	"""Register the poll into the database.
@@ -16,31 +99,18 @@ async def add_poll(pool: Pool, payload: table.Poll) -> int:
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			return await con.fetchval(
-				"""
-				INSERT INTO poll (gid, title, description, max_vote)
-				VALUES ($1, $2, $3, $4)
-				RETURNING id
-				""",
+			return await _ADD_POLL.fetchval(
+				con,
 				payload.gid,
 				payload.title,
 				payload.description,
 				payload.max_vote,
-				# *payload,
 			)
 
 
 async def get_poll(pool: Pool, gid: int, pid: int) -> table.Poll | None:
 	async with pool.acquire() as con:
-		record = await con.fetchrow(
-			"""
-			SELECT *
-			FROM poll
-			WHERE gid = $1 and id = $2
-			""",
-			gid,
-			pid,
-		)
+		record = await _GET_POLL.fetchrow(con, gid, pid)
 
 		if not record:
 			return None
@@ -51,42 +121,19 @@ async def get_poll(pool: Pool, gid: int, pid: int) -> table.Poll | None:
 async def set_mid(pool: Pool, gid: int, pid: int, mid: int):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE poll
-				SET mid = $3
-				WHERE gid = $1 and id = $2
-				""",
-				gid,
-				pid,
-				mid,
-			)
+			await _SET_MID.execute(con, gid, pid, mid)
 
 
 async def open(pool: Pool, gid: int, pid: int):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE poll
-				SET open = true
-				WHERE gid = $1 and id = $2
-				""",
-				gid,
-				pid,
-			)
+			await _OPEN.execute(con, gid, pid)
 
 
 async def add_item(pool: Pool, payload: table.PollItem):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO poll_item (gid, pid)
-				VALUES ($1, $2)
-				""",
-				*payload,
-			)
+			await _ADD_ITEM.execute(con, *payload)
 
 
 async def add_items_dummy(pool: Pool, gid: int, pid: int, n: int):
@@ -95,27 +142,12 @@ async def add_items_dummy(pool: Pool, gid: int, pid: int, n: int):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.executemany(
-				"""
-				INSERT INTO poll_item (gid, pid)
-				VALUES ($1, $2)
-				RETURNING id
-				""",
-				values,
-			)
+			await _ADD_ITEMS_DUMMY.executemany(con, values)
 
 
 async def get_items(pool: Pool, gid: int, pid: int) -> list[table.PollItem]:
 	async with pool.acquire() as con:
-		records =  await con.fetch(
-			"""
-			SELECT *
-			FROM poll_item
-			WHERE gid = $1 AND pid = $2
-			""",
-			gid,
-			pid,
-		)
+		records =  await _GET_ITEMS.fetch(con, gid, pid)
 
 		return [table.PollItem.from_record(r) for r in records]
 
@@ -127,15 +159,7 @@ async def add_vote(pool: Pool, payload: table.PollVote):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO poll_vote (gid, pid, iid, uid)
-				VALUES ($1, $2, $3, $4)
-				ON CONFLICT (unique column)
-				DO UPDATE SET count = poll_vote.count + 1
-				""",
-				*payload,
-			)
+			await _ADD_VOTE.execute(con, *payload)
 
 
 async def add_votes(pool: Pool, votes: [table.PollVote]):
@@ -143,33 +167,15 @@ async def add_votes(pool: Pool, votes: [table.PollVote]):
 	if not await user.get(pool, uid):
 		await user.add(pool, table.User(uid))
 
-	payloads = [tuple(payload) for payload in votes]
-
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.executemany(
-				"""
-				INSERT INTO poll_vote (gid, pid, iid, uid)
-				VALUES ($1, $2, $3, $4)
-				ON CONFLICT (gid, pid, iid, uid)
-				DO UPDATE SET count = poll_vote.count + 1
-				""",
-				payloads,
-			)
+			await bulk.write(con, bulk.POLL_VOTE, votes)
 
 
 async def drop_user_on_poll(pool: Pool, gid: int, pid: int, uid: int):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM poll_vote
-				WHERE gid = $1 and pid = $2 and uid = $3
-				""",
-				gid,
-				pid,
-				uid,
-			)
+			await _DROP_USER_ON_POLL.execute(con, gid, pid, uid)
 
 
 async def get_results(pool: Pool, gid: int, pid: int) -> list[table.PollVoteStats]:
@@ -178,18 +184,7 @@ async def get_results(pool: Pool, gid: int, pid: int) -> list[table.PollVoteStat
 	Already aggregated and sorted by count descending.
 	"""
 	async with pool.acquire() as con:
-		records = await con.fetch(
-			"""
-			SELECT vote.iid, SUM(vote.count) AS count, item.description
-			FROM poll_vote as vote
-			INNER JOIN poll_item AS item ON vote.iid = item.id AND vote.pid = item.pid
-			WHERE vote.gid = $1 AND vote.pid = $2
-			GROUP BY vote.iid, item.description
-			ORDER BY count DESC
-			""",
-			gid,
-			pid,
-		)
+		records = await _GET_RESULTS.fetch(con, gid, pid)
 
 		return [table.PollVoteStats.from_record(r) for r in records]
 
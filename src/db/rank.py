@@ -7,10 +7,81 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import guild, table, utility
+from . import cache, guild, statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"rank.add",
+	"""
+	INSERT INTO rank (gid, message, mode)
+	VALUES ($1, $2, $3)
+	""",
+)
+_INIT = statement.Statement(
+	"rank.init",
+	"""
+	INSERT INTO rank (gid, mode)
+	VALUES ($1, $2)
+	""",
+)
+_GET = statement.Statement(
+	"rank.get",
+	"""
+	SELECT gid, enabled, keep_old, message
+	FROM rank
+	WHERE gid = $1 and mode = $2
+	""",
+)
+_SET_MESSAGE = statement.Statement(
+	"rank.set_message",
+	"""
+	UPDATE rank
+	SET message = $2
+	WHERE gid = $1 and mode = $3
+	""",
+)
+_SET_ENABLED = statement.Statement(
+	"rank.set_enabled",
+	"""
+	UPDATE rank
+	SET enabled = $2
+	WHERE gid = $1 and mode = $3
+	""",
+)
+_SET_KEEP_OLD = statement.Statement(
+	"rank.set_keep_old",
+	"""
+	UPDATE rank
+	SET keep_old = $2
+	WHERE gid = $1 and mode = $3
+	""",
+)
+_GET_MESSAGE = statement.Statement(
+	"rank.get_message",
+	"""
+	SELECT message
+	FROM rank
+	WHERE gid = $1 and mode = $2
+	""",
+)
+_GET_ENABLED = statement.Statement(
+	"rank.get_enabled",
+	"""
+	SELECT enabled
+	FROM rank
+	WHERE gid = $1 and mode = $2
+	""",
+)
+_GET_KEEP_OLD = statement.Statement(
+	"rank.get_keep_old",
+	"""
+	SELECT keep_old
+	FROM rank
+	WHERE gid = $1 and mode = $2
+	""",
+)
+
 
 async def add(
 	pool: Pool,
@@ -26,13 +97,9 @@ async def add(
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO rank (gid, message, mode)
-				VALUES ($1, $2, $3)
-				""",
-				*rank,
-			)
+			await _ADD.execute(con, *rank)
+
+	cache.invalidate("rank", rank.gid)
 
 
 async def init(
@@ -47,16 +114,12 @@ async def init(
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO rank (gid, mode)
-				VALUES ($1, $2)
-				""",
-				gid,
-				mode,
-			)
+			await _INIT.execute(con, gid, mode)
+
+	cache.invalidate("rank", gid)
 
 
+@cache.cached("rank")
 @utility.retry(on_none=init)
 async def get(
 	pool: Pool,
@@ -69,15 +132,7 @@ async def get(
 	Less overhead than individually calling for each column.
 	"""
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT gid, enabled, keep_old, message
-			FROM rank
-			WHERE gid = $1 and mode = $2
-			""",
-			gid,
-			mode,
-		)
+		return await _GET.fetchrow(con, gid, mode)
 
 
 @utility.retry(on_none=init)
@@ -90,17 +145,10 @@ async def set_message(
 ):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE rank
-				SET message = $2
-				WHERE gid = $1 and mode = $3
-				""",
-				gid,
-				encoded_json,
-				mode,
-			)
-			return 0
+			await _SET_MESSAGE.execute(con, gid, encoded_json, mode)
+
+	cache.invalidate("rank", gid)
+	return 0
 
 
 @utility.retry(on_none=init)
@@ -113,17 +161,10 @@ async def set_enabled(
 ):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE rank
-				SET enabled = $2
-				WHERE gid = $1 and mode = $3
-				""",
-				gid,
-				val,
-				mode,
-			)
-			return 0
+			await _SET_ENABLED.execute(con, gid, val, mode)
+
+	cache.invalidate("rank", gid)
+	return 0
 
 
 @utility.retry(on_none=init)
@@ -136,19 +177,13 @@ async def set_keep_old(
 ):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE rank
-				SET keep_old = $2
-				WHERE gid = $1 and mode = $3
-				""",
-				gid,
-				val,
-				mode,
-			)
-			return 0
+			await _SET_KEEP_OLD.execute(con, gid, val, mode)
+
+	cache.invalidate("rank", gid)
+	return 0
 
 
+@cache.cached("rank")
 @utility.retry(on_none=init)
 async def get_message(
 	pool: Pool,
@@ -157,17 +192,10 @@ async def get_message(
 	mode: table.WindowEnum = table.WindowEnum.SEASONAL,
 ) -> list[Record]:
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT message
-			FROM rank
-			WHERE gid = $1 and mode = $2
-			""",
-			gid,
-			mode,
-		)
+		return await _GET_MESSAGE.fetchval(con, gid, mode)
 
 
+@cache.cached("rank")
 @utility.retry(on_none=init)
 async def get_enabled(
 	pool: Pool,
@@ -177,17 +205,10 @@ async def get_enabled(
 ) -> list[Record]:
 	"""Return if ranks are enabled."""
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT enabled
-			FROM rank
-			WHERE gid = $1 and mode = $2
-			""",
-			gid,
-			mode,
-		)
+		return await _GET_ENABLED.fetchval(con, gid, mode)
 
 
+@cache.cached("rank")
 @utility.retry(on_none=init)
 async def get_keep_old(
 	pool: Pool,
@@ -197,12 +218,4 @@ async def get_keep_old(
 ) -> list[Record]:
 	"""Return if older ranks should be retained."""
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT keep_old
-			FROM rank
-			WHERE gid = $1 and mode = $2
-			""",
-			gid,
-			mode,
-		)
+		return await _GET_KEEP_OLD.fetchval(con, gid, mode)
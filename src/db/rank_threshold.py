@@ -8,10 +8,59 @@ import logging
 import pendulum
 from asyncpg import Pool, Record
 
-from . import level, table
+from src import levels_helper
+
+from . import cache, level, statement, table
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"rank_threshold.add",
+	"""
+	INSERT INTO rank_threshold (gid, rid, threshold, mode)
+	VALUES ($1, $2, $3, $4)
+	""",
+)
+_GET = statement.Statement(
+	"rank_threshold.get",
+	"""
+	SELECT rid, threshold
+	FROM rank_threshold
+	WHERE gid = $1 and mode = $2
+	ORDER BY threshold
+	""",
+)
+_GET_ALL_WINDOWS = statement.Statement(
+	"rank_threshold.get_all_windows",
+	"""
+	SELECT rid, threshold
+	FROM rank_threshold
+	WHERE gid = $1
+	ORDER BY threshold
+	""",
+)
+_DELETE = statement.Statement(
+	"rank_threshold.delete",
+	"""
+	DELETE FROM rank_threshold
+	WHERE (rid = $2 OR threshold = $2) and gid = $1
+	""",
+)
+_BATCH_DELETE = statement.Statement(
+	"rank_threshold.batch_delete",
+	"""
+	DELETE FROM rank_threshold
+	WHERE gid= $1 and rid = ANY($2)
+	""",
+)
+_DROP = statement.Statement(
+	"rank_threshold.drop",
+	"""
+	DELETE FROM rank_threshold
+	WHERE gid = $1 and mode = $2
+	""",
+)
+
 
 async def add(
 	pool: Pool,
@@ -21,15 +70,18 @@ async def add(
 ):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO rank_threshold (gid, rid, threshold, mode)
-				VALUES ($1, $2, $3, $4)
-				""",
-				*rank,
-			)
+			await _ADD.execute(con, *rank)
 
+	_invalidate(rank.gid)
 
+
+def _invalidate(gid: int) -> None:
+	"""Drop a guild's cached thresholds, and the rank.RankLadder compiled from them."""
+	cache.invalidate("rank_threshold", gid)
+	cache.invalidate("rank_ladder", gid)
+
+
+@cache.cached("rank_threshold")
 async def get(
 	pool: Pool,
 	gid: int,
@@ -38,33 +90,17 @@ async def get(
 ) -> list[Record]:
 	"""Return rank thresholds as a list of records."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT rid, threshold
-			FROM rank_threshold
-			WHERE gid = $1 and mode = $2
-			ORDER BY threshold
-			""",
-			gid,
-			mode,
-		)
+		return await _GET.fetch(con, gid, mode)
 
 
+@cache.cached("rank_threshold")
 async def get_all_windows(
 	pool: Pool,
 	gid: int,
 ) -> list[Record]:
 	"""Return rank thresholds as a list of records."""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT rid, threshold
-			FROM rank_threshold
-			WHERE gid = $1
-			ORDER BY threshold
-			""",
-			gid,
-		)
+		return await _GET_ALL_WINDOWS.fetch(con, gid)
 
 
 async def delete(
@@ -75,14 +111,9 @@ async def delete(
 	"""Delete rank in db, first looking for rid then by threshold."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM rank_threshold
-				WHERE (rid = $2 OR threshold = $2) and gid = $1
-				""",
-				gid,
-				arg,
-			)
+			await _DELETE.execute(con, gid, arg)
+
+	_invalidate(gid)
 
 
 async def batch_delete(
@@ -97,14 +128,9 @@ async def batch_delete(
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM rank_threshold
-				WHERE gid= $1 and rid = ANY($2)
-				""",
-				gid,
-				rids,
-			)
+			await _BATCH_DELETE.execute(con, gid, rids)
+
+	_invalidate(gid)
 
 
 async def drop(
@@ -116,14 +142,9 @@ async def drop(
 	"""Delete all ranks associated with gid for a particular mode."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM rank_threshold
-				WHERE gid = $1 and mode = $2
-				""",
-				gid,
-				mode,
-			)
+			await _DROP.execute(con, gid, mode)
+
+	_invalidate(gid)
 
 
 def _calc_min_rank(rank_threshold: list[Record], level) -> tuple[int, int]:
@@ -151,15 +172,19 @@ async def of_member(
 	uid: int,
 	*,
 	mode: table.WindowEnum = table.WindowEnum.SEASONAL,
+	exp: int | None = None,
 ) -> int:
 	"""Return the rank of a member, None if no role rank.
 
-	Is based on seasonal experience.
+	Is based on seasonal experience. Pass the member's exp of the window if it's
+	already known, to save summing it again.
 	"""
 	ranks_raw = await get(pool, gid, mode=mode)
 
 	now = pendulum.now()
-	if mode == table.WindowEnum.SEASONAL:
+	if exp is not None:
+		lvl = levels_helper.level_from_exp(exp)
+	elif mode == table.WindowEnum.SEASONAL:
 		lvl = await level.get_seasonal_by_month(
 			pool, gid, uid, now.year, now.month
 		)
@@ -0,0 +1,175 @@
+"""Named SQL statements, prepared ahead on every connection of the pool.
+
+asyncpg prepares each distinct query text the first time a connection runs it. After
+startup, and whenever the pool opened a connection, the first messages handled on it
+paid to parse and plan every query on their way. Queries built with f-strings were
+worse, every variant being its own query text.
+
+Statements are instead declared once by name, at the top of the module running them.
+Hot ones are prepared as each connection is set up (see setup_codecs in main.py), the
+rest the first time they're run on a connection. Prepared statements are kept per
+connection, by its backend pid, until it closes.
+
+The pool opens its first connections before migrations run, so hot statements using
+what a migration adds can't be prepared on them yet. Once migrations have run,
+migrated() has every connection prepare its hot statements again, the next time it
+runs one.
+
+Every query of src/db is declared here, except what can't be prepared: DDL of
+migration and partition, COPY of bulk, and utility commands such as LOCK and VACUUM.
+
+Every run is counted and timed, see status().
+"""
+
+import logging
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from asyncpg import Connection, PostgresError, Record
+from asyncpg.exceptions import InvalidCachedStatementError
+from asyncpg.prepared_stmt import PreparedStatement
+
+_log = logging.getLogger(__name__)
+
+_statements: dict[str, "Statement"] = {}
+_connections: dict[int, "_Connection"] = {}  # by backend pid, while open
+_epoch = 0  # bumped by migrated()
+
+
+@dataclass
+class Stats:
+	calls: int = 0
+	total: float = 0.0  # seconds
+	max: float = 0.0
+
+	def observe(self, seconds: float) -> None:
+		self.calls += 1
+		self.total += seconds
+		self.max = max(self.max, seconds)
+
+
+@dataclass
+class _Connection:
+	epoch: int  # of the schema its hot statements were prepared against
+	prepared: dict[str, PreparedStatement] = field(default_factory=dict)
+
+
+class Statement:
+	def __init__(self, name: str, sql: str, *, hot: bool = False):
+		if name in _statements:
+			msg = f"Statement {name} is already declared"
+			raise ValueError(msg)
+
+		self.name = name
+		self.sql = sql
+		self.hot = hot
+		self.stats = Stats()
+		_statements[name] = self
+
+	async def fetch(self, con: Connection, *args) -> list[Record]:
+		return await self._run(con, "fetch", *args)
+
+	async def fetchrow(self, con: Connection, *args) -> Record | None:
+		return await self._run(con, "fetchrow", *args)
+
+	async def fetchval(self, con: Connection, *args):
+		return await self._run(con, "fetchval", *args)
+
+	async def execute(self, con: Connection, *args) -> None:
+		await self._run(con, "fetch", *args)
+
+	async def executemany(self, con: Connection, args: Iterable) -> None:
+		await self._run(con, "executemany", args)
+
+	async def _run(self, con: Connection, method: str, *args):
+		start = time.perf_counter()
+		try:
+			prepared = await self._prepare(con)
+			try:
+				return await getattr(prepared, method)(*args)
+			except InvalidCachedStatementError:
+				# The schema changed under it, prepare it again
+				_connection(con).prepared.pop(self.name, None)
+				if con.is_in_transaction():
+					raise
+
+				prepared = await self._prepare(con)
+				return await getattr(prepared, method)(*args)
+		finally:
+			self.stats.observe(time.perf_counter() - start)
+
+	async def _prepare(self, con: Connection) -> PreparedStatement:
+		state = _connection(con)
+		if state.epoch != _epoch:
+			await _prepare_hot(con, state)
+
+		prepared = state.prepared
+		if self.name not in prepared:
+			prepared[self.name] = await con.prepare(self.sql)
+
+		return prepared[self.name]
+
+
+def _connection(con: Connection) -> _Connection:
+	pid = con.get_server_pid()
+	state = _connections.get(pid)
+	if state is None:
+		state = _connections[pid] = _Connection(_epoch)
+		con.add_termination_listener(lambda _: _forget(pid, state))
+
+	return state
+
+
+def _forget(pid: int, state: _Connection) -> None:
+	# Unless a connection opened since was given the same pid
+	if _connections.get(pid) is state:
+		del _connections[pid]
+
+
+async def _prepare_hot(con: Connection, state: _Connection) -> None:
+	state.epoch = _epoch
+	state.prepared.clear()
+	for stmt in _statements.values():
+		if not stmt.hot:
+			continue
+
+		try:
+			state.prepared[stmt.name] = await con.prepare(stmt.sql)
+		except PostgresError as err:
+			# Such as a column a migration yet to run adds, see migrated()
+			_log.debug("Couldn't prepare %s yet: %s", stmt.name, err)
+
+
+async def prepare(con: Connection) -> None:
+	"""Prepare every hot statement on a new connection."""
+	_connections.pop(con.get_server_pid(), None)
+	await _prepare_hot(con, _connection(con))
+
+
+def migrated() -> None:
+	"""Have every connection prepare its hot statements again, the schema changed."""
+	global _epoch
+	_epoch += 1
+
+
+def status(limit: int | None = None) -> str:
+	"""Return calls and latency of the limit busiest statements, or all run."""
+	busiest = sorted(
+		(stmt for stmt in _statements.values() if stmt.stats.calls),
+		key=lambda stmt: stmt.stats.total,
+		reverse=True,
+	)
+
+	lines = [
+		f"{'statement':<44}{'calls':>8}{'mean ms':>9}{'max ms':>9}"
+	]
+	for stmt in busiest[:limit]:
+		stats = stmt.stats
+		lines.append(
+			f"{stmt.name:<44}{stats.calls:>8}"
+			f"{stats.total / stats.calls * 1000:>9.2f}"
+			f"{stats.max * 1000:>9.2f}"
+		)
+
+	return "\n".join(lines)
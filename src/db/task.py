@@ -1,6 +1,14 @@
 """Defines SQL queries to make to the database for anything relate to a task.
 
 Tasks are retrieved via tags (stored with tags as keys).
+
+A task's first tag is its kind, and its payload's gid and cid are its keys. These are
+kept as generated columns (see db.migration) so lookups by kind, due time or key are
+index scans. Prefer get_due(), get_by_key() and drop_by_key() over the containment
+matching of get() and drop(), which has to scan the whole table.
+
+Queries list their columns rather than SELECT *, so rows still unpack into a
+table.Task.
 """
 
 import logging
@@ -8,37 +16,131 @@ import logging
 from asyncpg import Pool, Record
 from pendulum import DateTime
 
-from . import table
+from . import bulk, statement, table
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"task.add",
+	"""
+	INSERT INTO task (tag, run_at, payload)
+	VALUES ($1, $2, $3)
+	RETURNING id
+	""",
+	hot=True,
+)
+_GET = statement.Statement(
+	"task.get",
+	"""
+	SELECT id, tag, run_at, payload FROM task
+	WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
+	""",
+)
+_GET_ONE = statement.Statement(
+	"task.get_one",
+	"""
+	SELECT id, tag, run_at, payload FROM task
+	WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
+	LIMIT 1
+	""",
+)
+_GET_DUE = statement.Statement(
+	"task.get_due",
+	"""
+	SELECT id, tag, run_at, payload FROM task
+	WHERE kind = ANY($1::character varying[])
+		AND run_at <= $2
+		AND NOT id = ANY($3::bigint[])
+	ORDER BY run_at
+	""",
+	hot=True,
+)
+_GET_NEXT_RUN_AT = statement.Statement(
+	"task.get_next_run_at",
+	"""
+	SELECT MIN(earliest.run_at)
+	FROM unnest($1::character varying[]) AS k(kind)
+	CROSS JOIN LATERAL (
+		SELECT run_at FROM task
+		WHERE task.kind = k.kind AND NOT id = ANY($2::bigint[])
+		ORDER BY run_at
+		LIMIT 1
+	) AS earliest
+	""",
+	hot=True,
+)
+_GET_BY_KEY = statement.Statement(
+	"task.get_by_key",
+	"""
+	SELECT id, tag, run_at, payload FROM task
+	WHERE kind = $1 AND gid = $2 AND ($3::bigint IS NULL OR cid = $3)
+	LIMIT 1
+	""",
+)
+_DROP_BY_KEY = statement.Statement(
+	"task.drop_by_key",
+	"""
+	DELETE FROM task
+	WHERE kind = $1
+		AND ($2::bigint IS NULL OR gid = $2)
+		AND ($3::bigint IS NULL OR cid = $3)
+	""",
+)
+_DROP_ONE = statement.Statement(
+	"task.drop_one",
+	"""
+	DELETE FROM task
+	WHERE id = $1
+	""",
+	hot=True,
+)
+_DROP = statement.Statement(
+	"task.drop",
+	"""
+	DELETE FROM task
+	WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
+	""",
+)
+_UPDATE_RUN_AT = statement.Statement(
+	"task.update_run_at",
+	"""
+	UPDATE task
+	SET run_at = $2
+	WHERE id = $1
+	""",
+	hot=True,
+)
+_UPDATE_ALL = statement.Statement(
+	"task.update_all",
+	"""
+	UPDATE task
+	SET run_at = $2, payload = $3
+	WHERE id = $1
+	""",
+	hot=True,
+)
+_UPDATE_PAYLOAD = statement.Statement(
+	"task.update_payload",
+	"""
+	UPDATE task
+	SET payload = $2
+	WHERE id = $1
+	""",
+)
+
 
-async def add(pool: Pool, tsk: table.Task) -> None:
-	"""Add task into database."""
+async def add(pool: Pool, tsk: table.Task) -> int:
+	"""Add task into database, returning its id."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO task (tag, run_at, payload)
-				VALUES ($1, $2, $3)
-				""",
-				*tsk,
-			)
+			return await _ADD.fetchval(con, *tsk)
 
 
 async def add_many(pool: Pool, tsks: list[table.Task]) -> None:
-	"""Add many tasks into database."""
-	tsks = [(*tsk,) for tsk in tsks]
-
+	"""Add many tasks into database, through COPY (see db.bulk)."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.executemany(
-				"""
-				INSERT INTO task (tag, run_at, payload)
-				VALUES ($1, $2, $3)
-				""",
-				tsks,
-			)
+			await bulk.write(con, bulk.TASK, tsks)
 
 
 # async def get_by_tag(pool: Pool, *, tag: str = None, tags: list = None):
@@ -69,14 +171,7 @@ async def get(
 	No payload or tag returns all tasks.
 	"""
 	async with pool.acquire() as con:
-		return await con.fetch(
-			"""
-			SELECT * FROM task
-			WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
-			""",
-			tag,
-			payload,
-		)
+		return await _GET.fetch(con, tag, payload)
 
 
 async def get_one(
@@ -87,28 +182,53 @@ async def get_one(
 	No payload or tag returns all tasks.
 	"""
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT * FROM task
-			WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
-			LIMIT 1
-			""",
-			tag,
-			payload,
-		)
+		return await _GET_ONE.fetchrow(con, tag, payload)
+
+
+async def get_due(
+	pool: Pool, tags: list[str], before: DateTime, *, exclude: list[int] = []
+) -> list[Record]:
+	"""Return tasks of any kind in tags which are due to run before, earliest first.
+
+	Tasks whose id is in exclude are skipped, usually those already running.
+	"""
+	async with pool.acquire() as con:
+		return await _GET_DUE.fetch(con, tags, before, exclude)
+
+
+async def get_next_run_at(
+	pool: Pool, tags: list[str], *, exclude: list[int] = []
+) -> DateTime | None:
+	"""Return when the earliest task of any kind in tags runs, None if none do.
+
+	Looks up the earliest of each kind separately, so each is one index probe.
+	"""
+	async with pool.acquire() as con:
+		return await _GET_NEXT_RUN_AT.fetchval(con, tags, exclude)
+
+
+async def get_by_key(
+	pool: Pool, tag: str, gid: int, cid: int | None = None
+) -> Record:
+	"""Return a task of kind tag whose payload has this gid, and cid if given."""
+	async with pool.acquire() as con:
+		return await _GET_BY_KEY.fetchrow(con, tag, gid, cid)
+
+
+async def drop_by_key(
+	pool: Pool, tag: str, gid: int | None = None, cid: int | None = None
+) -> None:
+	"""Delete tasks of kind tag, only those matching gid and cid where given."""
+	async with pool.acquire() as con:
+		async with con.transaction():
+			await _DROP_BY_KEY.execute(con, tag, gid, cid)
 
 
 async def drop_one(pool: Pool, id: int) -> None:
 	"""Drop a task from database, usually after handling it."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM task
-				WHERE id = $1
-				""",
-				id,
-			)
+			await _DROP_ONE.execute(con, id)
 
 
 async def drop(
@@ -120,29 +240,14 @@ async def drop(
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				DELETE FROM task
-				WHERE $1::character varying[] <@ tag AND $2::jsonb <@ payload::jsonb
-				""",
-				tag,
-				payload,
-			)
+			await _DROP.execute(con, tag, payload)
 
 
 async def update_run_at(pool: Pool, id: int, run_at: DateTime) -> None:
 	"""Update run_at matching id."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE task
-				SET run_at = $2
-				WHERE id = $1
-				""",
-				id,
-				run_at,
-			)
+			await _UPDATE_RUN_AT.execute(con, id, run_at)
 
 
 async def update_all(
@@ -154,31 +259,14 @@ async def update_all(
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE task
-				SET run_at = $2, payload = $3
-				WHERE id = $1
-				""",
-				id,
-				run_at,
-				payload,
-			)
+			await _UPDATE_ALL.execute(con, id, run_at, payload)
 
 
 async def update_payload(pool: Pool, id: int, payload: dict) -> None:
 	"""Update payload matching id."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE task
-				SET payload = $3
-				WHERE id = $1
-				""",
-				id,
-				payload,
-			)
+			await _UPDATE_PAYLOAD.execute(con, id, payload)
 
 
 class XORError(Exception):
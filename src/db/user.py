@@ -4,33 +4,36 @@ import logging
 
 from asyncpg import Pool
 
-from . import table, utility
+from . import statement, table, utility
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"user.add",
+	"""
+	INSERT INTO "user" (uid)
+	VALUES ($1)
+	""",
+)
+_GET = statement.Statement(
+	"user.get",
+	"""
+	SELECT *
+	FROM "user"
+	WHERE uid = $1
+	""",
+)
+
 
 async def add(pool: Pool, user: table.User):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO "user" (uid)
-				VALUES ($1)
-				""",
-				user.uid,
-			)
+			await _ADD.execute(con, user.uid)
 
 
 async def get(pool: Pool, uid: int):
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT *
-			FROM "user"
-			WHERE uid = $1
-			""",
-			uid,
-		)
+		return await _GET.fetchrow(con, uid)
 
 
 def init():
@@ -4,10 +4,109 @@ import logging
 
 from asyncpg import Pool, Record
 
-from . import table
+from . import cache, statement, table
 
 _log = logging.getLogger(__name__)
 
+_ADD = statement.Statement(
+	"welcome.add",
+	"""
+	INSERT INTO welcome (gid)
+	VALUES ($1)
+	""",
+)
+_GET = statement.Statement(
+	"welcome.get",
+	"""
+	SELECT *
+	FROM welcome
+	WHERE gid = $1
+	""",
+)
+_SET_ENABLED = statement.Statement(
+	"welcome.set_enabled",
+	"""
+	UPDATE welcome
+	SET enabled = $1
+	""",
+)
+_SET_VERIFY_FIRST = statement.Statement(
+	"welcome.set_verify_first",
+	"""
+	UPDATE welcome
+	SET verify_first = $1
+	""",
+)
+_SET_DEFAULT_RID = statement.Statement(
+	"welcome.set_default_rid",
+	"""
+	UPDATE welcome
+	SET default_rid = $1
+	""",
+)
+_SET_CID = statement.Statement(
+	"welcome.set_cid",
+	"""
+	UPDATE welcome
+	SET cid = $1
+	""",
+)
+_SET_MESSAGE = statement.Statement(
+	"welcome.set_message",
+	"""
+	UPDATE welcome
+	SET message = $1
+	""",
+)
+_GET_ENABLED = statement.Statement(
+	"welcome.get_enabled",
+	"""
+	SELECT enabled
+	FROM welcome
+	WHERE gid = $1
+	""",
+)
+_GET_MESSAGE = statement.Statement(
+	"welcome.get_message",
+	"""
+	SELECT message
+	FROM welcome
+	WHERE gid = $1
+	""",
+)
+_GET_CID = statement.Statement(
+	"welcome.get_cid",
+	"""
+	SELECT cid
+	FROM welcome
+	WHERE gid = $1
+	""",
+)
+_GET_PAYLOAD = statement.Statement(
+	"welcome.get_payload",
+	"""
+	SELECT enabled, cid, message, default_rid, mode, monitor_rid
+	FROM welcome
+	WHERE gid = $1
+	""",
+)
+_SET_MODE = statement.Statement(
+	"welcome.set_mode",
+	"""
+	UPDATE welcome
+	SET mode = $2
+	WHERE gid = $1
+	""",
+)
+_SET_MONITOR_RID = statement.Statement(
+	"welcome.set_monitor_rid",
+	"""
+	UPDATE welcome
+	SET monitor_rid = $2
+	WHERE gid = $1
+	""",
+)
+
 
 async def add(pool: Pool, gid: int):
 	"""Add guild to database welcome.
@@ -16,25 +115,14 @@ async def add(pool: Pool, gid: int):
 	"""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				INSERT INTO welcome (gid)
-				VALUES ($1)
-				""",
-				gid,
-			)
+			await _ADD.execute(con, gid)
+
+	cache.invalidate("welcome", gid)
 
 
 async def get(pool: Pool, gid: int) -> Record:
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT *
-			FROM welcome
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET.fetchrow(con, gid)
 
 
 async def set_enabled(pool: Pool, gid: int, val: bool):  # noqa: FBT001
@@ -45,13 +133,10 @@ async def set_enabled(pool: Pool, gid: int, val: bool):  # noqa: FBT001
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET enabled = $1
-				""",
-				val,
-			)
+			await _SET_ENABLED.execute(con, val)
+
+	# these update every row, not just this guild's
+	cache.invalidate("welcome")
 
 
 async def set_verify_first(pool: Pool, gid: int, val: bool):  # noqa: FBT001
@@ -62,13 +147,10 @@ async def set_verify_first(pool: Pool, gid: int, val: bool):  # noqa: FBT001
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET verify_first = $1
-				""",
-				val,
-			)
+			await _SET_VERIFY_FIRST.execute(con, val)
+
+	# these update every row, not just this guild's
+	cache.invalidate("welcome")
 
 
 async def set_default_rid(pool: Pool, gid: int, rid: int):
@@ -79,13 +161,10 @@ async def set_default_rid(pool: Pool, gid: int, rid: int):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET default_rid = $1
-				""",
-				rid,
-			)
+			await _SET_DEFAULT_RID.execute(con, rid)
+
+	# these update every row, not just this guild's
+	cache.invalidate("welcome")
 
 
 async def set_cid(pool: Pool, gid: int, cid: int):
@@ -96,13 +175,10 @@ async def set_cid(pool: Pool, gid: int, cid: int):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET cid = $1
-				""",
-				cid,
-			)
+			await _SET_CID.execute(con, cid)
+
+	# these update every row, not just this guild's
+	cache.invalidate("welcome")
 
 
 async def set_message(pool: Pool, gid: int, message: str):
@@ -113,100 +189,61 @@ async def set_message(pool: Pool, gid: int, message: str):
 
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET message = $1
-				""",
-				message,
-			)
+			await _SET_MESSAGE.execute(con, message)
+
+	# these update every row, not just this guild's
+	cache.invalidate("welcome")
 
 
+@cache.cached("welcome")
 async def get_enabled(pool: Pool, gid: int) -> bool:
 	if not await get(pool, gid):  # return false, no need to create
 		return False
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT enabled
-			FROM welcome
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_ENABLED.fetchval(con, gid)
 
 
+@cache.cached("welcome")
 async def get_message(pool: Pool, gid: int) -> str:
 	if not await get(pool, gid):  # return false, no need to create
 		await add(pool, gid)
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT message
-			FROM welcome
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_MESSAGE.fetchval(con, gid)
 
 
+@cache.cached("welcome")
 async def get_cid(pool: Pool, gid: int) -> int:
 	if not await get(pool, gid):  # return false, no need to create
 		return False
 
 	async with pool.acquire() as con:
-		return await con.fetchval(
-			"""
-			SELECT cid
-			FROM welcome
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_CID.fetchval(con, gid)
 
 
+@cache.cached("welcome")
 async def get_payload(pool: Pool, gid: int) -> Record:
 	"""Get all neccessary information to handle welcoming users."""
 	if not await get(pool, gid):  # return false, no need to create
 		return False
 
 	async with pool.acquire() as con:
-		return await con.fetchrow(
-			"""
-			SELECT enabled, cid, message, default_rid, mode, monitor_rid
-			FROM welcome
-			WHERE gid = $1
-			""",
-			gid,
-		)
+		return await _GET_PAYLOAD.fetchrow(con, gid)
 
 
 async def set_mode(pool: Pool, gid: int, mode: table.WelcomeModeEnum):
 	"""Get all neccessary information to handle welcoming users."""
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET mode = $2
-				WHERE gid = $1
-				""",
-				gid,
-				mode,
-			)
+			await _SET_MODE.execute(con, gid, mode)
+
+	cache.invalidate("welcome", gid)
 
 
 async def set_monitor_rid(pool: Pool, gid: int, rid: int):
 	async with pool.acquire() as con:
 		async with con.transaction():
-			await con.execute(
-				"""
-				UPDATE welcome
-				SET monitor_rid = $2
-				WHERE gid = $1
-				""",
-				gid,
-				rid,
-			)
+			await _SET_MONITOR_RID.execute(con, gid, rid)
+
+	cache.invalidate("welcome", gid)
@@ -0,0 +1,336 @@
+"""In-process write-behind ledger for member experience.
+
+Rewarding a message used to cost a handful of round trips: fetch the member, maybe
+insert them, sum their seasonal logs, update the member and finally log the gain. The
+ledger keeps the state of every active member in memory instead, so rewarding a
+message is a dictionary lookup once a member has been loaded.
+
+Gains are applied in memory immediately and queued. Every FLUSH_INTERVAL seconds the
+queue is written to member_exp and member_exp_log in a single batched transaction.
+The bot flushes on shutdown and the experience cog flushes on unload, so nothing
+queued should ever be lost on a clean exit.
+
+Anything which rewrites member_exp behind the ledger's back (resyncs) must flush
+before and clear() after, otherwise the ledger will keep serving (and eventually write
+back) stale values.
+
+Daily resets don't rewrite anything. Each member's msg_cnt is stored along with
+msg_day, the day it was counted on. A msg_cnt counted on any day other than the
+ledger's day is read as reset, so a daily reset only has to move day forward, see
+ext.daily.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import pendulum
+from asyncpg import Pool
+from discord.ext import tasks
+
+from src import db
+from src.cooldown import CooldownGate
+
+_log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 2  # seconds
+IDLE_EVICT = 1800  # seconds, clean entries idle for this long are dropped
+
+
+def season_of(date: pendulum.DateTime) -> tuple[int, int]:
+	"""Return (year, season) of a date, where season is zero indexed."""
+	return date.year, (date.month - 1) // 3
+
+
+def day_of(date: pendulum.DateTime) -> int:
+	"""Return the days since the unix epoch of a date, in UTC."""
+	return int(date.timestamp() // 86400)
+
+
+@dataclass
+class LedgerEntry:
+	"""A member's experience state as the ledger knows it."""
+
+	gid: int
+	uid: int
+	lifetime: int
+	msg_cnt: int
+	cdr: pendulum.DateTime
+	season: tuple[int, int]
+	seasonal: int
+	msg_day: int
+
+	def on_cooldown(self, now: pendulum.DateTime) -> bool:
+		return self.cdr is not None and now < self.cdr
+
+	def roll_season(self, now: pendulum.DateTime) -> None:
+		"""Start counting from zero if a new season has started since loading."""
+		season = season_of(now)
+		if season != self.season:
+			self.season = season
+			self.seasonal = 0
+
+	def roll_day(self, day: int) -> None:
+		"""Reset the message count if it was counted before the last daily reset."""
+		if self.msg_day != day:
+			self.msg_day = day
+			self.msg_cnt = 1
+			self.cdr = None
+
+
+class ExpLedger:
+	def __init__(self, pool: Pool, cooldowns: CooldownGate):
+		self.pool = pool
+		self.cooldowns = cooldowns
+		self.day = 0  # of the last daily reset, see day_of()
+
+		self._entries: dict[tuple[int, int], LedgerEntry] = {}
+		self._loading: dict[tuple[int, int], asyncio.Future] = {}
+		self._flush_lock = asyncio.Lock()
+
+		# Pending writes since the last flush
+		self._dirty: set[tuple[int, int]] = set()
+		self._lifetime_gain: dict[tuple[int, int], int] = {}
+		self._logs: list[db.table.MemberExpLog] = []
+
+	def start(self) -> None:
+		self._flush_loop.start()
+
+	async def stop(self) -> None:
+		"""Stop the background flush and write whatever is left."""
+		self._flush_loop.cancel()
+		await self.flush()
+
+	@tasks.loop(seconds=FLUSH_INTERVAL)
+	async def _flush_loop(self):
+		try:
+			await self.flush()
+		except Exception as err:
+			# Gains stay queued, the next iteration will try again.
+			_log.error("Experience ledger failed to flush, retrying later.")
+			_log.exception(err)
+
+	async def get(
+		self, gid: int, uid: int, now: pendulum.DateTime
+	) -> LedgerEntry:
+		"""Return the member's entry, loading it from the database on a miss."""
+		key = (gid, uid)
+		entry = self._entries.get(key)
+
+		if entry is None:
+			loading = self._loading.get(key)
+			if loading is None:
+				loading = asyncio.ensure_future(self._load(gid, uid, now))
+				self._loading[key] = loading
+				loading.add_done_callback(
+					lambda _: self._loading.pop(key, None)
+				)
+
+			entry = await asyncio.shield(loading)
+
+		entry.roll_season(now)
+		entry.roll_day(self.day)
+		return entry
+
+	async def _load(
+		self, gid: int, uid: int, now: pendulum.DateTime
+	) -> LedgerEntry:
+		record = await db.member_exp.get_one(self.pool, gid, uid)
+		seasonal = await db.member_exp_log.get_seasonal_by_month(
+			self.pool, gid, uid, now.year, now.month
+		)
+
+		if record is None:  # Member not found, will be inserted on flush
+			entry = LedgerEntry(
+				gid,
+				uid,
+				0,
+				0,
+				now.subtract(hours=1),
+				season_of(now),
+				seasonal or 0,
+				self.day,
+			)
+			self._dirty.add((gid, uid))
+		else:
+			entry = LedgerEntry(
+				gid,
+				uid,
+				record.get("lifetime"),
+				record.get("msg_cnt"),
+				record.get("cdr"),
+				season_of(now),
+				seasonal or 0,
+				record.get("msg_day"),
+			)
+
+		self._entries[(gid, uid)] = entry
+		if entry.on_cooldown(now):
+			self.cooldowns.set(gid, uid, entry.cdr.timestamp())
+
+		return entry
+
+	async def award_message(
+		self,
+		gid: int,
+		uid: int,
+		now: pendulum.DateTime,
+		*,
+		reward: Callable[[int], int],
+		cooldown: pendulum.Duration,
+	) -> tuple[int, tuple[int, int], tuple[int, int]] | None:
+		"""Reward a member for a message, None if they are still on cooldown.
+
+		reward is called with the member's new message count and should return the
+		experience to grant.
+
+		Returns (exp_gain, (seasonal_old, seasonal_new), (lifetime_old, lifetime_new)).
+		"""
+		entry = await self.get(gid, uid, now)
+
+		if entry.on_cooldown(now):
+			return None
+
+		# Nothing below awaits, so the entry can't change under us.
+		entry.msg_cnt += 1
+		exp_gain = reward(entry.msg_cnt)
+		entry.cdr = now + cooldown
+		self.cooldowns.set(gid, uid, entry.cdr.timestamp())
+
+		seasonal = (entry.seasonal, entry.seasonal + exp_gain)
+		lifetime = (entry.lifetime, entry.lifetime + exp_gain)
+		entry.seasonal, entry.lifetime = seasonal[1], lifetime[1]
+
+		key = (gid, uid)
+		self._dirty.add(key)
+		self._lifetime_gain[key] = self._lifetime_gain.get(key, 0) + exp_gain
+		self._logs.append(db.table.MemberExpLog(gid, uid, exp_gain, now))
+
+		return exp_gain, seasonal, lifetime
+
+	async def grant(
+		self,
+		gid: int,
+		uid: int,
+		exp: int,
+		now: pendulum.DateTime,
+		source: db.table.MemberExpLogSourceEnum,
+	) -> tuple[int, int]:
+		"""Log experience from a source other than messages.
+
+		Only the seasonal total is affected, lifetime picks it up on the next
+		incremental sync with the logs. Returns (seasonal_old, seasonal_new).
+		"""
+		entry = await self.get(gid, uid, now)
+
+		seasonal = (entry.seasonal, entry.seasonal + exp)
+		entry.seasonal = seasonal[1]
+
+		self._logs.append(db.table.MemberExpLog(gid, uid, exp, now, source))
+
+		return seasonal
+
+	async def seasonal(
+		self, gid: int, uid: int, now: pendulum.DateTime
+	) -> int:
+		"""Return a member's seasonal exp, including gains not yet flushed."""
+		return (await self.get(gid, uid, now)).seasonal
+
+	async def flush(self) -> None:
+		"""Write every queued gain to the database in one transaction."""
+		async with self._flush_lock:
+			if not self._dirty and not self._logs:
+				return
+
+			dirty, self._dirty = self._dirty, set()
+			gains, self._lifetime_gain = self._lifetime_gain, {}
+			logs, self._logs = self._logs, []
+
+			members = []
+			for key in dirty:
+				entry = self._entries[key]
+				members.append(
+					(
+						entry.gid,
+						entry.uid,
+						gains.get(key, 0),
+						entry.msg_cnt,
+						entry.cdr,
+						entry.msg_day,
+					)
+				)
+
+			try:
+				failed = await db.member_exp.apply_ledger(
+					self.pool, members, logs
+				)
+			except Exception:
+				# Put everything back in front of whatever was queued meanwhile.
+				self._dirty |= dirty
+				for key, gain in gains.items():
+					self._lifetime_gain[key] = (
+						self._lifetime_gain.get(key, 0) + gain
+					)
+				self._logs = logs + self._logs
+				raise
+
+			if failed:
+				_log.warning(
+					"Failed to write %s exp logs, retrying next flush",
+					len(failed),
+				)
+				self._requeue(failed)
+
+			_log.debug(
+				"Flushed %s members and %s exp logs", len(members), len(logs)
+			)
+
+			self._evict_idle()
+
+	def _requeue(self, logs: list[db.table.MemberExpLog]) -> None:
+		"""Queue logs again, along with the lifetime gain held back for them."""
+		self._logs = logs + self._logs
+		for log_ in logs:
+			if log_.source is db.table.MemberExpLogSourceEnum.MESSAGE:
+				key = (log_.gid, log_.uid)
+				self._dirty.add(key)
+				self._lifetime_gain[key] = (
+					self._lifetime_gain.get(key, 0) + log_.exp
+				)
+
+	def _evict_idle(self) -> None:
+		"""Drop clean entries that haven't been rewarded for a while."""
+		horizon = pendulum.now("UTC").subtract(seconds=IDLE_EVICT)
+		pending = self._dirty | {(log_.gid, log_.uid) for log_ in self._logs}
+
+		idle = [
+			key
+			for key, entry in self._entries.items()
+			if key not in pending
+			and (entry.cdr is None or entry.cdr < horizon)
+		]
+		for key in idle:
+			del self._entries[key]
+
+	def roll_day(self, day: int) -> None:
+		"""Start a new day, as of which every message count is read as reset.
+
+		Cooldowns are forgotten as well, a new day starts everyone off cooled down.
+		"""
+		self.day = day
+		self.cooldowns.clear()
+
+	def clear(self) -> None:
+		"""Forget every loaded member so they are read again from the database.
+
+		Must only be called right after a flush, anything queued is kept. Cooldowns are
+		forgotten as well, since resets rewrite cdr.
+		"""
+		self.cooldowns.clear()
+		pending = self._dirty | {(log_.gid, log_.uid) for log_ in self._logs}
+		self._entries = {
+			key: entry
+			for key, entry in self._entries.items()
+			if key in pending
+		}
@@ -1,10 +1,21 @@
-"""Manages spawning of frogs, namely through their tasks."""
+"""Manages spawning of frogs, namely through their tasks.
 
+Frog tasks are run by bot.scheduler, and every change to them goes through it so it
+can wake up for them on time.
+
+Frogs spawn concurrently, since each waits up to persist seconds to be caught. The
+scheduler caps how many spawn at once overall (GLOBAL_SPAWN_LIMIT), and each guild is
+further capped to GUILD_SPAWN_LIMIT. A spawn over its guild's cap is skipped and its
+next one rolled, rather than waiting on the guild while holding a global slot. A
+channel never has more than one live frog.
+"""
+
+import asyncio
 import logging
 import random
 import time
 from asyncio import TimeoutError
-from typing import TYPE_CHECKING
+from dataclasses import dataclass
 
 import discord
 import pendulum
@@ -13,73 +24,102 @@ from pendulum import DateTime
 
 from main import CazzuBot
 from src import db, frog, user_json, utility
+from src.leaderboard_snapshot import Board
 
 _log = logging.getLogger(__name__)
 
-if TYPE_CHECKING:
-	from asyncpg import Record
+GLOBAL_SPAWN_LIMIT = 16
+GUILD_SPAWN_LIMIT = 4
+LATE_WARNING = 5  # seconds
 
 
-async def check_frog_spawn(bot: CazzuBot):
-	records: list[Record] = await db.task.get(bot.pool, tag=["frog"])
-	if not records:
-		return	# no frogs to handle
+@dataclass
+class SpawnMetrics:
+	spawned: int = 0
+	busy: int = 0  # skipped, the channel already had a live frog
+	throttled: int = 0  # skipped, the guild was at GUILD_SPAWN_LIMIT
+	last_lateness: float = 0.0  # seconds between run_at and the frog spawning
+	max_lateness: float = 0.0
+	total_lateness: float = 0.0
 
-	now = pendulum.now("UTC")
-	expired_frog_record: list[Record] = [
-		item for item in records if item["run_at"] < now
-	]
+	def observe(self, lateness: float) -> None:
+		self.spawned += 1
+		self.last_lateness = lateness
+		self.max_lateness = max(self.max_lateness, lateness)
+		self.total_lateness += lateness
+
+	def status(self) -> str:
+		mean = self.total_lateness / self.spawned if self.spawned else 0.0
+		return (
+			f"frog spawns: {self.spawned} spawned, {self.busy} busy, "
+			f"{self.throttled} throttled, "
+			f"lateness {self.last_lateness:.2f}s "
+			f"(mean {mean:.2f}s, max {self.max_lateness:.2f}s)"
+		)
+
+
+spawn_metrics = SpawnMetrics()
+_live_channels: set[int] = set()
+_guild_spawning: dict[int, int] = {}  # gid -> spawning, dropped at 0
 
-	expired_frog_task: list[db.table.Task] = [
-		db.table.Task(**ex) for ex in expired_frog_record
-	]
 
-	# No need to drop frog tasks since, just update when they spawn.
-	# for expired in expired_frog_task:  # would be better to batch so only 1 db call
-	#	  await db.task.drop_one(bot.pool, expired.id)
-
-	for fg in expired_frog_task:
-		gid = fg.payload["gid"]
-
-		# When a guild disables frog, frog tasks should be cleared as well.
-		# Checking if enabled is redundant, since it shouldn't be possible for a
-		# task to exist after a guild disables them.
-		# enabled = await db.frog.get_enabled(bot.pool, gid)
-		# if not enabled:
-		#	  return
-
-		cid = fg.payload["cid"]
-		interval = fg.payload["interval"]
-		persist = fg.payload["persist"]
-		fuzzy = fg.payload["fuzzy"]
-		id = fg.id
-
-		# Roll for future frog, assuming no one will catch this one.
-		# This is to prevent problems where regardless connection issues, or if this
-		# function fails to complete, a future frog will always be rolled based on
-		# when the frog should despawn.
-		run_at = roll_future_frog(
-			pendulum.now("UTC").add(seconds=persist), interval, fuzzy
+async def spawn_frog_task(bot: CazzuBot, fg: db.table.Task):
+	"""Spawn the frog of a frog task which came due, and reroll its next spawn.
+
+	Registered with bot.scheduler as the handler for frog tasks, with a concurrency
+	of GLOBAL_SPAWN_LIMIT.
+	"""
+	# When a guild disables frog, frog tasks should be cleared as well.
+	# Checking if enabled is redundant, since it shouldn't be possible for a
+	# task to exist after a guild disables them.
+	gid = fg.payload["gid"]
+	cid = fg.payload["cid"]
+	interval = fg.payload["interval"]
+	persist = fg.payload["persist"]
+	fuzzy = fg.payload["fuzzy"]
+	id = fg.id
+
+	if _guild_spawning.get(gid, 0) >= GUILD_SPAWN_LIMIT:
+		spawn_metrics.throttled += 1
+		await update_frog_task(
+			bot, id, pendulum.now("UTC"), interval, fuzzy
 		)
-		await db.task.update_run_at(bot.pool, id, run_at)
+		return
+
+	# Roll for future frog, assuming no one will catch this one.
+	# This is to prevent problems where regardless connection issues, or if this
+	# function fails to complete, a future frog will always be rolled based on
+	# when the frog should despawn.
+	await update_frog_task(
+		bot, id, pendulum.now("UTC").add(seconds=persist), interval, fuzzy
+	)
 
-		was_captured = await spawn_and_wait(bot, persist, gid=gid, cid=cid)
+	_guild_spawning[gid] = _guild_spawning.get(gid, 0) + 1
+	try:
+		lateness = max(0.0, time.time() - fg.run_at.timestamp())
+		if lateness > LATE_WARNING:
+			_log.warning("Frog in %s spawning %.1fs late", cid, lateness)
 
-		# Roll next spawn and update run_at
-		# From earlier comment, it when a frog despawns/is captured, it
-		# automatically gets added as a new task. It should ensure that it doesn't
-		# conflict with the guild's frog enabled setting, as if disabled, frogs
-		# shouldn't be spawning at all anymore.
-		enabled = await db.frog.get_enabled(bot.pool, gid)
-		if not enabled:
-			return
+		was_captured = await spawn_and_wait(
+			bot, persist, gid=gid, cid=cid, lateness=lateness
+		)
+	finally:
+		_guild_spawning[gid] -= 1
+		if not _guild_spawning[gid]:
+			del _guild_spawning[gid]
+
+	# Roll next spawn and update run_at
+	# From earlier comment, it when a frog despawns/is captured, it
+	# automatically gets added as a new task. It should ensure that it doesn't
+	# conflict with the guild's frog enabled setting, as if disabled, frogs
+	# shouldn't be spawning at all anymore.
+	enabled = await db.frog.get_enabled(bot.pool, gid)
+	if not enabled:
+		return
 
-		if (
-			was_captured
-		):	# Reroll based on when captured, not when frog despawn.
-			now = pendulum.now("UTC")
-			run_at = roll_future_frog(now, interval, fuzzy)
-			await db.task.update_run_at(bot.pool, id, run_at)
+	if was_captured:  # Reroll based on when captured, not when frog despawn.
+		now = pendulum.now("UTC")
+		await update_frog_task(bot, id, now, interval, fuzzy)
 
 
 async def spawn_and_wait(
@@ -89,12 +129,15 @@ async def spawn_and_wait(
 	ctx: commands.Context = None,
 	gid: int = None,
 	cid: int = None,
+	lateness: float = None,
 ) -> bool:
 	"""Spawn frog and wait until capture.
 
-	Return True if captured, else False.
+	Return True if captured, else False. Also False without spawning if the channel
+	already has a live frog.
 
-	Requires EXCLUSIVELY context OR gid and cid to spawn properly.
+	Requires EXCLUSIVELY context OR gid and cid to spawn properly. Pass lateness to
+	have it recorded in spawn_metrics.
 	"""
 	if ctx is not None:
 		guild = ctx.guild
@@ -104,6 +147,28 @@ async def spawn_and_wait(
 		guild = bot.get_guild(gid)
 		channel = bot.get_channel(cid)
 
+	if channel.id in _live_channels:
+		spawn_metrics.busy += 1
+		return False
+
+	_live_channels.add(channel.id)
+	try:
+		if lateness is not None:
+			spawn_metrics.observe(lateness)
+
+		return await _spawn_and_wait(bot, persist, guild, channel)
+	finally:
+		_live_channels.discard(channel.id)
+
+
+async def _spawn_and_wait(
+	bot: CazzuBot,
+	persist: int,
+	guild: discord.Guild,
+	channel: discord.TextChannel,
+) -> bool:
+	gid = guild.id
+
 	_log.debug(f"Spawning frog in {guild.name}, {channel.name}...")
 	timer_start = time.time()
 	msg = await channel.send("<:cirnoFrog:695126166301835304>")
@@ -124,31 +189,28 @@ async def spawn_and_wait(
 		)  # wait for catch, if caught continue
 		timer_end = time.time()
 		timer_diff = timer_end - timer_start
-		now = pendulum.now()
+		now = pendulum.now("UTC")
 		uid = catcher.id
 
 		frog_type = (
 			db.table.FrogTypeEnum.NORMAL
 		)  # for now until fancy frogs
 
-		log = db.table.MemberFrogLog(gid, uid, frog_type, now, timer_diff)
-		await db.member_frog_log.add(bot.pool, log)
-
-		await db.member_frog.modify_frog(
-			bot.pool,
+		counts, embed_json = await asyncio.gather(
+			db.member_frog.record_capture(
+				bot.pool, gid, uid, frog_type, now, timer_diff
+			),
+			db.frog.get_message(bot.pool, gid),  # cached
+		)
+		frog_cnt_total = counts["frogs"]
+		frog_cnt_seasonal = counts["seasonal"]
+		bot.rankings.update(
+			Board.FROG,
 			gid,
 			uid,
-			modify=1,
-			frog_type=frog_type,
-		)
-
-		# change lifetime cap
-		await db.member_frog.modify_capture(bot.pool, gid, uid, modify=1)
-
-		embed_json = await db.frog.get_message(bot.pool, gid)
-		frog_cnt_total = await db.member_frog.get_frogs(bot.pool, gid, uid)
-		frog_cnt_seasonal = await db.member_frog_log.get_seasonal_by_month(
-			bot.pool, gid, uid, now.year, now.month
+			now,
+			seasonal=frog_cnt_seasonal,
+			lifetime=counts["capture"],
 		)
 
 		utility.deep_map(
@@ -179,12 +241,12 @@ async def spawn_and_wait(
 
 async def clear_guild_frog_task(bot: CazzuBot, gid: int):
 	"""Clear a guild's frog tasks."""
-	await db.task.drop(bot.pool, payload={"gid": gid}, tag=["frog"])
+	await bot.scheduler.drop_by_key("frog", gid)
 
 
 async def clear_frog_task(bot: CazzuBot):
 	"""Clear all frog tasks."""
-	await db.task.drop(bot.pool, tag=["frog"])
+	await bot.scheduler.drop_by_key("frog")
 
 
 async def queue_frog_spawns(
@@ -212,7 +274,7 @@ async def queue_frog_spawns(
 		filter(lambda task: task.payload["gid"] in enabled_gids, task_rows)
 	)
 
-	await db.task.add_many(bot.pool, filtered_tasks)
+	await bot.scheduler.add_many(filtered_tasks)
 
 
 async def reset_frog_tasks(bot: CazzuBot):
@@ -241,10 +303,21 @@ async def reset_guild_frog_tasks(bot: CazzuBot, gid: int):
 
 
 async def update_frog_task(
-	bot: CazzuBot, id: int, now: DateTime, interval: int, fuzzy: float
+	bot: CazzuBot,
+	id: int,
+	now: DateTime,
+	interval: int,
+	fuzzy: float,
+	*,
+	payload: dict = None,
 ):
+	"""Reroll when a frog task runs next, and replace its payload if given."""
 	run_at = roll_future_frog(now, interval, fuzzy)
-	await db.task.update_run_at(bot.pool, id, run_at)
+
+	if payload is None:
+		await bot.scheduler.reschedule(id, run_at)
+	else:
+		await bot.scheduler.update(id, run_at, payload)
 
 
 def roll_fuzzy(fuzzy: float):
@@ -271,4 +344,4 @@ async def add_frog_task(bot: CazzuBot, payload: dict):
 
 	tsk = db.table.Task(["frog"], run_at, payload)
 
-	await db.task.add(bot.pool, tsk)
+	await bot.scheduler.add(tsk)
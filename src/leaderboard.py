@@ -6,22 +6,28 @@ Making a leadeboard is process.
 	3. If you need to perform an operation across a column...
 		3a. Transpose the window with zip(*window) to make data column-major.
 			---> Zipping arrays will yield its transpose; default is row-major
-		3b. Do operations over columns.
+		3b. Do operations over columns. Prefer whole-column functions, like
+			levels_helper.levels_from_exps, over mapping a function per row.
 		3c. Transpose back with zip e.g. zip(col1, col2, col3). Type-cast to list.
-	4. Call generate(). Pass the window (entries), header, desired padding, etc.
-	5. If needed, highlight a specifc index. If you wanted to highlight the focus from
-	   window, remember that create_window returns that index.
-	6. The leaerboard now needs to be joined with newline to create full message.
+	4. Call LeaderboardRenderer.render() with the window (entries), and the index to
+	   highlight if any. If you wanted to highlight the focus from window, remember
+	   that create_window returns that index.
 
-With the complexity of a leaderboard, it would be wise to create a leaderboard class,
-and delegate functionality to said class.
+A LeaderboardRenderer is made once per layout (headers, alignment, padding), and also
+caches rendered pages for those who can key them, see its docstring. format(),
+calc_max_col_width() and highlight_row() are the older, per-call equivalents.
 """
 
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from functools import lru_cache
+
 import discord
 from asyncpg import Record
 from discord.ext import commands
 
-from src import db, levels_helper, utility
+from src import db, levels_helper
 
 
 def create_focus_subset(
@@ -202,8 +208,8 @@ async def _format_leaderboard_subset(
 	"""
 	# Transpose for per-column transformations
 	ranks, uids, exps = zip(*subset)
-	lvls = [levels_helper.level_from_exp(e) for e in exps]
-	names = [await utility.find_username(ctx.bot, ctx, id) for id in uids]
+	lvls = levels_helper.levels_from_exps(exps)
+	names = await ctx.bot.usernames.resolve_many(ctx.guild, uids)
 
 	# Transpose back to prepare to generate
 	window = list(zip(ranks, exps, lvls, names))
@@ -235,3 +241,128 @@ async def _format_leaderboard_subset(
 	embed.color = discord.Color.from_str("#a2dcf7")
 
 	return embed
+
+
+MAX_CACHED_PAGES = 512
+
+
+def display_width(s: str) -> int:
+	"""Return how many monospace columns s takes, wide characters taking two."""
+	return len(s) if s.isascii() else _unicode_width(s)
+
+
+@lru_cache(maxsize=4096)
+def _unicode_width(s: str) -> int:
+	width = 0
+	for char in s:
+		if unicodedata.combining(char) or unicodedata.category(char) in (
+			"Mn",
+			"Me",
+			"Cf",
+		):
+			continue  # combining marks, zero width joiners, variation selectors
+
+		width += 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+	return width
+
+
+class LeaderboardRenderer:
+	"""Renders row-major data as a text scoreboard, like format() and highlight_row().
+
+	The layout is fixed when created, so only the column widths are worked out per
+	render, once, from the cells' display width rather than their length. Rows are
+	then built from a per-column (align, width) template, and the highlighted row is
+	marked as it's built.
+
+	Rendered pages can be kept with remember() and looked up with page(), keyed by
+	anything that changes whenever the page would, such as a leaderboard snapshot's
+	version and the page number.
+	"""
+
+	def __init__(
+		self,
+		headers: Sequence[str],
+		*,
+		align: Sequence[str],
+		fill: str = ".",
+		spacing: int = 2,
+		max_padding: Sequence[int] = (),
+	):
+		self.headers = list(headers)
+		self.align = list(align)
+		self.fill = fill
+		self.spacing = spacing
+		self.max_padding = [p or 999 for p in max_padding] or [999] * len(
+			headers
+		)
+		self._seps = (fill * spacing, " " * spacing)  # even, odd rows
+		self._pages: OrderedDict[Hashable, str] = OrderedDict()
+
+	def render(
+		self, entries: Sequence[Sequence], *, highlight: int | None = None
+	) -> str:
+		"""Return the scoreboard of entries, prepending an @ on row highlight."""
+		cells = [
+			[val if isinstance(val, str) else f"{val:,}" for val in row]
+			for row in entries
+		]
+		widths = self._widths(cells)
+
+		lines = [
+			(" " * self.spacing).join(
+				self._pad(header, width, align, " ")
+				for header, width, align in zip(
+					self.headers, widths, self.align
+				)
+			)
+		]
+		for i, row in enumerate(cells):
+			fill = self.fill if i % 2 == 0 else " "
+			line = self._seps[i % 2].join(
+				self._pad(cell, width, align, fill)
+				for cell, width, align in zip(row, widths, self.align)
+			)
+			if i == highlight:
+				# Nudge the first column right by one, into its separator
+				line = "@" + line[: widths[0]] + line[widths[0] + 1 :]
+
+			lines.append(line)
+
+		return "\n".join(lines)
+
+	def page(self, key: Hashable) -> str | None:
+		"""Return a page remembered under key, None if there isn't one."""
+		page = self._pages.get(key)
+		if page is not None:
+			self._pages.move_to_end(key)
+
+		return page
+
+	def remember(self, key: Hashable, page: str) -> None:
+		self._pages[key] = page
+		self._pages.move_to_end(key)
+		while len(self._pages) > MAX_CACHED_PAGES:
+			self._pages.popitem(last=False)
+
+	def _widths(self, cells: list[list[str]]) -> list[int]:
+		cols = zip(*cells) if cells else [()] * len(self.headers)
+		return [
+			min(max(map(display_width, (header, *col))), cap)
+			for header, col, cap in zip(self.headers, cols, self.max_padding)
+		]
+
+	@staticmethod
+	def _pad(cell: str, width: int, align: str, fill: str) -> str:
+		# Wide characters count as one to ljust() and rjust(), so pad them less
+		if not cell.isascii():
+			width -= display_width(cell) - len(cell)
+
+		if align == "<":
+			return cell.ljust(width, fill)
+
+		if align == ">":
+			return cell.rjust(width, fill)
+
+		pad = max(0, width - len(cell))
+		return fill * (pad // 2) + cell + fill * (pad - pad // 2)
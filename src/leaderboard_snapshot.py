@@ -0,0 +1,196 @@
+"""Shared, immutable snapshots of guild leaderboards.
+
+Paging through c!exp top used to re-run the whole ranked query on every reaction, and
+every session held a copy of its own. Instead, bot.leaderboards keeps one Snapshot
+per (board, guild, year, season), shared by every session looking at it. Flipping
+pages only slices the snapshot.
+
+A snapshot older than STALE_AFTER is still served as is, while a fresh one is fetched
+in the background (stale-while-revalidate). Snapshots taken after their season ended
+never go stale. Each refresh bumps the version, so anything derived from a snapshot
+can tell when it's out of date.
+
+At most MAX_SNAPSHOTS are kept, the least recently viewed being dropped first.
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+import pendulum
+from asyncpg import Pool, Record
+
+from src import db
+
+_log = logging.getLogger(__name__)
+
+STALE_AFTER = 60  # seconds
+MAX_SNAPSHOTS = 256
+PAGE_SIZE = 10
+
+
+class Board(Enum):
+	EXP = "exp"
+	FROG = "frog"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+	"""Ranked rows of (rank, uid, value), as they were when taken."""
+
+	board: Board
+	gid: int
+	year: int | None  # None for lifetime
+	season: int | None  # 0-3
+	version: int
+	rows: tuple[Record, ...]
+	taken_at: float  # time.monotonic()
+	final: bool  # taken well after its season ended, so it never changes
+
+	def __len__(self) -> int:
+		return len(self.rows)
+
+	@property
+	def pages(self) -> int:
+		return max(1, math.ceil(len(self.rows) / PAGE_SIZE))
+
+	def page(self, page: int) -> tuple[Record, ...]:
+		"""Return the rows of page, starting from 1, clamped to the last page."""
+		page = min(max(page, 1), self.pages)
+		return self.rows[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+
+	@property
+	def is_stale(self) -> bool:
+		return (
+			not self.final
+			and time.monotonic() - self.taken_at > STALE_AFTER
+		)
+
+
+_Key = tuple[Board, int, int | None, int | None]
+
+
+class LeaderboardSnapshots:
+	def __init__(self, pool: Pool):
+		self.pool = pool
+		self._snapshots: dict[_Key, Snapshot] = {}
+		self._loading: dict[_Key, asyncio.Task] = {}
+		self._version = 0
+
+	async def seasonal(
+		self, board: Board, gid: int, year: int, season: int
+	) -> Snapshot:
+		"""Return the leaderboard of a season, seasons starting from 0."""
+		return await self._get((board, gid, year, season))
+
+	async def seasonal_by_month(
+		self, board: Board, gid: int, year: int, month: int
+	) -> Snapshot:
+		"""Return the leaderboard of the season month, starting from 1, falls in."""
+		return await self.seasonal(board, gid, year, (month - 1) // 3)
+
+	async def lifetime(self, board: Board, gid: int) -> Snapshot:
+		return await self._get((board, gid, None, None))
+
+	def invalidate(self, gid: int | None = None) -> None:
+		"""Forget snapshots of gid, or all if None. Those in use are unaffected."""
+		for key in [*self._snapshots, *self._loading]:
+			if gid is None or key[1] == gid:
+				self._forget(key)
+
+	def _forget(self, key: _Key) -> None:
+		# A load already under way may have read the database before the change
+		self._snapshots.pop(key, None)
+		self._loading.pop(key, None)
+
+	async def _get(self, key: _Key) -> Snapshot:
+		snapshot = self._snapshots.pop(key, None)
+		if snapshot is None:
+			# Shielded, so a cancelled waiter doesn't cancel it for everyone else
+			return await asyncio.shield(self._refresh(key))
+
+		self._snapshots[key] = snapshot  # most recently viewed last
+
+		if snapshot.is_stale:
+			self._refresh(key)  # in the background, serve this one meanwhile
+
+		return snapshot
+
+	def _refresh(self, key: _Key) -> asyncio.Task:
+		"""Load key, unless it's already being loaded."""
+		loading = self._loading.get(key)
+		if loading is None:
+			loading = asyncio.create_task(self._load(key))
+			self._loading[key] = loading
+			loading.add_done_callback(
+				functools.partial(self._loaded, key)
+			)
+
+		return loading
+
+	def _loaded(self, key: _Key, loading: asyncio.Task) -> None:
+		if self._loading.get(key) is loading:
+			del self._loading[key]
+
+		if not loading.cancelled() and loading.exception() is not None:
+			_log.warning(
+				"Failed to refresh leaderboard %s: %s",
+				key,
+				loading.exception(),
+			)
+
+	async def _load(self, key: _Key) -> Snapshot:
+		board, gid, year, season = key
+		rows = await fetch_ranked(self.pool, board, gid, year, season)
+
+		final = False
+		if season is not None:
+			end = pendulum.datetime(year, 1 + 3 * season, 1).add(months=3)
+			final = pendulum.now("UTC") > end.add(seconds=STALE_AFTER)
+
+		self._version += 1
+		snapshot = Snapshot(
+			board,
+			gid,
+			year,
+			season,
+			self._version,
+			tuple(rows),
+			time.monotonic(),
+			final,
+		)
+		# Unless forgotten while loading, in which case only its caller gets it
+		if self._loading.get(key) is asyncio.current_task():
+			self._snapshots.pop(key, None)
+			self._snapshots[key] = snapshot
+			while len(self._snapshots) > MAX_SNAPSHOTS:
+				del self._snapshots[next(iter(self._snapshots))]
+
+		return snapshot
+
+
+async def fetch_ranked(
+	pool: Pool,
+	board: Board,
+	gid: int,
+	year: int | None,
+	season: int | None,
+) -> list[Record]:
+	if board is Board.EXP:
+		if season is None:
+			return await db.guild.get_members_exp_ranked(pool, gid)
+
+		return await db.guild.get_members_exp_seasonal(
+			pool, gid, year, season
+		)
+
+	if season is None:
+		return await db.member_frog.get_all_member_frogs_ranked(pool, gid)
+
+	return await db.member_frog.get_members_frog_seasonal(
+		pool, gid, year, season
+	)
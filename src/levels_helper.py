@@ -1,7 +1,11 @@
 """Contains helper functions for calculating a level given experience."""
 
 import logging
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable
 from enum import Enum, auto
+from itertools import pairwise
 from math import cos, pi
 
 _log = logging.getLogger(__name__)
@@ -20,7 +24,11 @@ _LOW_Y_APPROACH = 2
 _X_SCALE = 100
 _Y_SCALE = 450
 
-_levels_exp_memo = {0: 0}
+MAX_LEVEL = 1000  # precomputed on import, extended on demand past it
+
+# _thresholds[n] is the cumulative exp required to reach level n from level 0. It is
+# kept as a contiguous array of doubles so lookups are a single bisect.
+_thresholds = array("d", [0.0])
 
 
 class BoundingType(Enum):
@@ -28,50 +36,74 @@ class BoundingType(Enum):
 	LOWER = auto()
 
 
-def exp_to_level_cum(n: int):
-	"""Calculate the cumulative exp requirement from level 0 to level n.
+def precompute(max_level: int) -> None:
+	"""Extend the threshold table so it covers every level up to max_level."""
+	for i in range(len(_thresholds), max_level + 1):
+		_thresholds.append(_thresholds[i - 1] + exp_to_level(i))
 
-	This is iteratively memoized to prevent wasteful recomputing of lower levels.
-	"""
+
+def exp_to_level_cum(n: int):
+	"""Calculate the cumulative exp requirement from level 0 to level n."""
 	if n <= 0:
 		return 0
 
-	global _levels_exp_memo  # noqa: PLW0602
-
-	if n in _levels_exp_memo:
-		return _levels_exp_memo[n]
+	if n >= len(_thresholds):
+		precompute(n)
 
-	last_key = (
-		list(_levels_exp_memo)[-1] if list(_levels_exp_memo)[-1] else 1
-	)
+	return _thresholds[n]
 
-	for i in range(last_key, n + 1):
-		_levels_exp_memo[i] = exp_to_level(i) + _levels_exp_memo[i - 1]
 
-	return _levels_exp_memo[n]
+def _ensure_covers(exp: float) -> None:
+	"""Double the threshold table until exp falls below its last threshold."""
+	while exp >= _thresholds[-1]:
+		top = max(len(_thresholds) - 1, 1) * 2
+		_log.info("Doubling precomputed levels to %s", top)
+		precompute(top)
 
 
 def level_from_exp(exp: int):
-	"""Calculate the level given exp.
-
-	If a lower bin for levels is not found, double the pre-computed memo since it's
-	possible to we may need more queries within this double range.
-	"""
+	"""Calculate the level given exp."""
 	if not exp or exp <= 0:
 		return 0
 
-	while True:
-		res = _bin_up(list(_levels_exp_memo.values()), exp)
+	_ensure_covers(exp)
+	return bisect_right(_thresholds, exp) - 1
+
+
+def levels_from_exps(exps: Iterable[int]) -> list[int]:
+	"""Calculate the levels of a whole column of exp at once.
+
+	Leaderboard columns come already sorted, in which case the thresholds are walked
+	alongside the column in one merge pass, costing O(n + levels spanned). Unsorted
+	columns fall back to a bisect per value.
+	"""
+	exps = [e if e and e > 0 else 0 for e in exps]
+	if not exps:
+		return []
+
+	_ensure_covers(max(exps))
+
+	if all(a >= b for a, b in pairwise(exps)):  # descending, like leaderboards
+		return _merge_levels(exps[::-1])[::-1]
 
-		if res != -1:
-			return res
+	if all(a <= b for a, b in pairwise(exps)):
+		return _merge_levels(exps)
 
-		last_level = 1 if not _get_last_memo()[0] else _get_last_memo()[0]
-		_log.info(
-			"Doubling memoized levels to %s",
-			last_level * 2,
-		)
-		exp_to_level_cum(last_level * 2)
+	return [bisect_right(_thresholds, e) - 1 for e in exps]
+
+
+def _merge_levels(exps: list[int]) -> list[int]:
+	"""Walk the thresholds alongside an ascending column of exp."""
+	levels = []
+	level = bisect_right(_thresholds, exps[0]) - 1
+
+	for exp in exps:
+		while _thresholds[level + 1] <= exp:
+			level += 1
+
+		levels.append(level)
+
+	return levels
 
 
 def exp_to_level(n: int):
@@ -104,34 +136,4 @@ def _combined(x):
 	return (upper - lower) * _base(x) + lower
 
 
-def _get_last_memo():
-	"""Return a [level,exp] of the last last memo."""
-	return list(_levels_exp_memo.items())[-1]
-
-
-def _bin_up(arr, target):
-	"""Return the index i in which the target fits in i and i+1 through binary search.
-
-	arr is supposed to be an 'infinite' memoized series. We want to find the index in
-	which target is greater than arr[i], but less than arr[i+1]. If we are at arr[n], we
-	cannot check for arr[n+1] because that's out of index. We want to return -1, and the
-	caller should expand arr and call this function again to try to find the index.
-	"""
-	left, right = 0, len(arr) - 1
-
-	while left <= right:
-		mid = left + (right - left) // 2
-		# If checking forward is out of scope, break and return -1
-		# to generate more levels to look up.
-		if mid + 1 >= len(arr):
-			break
-
-		if arr[mid] <= target and target < arr[mid + 1]:
-			return mid
-
-		if target > arr[mid]:
-			left = mid + 1
-		else:
-			right = mid - 1
-
-	return -1  #
+precompute(MAX_LEVEL)
@@ -4,10 +4,11 @@ The original idea was to store member-rank data as a junction table, but rank ca
 trivially be derived from experience. We don't the junction table.
 """
 
+import bisect
 import logging
 
 import discord
-from asyncpg import Record
+from asyncpg import Pool, Record
 
 from src import db, user_json, utility
 from src.cazzubot import CazzuBot
@@ -26,7 +27,8 @@ async def on_msg_handle_ranks(
 ):
 	"""Handle potential rank ups from level ups.
 
-	Also keeps rank integrity regardless of level up.
+	Also keeps rank integrity regardless of level up, though only does role work when
+	the member's rank differs from the one last applied, see src.rank_integrity.
 
 	Called from ext.experience
 	"""
@@ -41,15 +43,92 @@ async def on_msg_handle_ranks(
 	ranks_to_remove = [r for r in seasonal_remove + lifetime_remove if r]
 
 	member = message.author
-	if ranks_to_add:
-		_log.debug("Rank_Integrity::Adding ranks %s", ranks_to_add)
-		await member.add_roles(
-			*ranks_to_add, reason="Rank up/Rank-role integrity"
-		)
+	try:
+		if ranks_to_add:
+			_log.debug("Rank_Integrity::Adding ranks %s", ranks_to_add)
+			await member.add_roles(
+				*ranks_to_add, reason="Rank up/Rank-role integrity"
+			)
+
+		if ranks_to_remove:
+			_log.debug("Rank_Integrity::Removing ranks %s", ranks_to_remove)
+			await member.remove_roles(*ranks_to_remove)
+	except discord.HTTPException:
+		bot.rank_integrity.invalidate_member(member.guild.id, member.id)
+		raise
+
+
+class RankLadder:
+	"""The rank thresholds of one guild and window, compiled for lookups.
+
+	Thresholds are kept sorted alongside their rids, so a level resolves to its rank
+	with a bisect. The roles to add and remove for every rank are worked out up front
+	for both keep_old policies. Index -1 stands for not high enough for any rank.
+	"""
+
+	__slots__ = ("thresholds", "rids", "_keep_old", "_only_current")
+
+	def __init__(self, rank_thresholds: list[Record]):
+		rows = sorted(rank_thresholds, key=lambda r: r["threshold"])
+		self.thresholds = tuple(r["threshold"] for r in rows)
+		self.rids = tuple(r["rid"] for r in rows)
+
+		# (add, remove) rids, offset by one so index -1 lands on 0
+		rids = self.rids
+		self._keep_old = [((), rids)] + [
+			(rids[: i + 1], rids[i + 1 :]) for i in range(len(rids))
+		]
+		self._only_current = [((), rids)] + [
+			((rid,), rids[:i] + rids[i + 1 :]) for i, rid in enumerate(rids)
+		]
+
+	def __len__(self) -> int:
+		return len(self.rids)
+
+	def __eq__(self, other) -> bool:
+		if not isinstance(other, RankLadder):
+			return NotImplemented
+
+		return self.rids == other.rids and self.thresholds == other.thresholds
+
+	__hash__ = None
+
+	def index(self, level: int) -> int:
+		"""Return the index of the rank for level, -1 if none."""
+		return bisect.bisect_right(self.thresholds, level) - 1
+
+	def rid(self, index: int) -> int | None:
+		return self.rids[index] if index >= 0 else None
+
+	def resolve(self, level: int) -> tuple[int | None, int | None]:
+		"""Return (rank_id, rank_index), (None, None) if below every rank."""
+		index = self.index(level)
+		if index < 0:
+			return None, None
+
+		return self.rids[index], index
 
-	if ranks_to_remove:
-		_log.debug("Rank_Integrity::Removing ranks %s", ranks_to_remove)
-		await member.remove_roles(*ranks_to_remove)
+	def changes(
+		self, index: int, *, keep_old: bool
+	) -> tuple[tuple[int, ...], tuple[int, ...]]:
+		"""Return the rids a member at rank index should have and should not have."""
+		policy = self._keep_old if keep_old else self._only_current
+		return policy[index + 1]
+
+
+@db.cache.cached("rank_ladder", copy_value=False)
+async def get_ladder(
+	pool: Pool,
+	gid: int,
+	*,
+	mode: WindowEnum = WindowEnum.SEASONAL,
+) -> RankLadder:
+	"""Return the compiled rank ladder of a guild.
+
+	Cached in its own namespace, which db.rank_threshold invalidates along with its own
+	whenever the thresholds change.
+	"""
+	return RankLadder(await db.rank_threshold.get(pool, gid, mode=mode))
 
 
 async def _determine_rank_changes(
@@ -73,33 +152,28 @@ async def _determine_rank_changes(
 	if not enabled:
 		return ([None], [None])
 
-	rank_threshold_payload = await db.rank_threshold.get(
-		bot.pool, gid, mode=mode
-	)
+	ladder = await get_ladder(bot.pool, gid, mode=mode)
 
-	if len(rank_threshold_payload) == 0:  # no threshold ranks set yet
+	if not ladder:  # no threshold ranks set yet
 		return ([None], [None])
 
 	member = message.author
+	guild = message.guild
 
-	rid, ind = rank_difference(bot, level, rank_threshold_payload)
-	rids = [row.get("rid") for row in rank_threshold_payload]
-	ranks = [message.guild.get_role(rid) for rid in rids]
+	rid, ind = rank_difference(bot, level, ladder)
 
 	# if rank up, send rank message
 	if notify and rid.new != rid.old:
-		seasonal_rank_new = message.guild.get_role(rid.new)
-		if (
-			seasonal_rank_new is not None
-		):	# if is None, role was deleted from guild
-			rank_old = message.guild.get_role(rid.old)
+		rank_new = guild.get_role(rid.new)
+		if rank_new is not None:  # if is None, role was deleted from guild
+			rank_old = guild.get_role(rid.old)
 
 			utility.deep_map(
 				embed_json,
 				formatter,
 				member=member,
 				rank_old=rank_old,
-				rank_new=seasonal_rank_new,
+				rank_new=rank_new,
 				level_old=level.old,
 				level_new=level.new,
 			)
@@ -109,47 +183,45 @@ async def _determine_rank_changes(
 			content, embed=embed, embeds=embeds, delete_after=delete_after
 		)
 
-	# Ensure rank-role integreity
-	if rid.new is not None:
-		if keep_old:
-			ranks_to_add = ranks[: ind.new + 1]
-			ranks_to_remove = ranks[ind.new + 1 :]
-
-		else:
-			ranks_to_add = [seasonal_rank_new]
-			remove_seasonal = ranks[: ind.new] + ranks[ind.new + 1 :]
+	# Ensure rank-role integreity, unless already applied for this rank
+	index_new = -1 if ind.new is None else ind.new
+	if bot.rank_integrity.is_settled(
+		gid, member.id, mode, ladder, keep_old, index_new
+	):
+		return ([], [])
 
-			ranks_to_remove = remove_seasonal
-	else:  # rid.new is None, meaning user is not high ranked enough for any ranks
-		ranks_to_add = []
-		ranks_to_remove = ranks
+	add_rids, remove_rids = ladder.changes(index_new, keep_old=keep_old)
 
 	# Filtering
-	ranks_to_add = [r for r in ranks_to_add if r and r not in member.roles]
+	member_rids = {r.id for r in member.roles}
+	ranks_to_add = [
+		guild.get_role(r) for r in add_rids if r not in member_rids
+	]
 	ranks_to_remove = [
-		r for r in ranks_to_remove if r and r in member.roles
+		guild.get_role(r) for r in remove_rids if r in member_rids
 	]
 
-	return ranks_to_add, ranks_to_remove
+	# on_msg_handle_ranks invalidates this again should applying fail
+	bot.rank_integrity.mark(gid, member.id, mode, ladder, keep_old, index_new)
+
+	return [r for r in ranks_to_add if r], [r for r in ranks_to_remove if r]
 
 
-def calc_min_rank(rank_thresholds: list[Record], level) -> tuple[int, int]:
-	"""Naively determine rank based on level from list of records.
+def calc_min_rank(
+	rank_thresholds: list[Record] | RankLadder, level
+) -> tuple[int, int]:
+	"""Determine rank based on level.
 
 	Returns (rank_id, rank_index). (None, None) if not high enough for any rank.
 	"""
-	if level < rank_thresholds[0]["threshold"]:
-		return None, None
+	if not isinstance(rank_thresholds, RankLadder):
+		rank_thresholds = RankLadder(rank_thresholds)
 
-	for i in range(1, len(rank_thresholds)):
-		if level < rank_thresholds[i]["threshold"]:
-			return rank_thresholds[i - 1]["rid"], i - 1
-
-	return rank_thresholds[-1]["rid"], len(rank_thresholds) - 1
+	return rank_thresholds.resolve(level)
 
 
 def rank_difference(
-	bot: CazzuBot, level: utility.OldNew, rids: list[Record]
+	bot: CazzuBot, level: utility.OldNew, rids: RankLadder | list[Record]
 ) -> tuple[utility.OldNew, utility.OldNew]:
 	"""Return ranks corrosponding to given levels with their index to rids.
 
@@ -159,12 +231,14 @@ def rank_difference(
 	Remember that it's possible for values to be None, which indicate a member is not
 	high enough level for any ranks.
 	"""
-	if not isinstance(rids, list):
-		msg = f"rids must be a list, not of type {type(rids)}"
+	if isinstance(rids, list):
+		rids = RankLadder(rids)
+	elif not isinstance(rids, RankLadder):
+		msg = f"rids must be a RankLadder or list, not of type {type(rids)}"
 		raise TypeError(msg)
 
-	rid_new, index_new = calc_min_rank(rids, level.new)
-	rid_old, index_old = calc_min_rank(rids, level.old)
+	rid_new, index_new = rids.resolve(level.new)
+	rid_old, index_old = rids.resolve(level.old)
 
 	# return rid_old, index_old, rid_new, index_new
 	return utility.OldNew(rid_old, rid_new), utility.OldNew(
@@ -172,7 +246,9 @@ def rank_difference(
 	)
 
 
-def ranked_up(bot: CazzuBot, level: utility.OldNew, rids: list[Record]):
+def ranked_up(
+	bot: CazzuBot, level: utility.OldNew, rids: RankLadder | list[Record]
+):
 	"""Return true if going from level_old to level_new would result in a new rank.
 
 	Requires that you've already made a database call to get the ranked ids. If you
@@ -181,12 +257,10 @@ def ranked_up(bot: CazzuBot, level: utility.OldNew, rids: list[Record]):
 	Remember that it's possible for values to be None, which indicate a member is not
 	high enough level for any ranks.
 	"""
-	payload = rank_difference(bot, level.old, level.new, rids)
-
-	if not payload:
+	if not rids:
 		return False  # admin has yet to set up ranks
 
-	_, index = payload
+	_, index = rank_difference(bot, level, rids)
 
 	return index.new != index.old
 
@@ -207,12 +281,12 @@ async def get_rank_difference(
 		msg = f"gid must be a int, not of type {type(gid)}"
 		raise TypeError(msg)
 
-	rids = await db.rank_threshold.get(bot.pool, gid, mode=mode)
+	ladder = await get_ladder(bot.pool, gid, mode=mode)
 
-	if not rids:
+	if not ladder:
 		return None  # admin has yet to set up ranks
 
-	return rank_difference(bot, level, rids)
+	return rank_difference(bot, level, ladder)
 
 
 async def get_ranked_up(bot: CazzuBot, level: utility.OldNew, gid: int):
@@ -0,0 +1,139 @@
+"""Remembers which rank roles were last applied to each member.
+
+Rank integrity used to be enforced by working out and diffing every rank role on
+every rewarded message, even though a member's rank almost never changes between two
+messages. This keeps, per (gid, uid, window), the ladder, keep_old policy and rank
+index roles were last applied for. While all three still match, there is nothing to
+do and the message skips the role work entirely.
+
+Ladders compare equal by their thresholds, so an entry applied under thresholds
+since changed is stale by itself. Role changes made outside the bot are caught
+by verifying members on on_member_update, and sweep() periodically drops entries whose
+roles no longer match what was applied.
+"""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+import discord
+
+from src.db.table import WindowEnum
+
+if TYPE_CHECKING:
+	from src.rank import RankLadder
+
+_log = logging.getLogger(__name__)
+
+MAX_SIZE = 100_000
+SWEEP_BATCH = 1000
+
+
+class RankIntegrity:
+	def __init__(self, max_size: int = MAX_SIZE):
+		self.max_size = max_size
+		# (gid, uid, mode) -> (ladder, keep_old, index)
+		self._applied: dict[
+			tuple[int, int, WindowEnum], tuple["RankLadder", bool, int]
+		] = {}
+
+	def __len__(self) -> int:
+		return len(self._applied)
+
+	def is_settled(
+		self,
+		gid: int,
+		uid: int,
+		mode: WindowEnum,
+		ladder: "RankLadder",
+		keep_old: bool,
+		index: int,
+	) -> bool:
+		"""Return True if the member already has the roles for this rank applied."""
+		applied = self._applied.get((gid, uid, mode))
+		return (
+			applied is not None
+			and applied[0] == ladder
+			and applied[1] == keep_old
+			and applied[2] == index
+		)
+
+	def mark(
+		self,
+		gid: int,
+		uid: int,
+		mode: WindowEnum,
+		ladder: "RankLadder",
+		keep_old: bool,
+		index: int,
+	) -> None:
+		"""Record that the member's roles now match this rank."""
+		key = (gid, uid, mode)
+		self._applied.pop(key, None)  # re-insert at the back
+		self._applied[key] = (ladder, keep_old, index)
+
+		while len(self._applied) > self.max_size:
+			del self._applied[next(iter(self._applied))]
+
+	def invalidate_member(self, gid: int, uid: int) -> None:
+		for mode in WindowEnum:
+			self._applied.pop((gid, uid, mode), None)
+
+	def verify_member(self, member: discord.Member) -> None:
+		"""Drop the member's entries if their roles no longer match what was applied.
+
+		Meant for role updates, which also fire for the roles this bot applies itself.
+		"""
+		for mode in WindowEnum:
+			key = (member.guild.id, member.id, mode)
+			applied = self._applied.get(key)
+			if applied is not None and not _holds(member, *applied):
+				del self._applied[key]
+
+	def invalidate_guild(self, gid: int) -> None:
+		for key in [k for k in self._applied if k[0] == gid]:
+			del self._applied[key]
+
+	def clear(self) -> None:
+		self._applied.clear()
+
+	async def sweep(self, bot: discord.Client) -> int:
+		"""Drop entries whose member no longer holds the roles applied.
+
+		Only looks at cached guild members and roles, so it costs no requests. Those
+		dropped are worked out again on their next rewarded message. Returns how many
+		were dropped.
+		"""
+		dropped = 0
+		for i, (key, applied) in enumerate(list(self._applied.items())):
+			if i and i % SWEEP_BATCH == 0:
+				await asyncio.sleep(0)  # don't hog the loop on large sweeps
+
+			gid, uid, _ = key
+			guild = bot.get_guild(gid)
+			member = guild.get_member(uid) if guild else None
+
+			if member is None or not _holds(member, *applied):
+				if self._applied.get(key) is applied:
+					del self._applied[key]
+				dropped += 1
+
+		if dropped:
+			_log.info("Rank integrity sweep dropped %s members", dropped)
+
+		return dropped
+
+
+def _holds(
+	member: discord.Member, ladder: "RankLadder", keep_old: bool, index: int
+) -> bool:
+	"""Return True if member holds exactly the rank roles for index."""
+	add_rids, remove_rids = ladder.changes(index, keep_old=keep_old)
+	guild = member.guild
+
+	# Roles deleted from the guild can't be held, and are skipped when applying too
+	return all(
+		member.get_role(r) is not None
+		for r in add_rids
+		if guild.get_role(r)
+	) and not any(member.get_role(r) is not None for r in remove_rids)
@@ -0,0 +1,315 @@
+"""Re-applies rank roles across every member of a guild.
+
+Members normally only have their ranks fixed up on their next rewarded message, so
+changing thresholds leaves everyone else wearing stale ranks. A Reconciliation
+reads each enabled window once as a ranked query, computes every member's target
+roles from it in one pass, and queues an edit only for members whose roles differ.
+
+Edits are applied by a few concurrent workers sharing one pacer, which keeps the whole
+run under RATE role requests per second on top of discord.py's own rate limit
+handling. Only the roles planned are added or removed, one request each, so roles
+changed by anyone else since planning are left alone.
+
+Progress is checkpointed to db.internal as a uid cursor, below which every member has
+been handled. A run that was interrupted picks up from there instead of starting
+over, see ext.rank.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from operator import attrgetter
+
+import discord
+import pendulum
+
+from src import db, levels_helper, rank
+from src.cazzubot import CazzuBot
+from src.db.table import WindowEnum
+
+_log = logging.getLogger(__name__)
+
+CONCURRENCY = 4
+RATE = 5.0  # role requests per second, across all workers
+RATE_LIMITED_BACKOFF = 10  # seconds, if discord.py gave up retrying a 429
+PROGRESS_INTERVAL = 10  # seconds
+
+
+@dataclass
+class _Window:
+	mode: WindowEnum
+	ladder: rank.RankLadder
+	keep_old: bool
+	indices: dict[int, int]  # uid -> rank index, missing is -1
+
+
+@dataclass
+class _Edit:
+	uid: int
+	add: set[int]
+	remove: set[int]
+	indices: list[tuple[_Window, int]]
+
+
+class _Pacer:
+	"""Spaces out calls to at most rate per second, shared by all workers."""
+
+	def __init__(self, rate: float):
+		self.interval = 1 / rate
+		self._next = 0.0
+		self._lock = asyncio.Lock()
+
+	async def wait(self) -> None:
+		async with self._lock:
+			now = time.monotonic()
+			delay = self._next - now
+			self._next = max(now, self._next) + self.interval
+
+		if delay > 0:
+			await asyncio.sleep(delay)
+
+	def backoff(self, seconds: float) -> None:
+		self._next = max(self._next, time.monotonic() + seconds)
+
+
+class Reconciliation:
+	"""A single run over one guild, starting after the member uid after."""
+
+	def __init__(
+		self,
+		bot: CazzuBot,
+		guild: discord.Guild,
+		*,
+		after: int = 0,
+		progress: discord.Message | None = None,
+	):
+		self.bot = bot
+		self.guild = guild
+		self.after = after
+		self.progress = progress
+
+		self.checked = 0
+		self.total = 0
+		self.done = 0
+		self.failed = 0
+
+		self._edits: list[_Edit] = []
+		self._finished: list[bool] = []
+		self._watermark = 0  # every edit before this index is finished
+		self._pacer = _Pacer(RATE)
+
+	@property
+	def cursor(self) -> int:
+		"""The uid up to which every member has been handled."""
+		while (
+			self._watermark < len(self._finished)
+			and self._finished[self._watermark]
+		):
+			self._watermark += 1
+
+		if self._watermark == len(self._edits):
+			return self._edits[-1].uid if self._edits else self.after
+
+		if self._watermark == 0:
+			return self.after
+
+		return self._edits[self._watermark - 1].uid
+
+	def status(self) -> str:
+		return (
+			f"Reconciling ranks: {self.done + self.failed}/{self.total} edits "
+			f"({self.failed} failed), {self.checked} members checked."
+		)
+
+	async def run(self) -> None:
+		gid = self.guild.id
+		await db.internal.set_rank_reconcile_cursor(
+			self.bot.pool, gid, self.after
+		)
+
+		self._edits = await self._plan()
+		self._finished = [False] * len(self._edits)
+		self.total = len(self._edits)
+		_log.info(
+			"Reconciling ranks of %s: %s edits for %s members",
+			gid,
+			self.total,
+			self.checked,
+		)
+
+		queue = asyncio.Queue()
+		for i in range(len(self._edits)):
+			queue.put_nowait(i)
+
+		workers = [
+			asyncio.create_task(self._worker(queue))
+			for _ in range(CONCURRENCY)
+		]
+		reporter = asyncio.create_task(self._report())
+
+		try:
+			await queue.join()
+		finally:
+			for task in [*workers, reporter]:
+				task.cancel()
+
+			await db.internal.set_rank_reconcile_cursor(
+				self.bot.pool, gid, self.cursor
+			)
+
+		await db.internal.del_rank_reconcile_cursor(self.bot.pool, gid)
+		await self._edit_progress(f"Done! {self.status()}")
+
+	async def _plan(self) -> list[_Edit]:
+		"""Return the role edits needed, ordered by uid."""
+		# The ranked queries read the database, so buffered exp has to land first
+		await self.bot.exp_ledger.flush()
+
+		if not self.guild.chunked:
+			await self.guild.chunk()
+
+		windows = [
+			window
+			for mode in WindowEnum
+			if (window := await self._load_window(mode)) is not None
+		]
+
+		edits = []
+		for member in sorted(self.guild.members, key=attrgetter("id")):
+			if member.id <= self.after or member.bot:
+				continue
+
+			self.checked += 1
+
+			add, remove, indices = set(), set(), []
+			for window in windows:
+				index = window.indices.get(member.id, -1)
+				add_rids, remove_rids = window.ladder.changes(
+					index, keep_old=window.keep_old
+				)
+				add.update(add_rids)
+				remove.update(remove_rids)
+				indices.append((window, index))
+
+			# Roles deleted from the guild are skipped, like on rank ups
+			add = {
+				r
+				for r in add
+				if member.get_role(r) is None and self.guild.get_role(r)
+			}
+			remove = {r for r in remove if member.get_role(r) is not None}
+
+			edit = _Edit(member.id, add, remove, indices)
+			if add or remove:
+				edits.append(edit)
+			else:
+				self._mark(edit)
+
+		return edits
+
+	async def _load_window(self, mode: WindowEnum) -> _Window | None:
+		pool = self.bot.pool
+		gid = self.guild.id
+
+		_, enabled, keep_old, _ = (
+			await db.rank.get(pool, gid, mode=mode)
+		).values()
+		if not enabled:
+			return None
+
+		ladder = await rank.get_ladder(pool, gid, mode=mode)
+		if not ladder:
+			return None
+
+		if mode == WindowEnum.SEASONAL:
+			now = pendulum.now("UTC")
+			rows = await db.guild.get_members_exp_seasonal_by_month(
+				pool, gid, now.year, now.month
+			)
+			exps = [r["exp_sum"] for r in rows]
+		else:
+			rows = await db.guild.get_members_exp_ranked(pool, gid)
+			exps = [r["lifetime"] for r in rows]
+
+		levels = levels_helper.levels_from_exps(exps)
+		indices = {
+			r["uid"]: ladder.index(level) for r, level in zip(rows, levels)
+		}
+
+		return _Window(mode, ladder, keep_old, indices)
+
+	async def _worker(self, queue: asyncio.Queue) -> None:
+		while True:
+			i = await queue.get()
+			edit = self._edits[i]
+			try:
+				await self._apply(edit)
+				self._mark(edit)
+				self.done += 1
+			except discord.HTTPException as err:
+				self.failed += 1
+				_log.warning(
+					"Failed to reconcile ranks of %s in %s: %s",
+					edit.uid,
+					self.guild.id,
+					err,
+				)
+				if err.status == 429:
+					self._pacer.backoff(RATE_LIMITED_BACKOFF)
+			finally:
+				self._finished[i] = True
+				queue.task_done()
+
+	async def _apply(self, edit: _Edit) -> None:
+		member = self.guild.get_member(edit.uid)
+		if member is None:  # left since planning
+			return
+
+		add = [
+			role
+			for r in edit.add
+			if member.get_role(r) is None and (role := self.guild.get_role(r))
+		]
+		remove = [
+			role
+			for r in edit.remove
+			if (role := member.get_role(r)) is not None
+		]
+
+		for role in add:
+			await self._pacer.wait()
+			await member.add_roles(role, reason="Rank reconciliation")
+
+		for role in remove:
+			await self._pacer.wait()
+			await member.remove_roles(role, reason="Rank reconciliation")
+
+	def _mark(self, edit: _Edit) -> None:
+		for window, index in edit.indices:
+			self.bot.rank_integrity.mark(
+				self.guild.id,
+				edit.uid,
+				window.mode,
+				window.ladder,
+				window.keep_old,
+				index,
+			)
+
+	async def _report(self) -> None:
+		"""Report progress and checkpoint the cursor until cancelled."""
+		while True:
+			await asyncio.sleep(PROGRESS_INTERVAL)
+			await db.internal.set_rank_reconcile_cursor(
+				self.bot.pool, self.guild.id, self.cursor
+			)
+			await self._edit_progress(self.status())
+
+	async def _edit_progress(self, content: str) -> None:
+		if self.progress is None:
+			return
+
+		try:
+			await self.progress.edit(content=content)
+		except discord.HTTPException:
+			self.progress = None  # deleted, stop reporting
@@ -0,0 +1,377 @@
+"""In-memory member rankings, for finding where a member places without the whole list.
+
+Membership cards used to fetch every member of a guild ranked, only to find one
+member in it and show the few around them. bot.rankings instead keeps a Ranking per
+(board, guild, season), loaded once, which awards then update as they happen.
+
+A Ranking is ordered by (-value, uid) in a SortedKeys, a sorted list split into
+buckets, with a Fenwick tree over the bucket sizes. Finding a member's position, the
+member at a position, or adding and removing one are all O(log n), give or take
+shifting a bucket of at most 2 * LOAD keys.
+
+Ranks follow RANK() in the database, tied members share a rank and the next rank is
+skipped.
+"""
+
+import asyncio
+import functools
+import logging
+from bisect import bisect_left, insort
+from collections.abc import Iterable
+
+import pendulum
+from asyncpg import Pool
+
+from src.exp_ledger import ExpLedger, season_of
+from src.leaderboard_snapshot import Board, fetch_ranked
+
+_log = logging.getLogger(__name__)
+
+LOAD = 256
+
+Row = tuple[int, int, int]  # (rank, uid, value), like the ranked queries
+
+
+class SortedKeys:
+	"""A sorted list of unique keys, kept as buckets of at most 2 * LOAD keys."""
+
+	def __init__(self, keys: Iterable = ()):
+		keys = sorted(keys)
+		self._buckets = [keys[i : i + LOAD] for i in range(0, len(keys), LOAD)]
+		self._maxes = [bucket[-1] for bucket in self._buckets]
+		self._len = len(keys)
+		self._build_tree()
+
+	def __len__(self) -> int:
+		return self._len
+
+	def __getitem__(self, index: int):
+		if index < 0:
+			index += self._len
+
+		if not 0 <= index < self._len:
+			msg = "SortedKeys index out of range"
+			raise IndexError(msg)
+
+		i, j = self._locate(index)
+		return self._buckets[i][j]
+
+	def add(self, key) -> None:
+		if not self._buckets:
+			self._buckets.append([key])
+			self._maxes.append(key)
+			self._len = 1
+			self._build_tree()
+			return
+
+		i = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+		bucket = self._buckets[i]
+		insort(bucket, key)
+		self._maxes[i] = bucket[-1]
+		self._len += 1
+
+		if len(bucket) > 2 * LOAD:
+			self._buckets[i : i + 1] = [bucket[:LOAD], bucket[LOAD:]]
+			self._maxes[i : i + 1] = [bucket[LOAD - 1], bucket[-1]]
+			self._build_tree()
+		else:
+			self._tree_add(i, 1)
+
+	def remove(self, key) -> None:
+		"""Remove key, raising ValueError if it isn't there."""
+		i = bisect_left(self._maxes, key)
+		if i == len(self._maxes):
+			raise ValueError(key)
+
+		bucket = self._buckets[i]
+		j = bisect_left(bucket, key)
+		if bucket[j] != key:
+			raise ValueError(key)
+
+		del bucket[j]
+		self._len -= 1
+
+		if bucket:
+			self._maxes[i] = bucket[-1]
+			self._tree_add(i, -1)
+		else:
+			del self._buckets[i]
+			del self._maxes[i]
+			self._build_tree()
+
+	def bisect_left(self, key) -> int:
+		"""Return how many keys are less than key."""
+		i = bisect_left(self._maxes, key)
+		if i == len(self._maxes):
+			return self._len
+
+		return self._prefix(i) + bisect_left(self._buckets[i], key)
+
+	def slice(self, start: int, stop: int) -> list:
+		"""Return the keys from position start up to stop."""
+		start, stop = max(start, 0), min(stop, self._len)
+		if start >= stop:
+			return []
+
+		i, j = self._locate(start)
+		keys = []
+		while len(keys) < stop - start:
+			keys.extend(self._buckets[i][j : j + stop - start - len(keys)])
+			i, j = i + 1, 0
+
+		return keys
+
+	# Fenwick tree over bucket sizes, 1-indexed
+
+	def _build_tree(self) -> None:
+		tree = [0] * (len(self._buckets) + 1)
+		for i, bucket in enumerate(self._buckets, 1):
+			tree[i] += len(bucket)
+			parent = i + (i & -i)
+			if parent < len(tree):
+				tree[parent] += tree[i]
+
+		self._tree = tree
+
+	def _tree_add(self, bucket: int, delta: int) -> None:
+		i = bucket + 1
+		while i < len(self._tree):
+			self._tree[i] += delta
+			i += i & -i
+
+	def _prefix(self, bucket: int) -> int:
+		"""Return how many keys are in the buckets before bucket."""
+		total = 0
+		i = bucket
+		while i > 0:
+			total += self._tree[i]
+			i -= i & -i
+
+		return total
+
+	def _locate(self, index: int) -> tuple[int, int]:
+		"""Return the bucket holding position index, and where in that bucket."""
+		bucket = 0
+		step = 1 << (len(self._tree) - 1).bit_length()
+		while step:
+			probe = bucket + step
+			if probe < len(self._tree) and self._tree[probe] <= index:
+				bucket = probe
+				index -= self._tree[probe]
+			step >>= 1
+
+		return bucket, index
+
+
+class Ranking:
+	"""Members ordered by value, highest first, ties broken by uid."""
+
+	def __init__(self, values: dict[int, int] = {}):
+		self._values = dict(values)
+		self._keys = SortedKeys(
+			(-value, uid) for uid, value in self._values.items()
+		)
+
+	def __len__(self) -> int:
+		return len(self._values)
+
+	def __contains__(self, uid: int) -> bool:
+		return uid in self._values
+
+	def get(self, uid: int) -> int | None:
+		return self._values.get(uid)
+
+	def set(self, uid: int, value: int) -> None:
+		old = self._values.get(uid)
+		if old == value:
+			return
+
+		if old is not None:
+			self._keys.remove((-old, uid))
+
+		self._values[uid] = value
+		self._keys.add((-value, uid))
+
+	def remove(self, uid: int) -> None:
+		value = self._values.pop(uid, None)
+		if value is not None:
+			self._keys.remove((-value, uid))
+
+	def position(self, uid: int) -> int | None:
+		"""Return where uid is in the ranking from 0, None if not ranked."""
+		value = self._values.get(uid)
+		if value is None:
+			return None
+
+		return self._keys.bisect_left((-value, uid))
+
+	def rank(self, uid: int) -> int | None:
+		value = self._values.get(uid)
+		if value is None:
+			return None
+
+		return self._rank_of(value)
+
+	def top(self, k: int) -> list[Row]:
+		return self.rows(0, k)
+
+	def rows(self, start: int, stop: int) -> list[Row]:
+		"""Return rows from position start up to stop."""
+		return [
+			(self._rank_of(-neg_value), uid, -neg_value)
+			for neg_value, uid in self._keys.slice(start, stop)
+		]
+
+	def neighbours(
+		self, uid: int, *, size: int = 5
+	) -> tuple[list[Row], int] | None:
+		"""Return the size rows around uid, and where uid is among them.
+
+		Like leaderboard.create_focus_subset, the window is shifted rather than cut
+		short at either end. None if uid isn't ranked.
+		"""
+		position = self.position(uid)
+		if position is None:
+			return None
+
+		lower = position - (size - 1) // 2
+		lower = max(0, min(lower, len(self) - size))
+		return self.rows(lower, lower + size), position - lower
+
+	def _rank_of(self, value: int) -> int:
+		# (-value,) sorts before every (-value, uid), so this counts members above
+		return self._keys.bisect_left((-value,)) + 1
+
+
+_Key = tuple[Board, int, tuple[int, int] | None]
+
+
+class Rankings:
+	"""Every loaded Ranking of the bot, see the module docstring."""
+
+	def __init__(self, pool: Pool, ledger: ExpLedger):
+		self.pool = pool
+		self.ledger = ledger
+		self._rankings: dict[_Key, Ranking] = {}
+		self._loading: dict[_Key, asyncio.Task] = {}
+		self._pending: dict[_Key, dict[int, int]] = {}
+
+	async def seasonal(
+		self, board: Board, gid: int, now: pendulum.DateTime
+	) -> Ranking:
+		"""Return the ranking of the season now is in."""
+		season = season_of(now)
+		for key in [
+			k
+			for k in self._rankings
+			if k[:2] == (board, gid) and k[2] not in (None, season)
+		]:
+			del self._rankings[key]  # a past season, no longer updated
+
+		return await self._get((board, gid, season))
+
+	async def lifetime(self, board: Board, gid: int) -> Ranking:
+		return await self._get((board, gid, None))
+
+	def peek_seasonal(
+		self, board: Board, gid: int, now: pendulum.DateTime
+	) -> Ranking | None:
+		"""Return the ranking of the season now is in if loaded.
+
+		Otherwise it starts loading in the background, and None is returned for the
+		caller to query the few rows it needs in the meantime.
+		"""
+		key = (board, gid, season_of(now))
+		ranking = self._rankings.get(key)
+		if ranking is None:
+			self._start(key)
+
+		return ranking
+
+	def update(
+		self,
+		board: Board,
+		gid: int,
+		uid: int,
+		now: pendulum.DateTime,
+		*,
+		seasonal: int | None = None,
+		lifetime: int | None = None,
+	) -> None:
+		"""Set a member's new totals, on rankings that are loaded or loading."""
+		if seasonal is not None:
+			self._set((board, gid, season_of(now)), uid, seasonal)
+
+		if lifetime is not None:
+			self._set((board, gid, None), uid, lifetime)
+
+	def invalidate(self, gid: int | None = None) -> None:
+		"""Forget rankings of gid, or all if None, so they're loaded again."""
+		for key in [*self._rankings, *self._loading]:
+			if gid is None or key[1] == gid:
+				self._forget(key)
+
+	def invalidate_lifetime(self, board: Board, gid: int) -> None:
+		"""Forget the lifetime ranking of board in gid, so it's loaded again."""
+		self._forget((board, gid, None))
+
+	def _forget(self, key: _Key) -> None:
+		# A load already under way may have read the database before the change
+		self._rankings.pop(key, None)
+		self._loading.pop(key, None)
+		self._pending.pop(key, None)
+
+	def _set(self, key: _Key, uid: int, value: int) -> None:
+		ranking = self._rankings.get(key)
+		if ranking is not None:
+			ranking.set(uid, value)
+		elif key in self._loading:
+			# The load may have read the database before this, so apply it after
+			self._pending[key][uid] = value
+
+	async def _get(self, key: _Key) -> Ranking:
+		ranking = self._rankings.get(key)
+		if ranking is not None:
+			return ranking
+
+		return await asyncio.shield(self._start(key))
+
+	def _start(self, key: _Key) -> asyncio.Task:
+		"""Load key, unless it's already being loaded."""
+		loading = self._loading.get(key)
+		if loading is None:
+			self._pending[key] = {}
+			loading = asyncio.create_task(self._load(key))
+			self._loading[key] = loading
+			loading.add_done_callback(functools.partial(self._loaded, key))
+
+		return loading
+
+	def _loaded(self, key: _Key, loading: asyncio.Task) -> None:
+		if self._loading.get(key) is loading:
+			del self._loading[key]
+			self._pending.pop(key, None)
+
+		if not loading.cancelled() and loading.exception() is not None:
+			_log.warning(
+				"Failed to load ranking %s: %s", key, loading.exception()
+			)
+
+	async def _load(self, key: _Key) -> Ranking:
+		board, gid, season = key
+		if board is Board.EXP:
+			# The database has to have caught up with buffered experience
+			await self.ledger.flush()
+
+		year, season = season if season is not None else (None, None)
+		rows = await fetch_ranked(self.pool, board, gid, year, season)
+
+		ranking = Ranking({row[1]: row[2] for row in rows})
+		for uid, value in self._pending.get(key, {}).items():
+			ranking.set(uid, value)
+
+		# Unless forgotten while loading, in which case only its caller gets it
+		if self._loading.get(key) is asyncio.current_task():
+			self._rankings[key] = ranking
+
+		return ranking
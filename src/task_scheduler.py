@@ -0,0 +1,298 @@
+"""Runs tasks from the task table as they come due.
+
+Cogs used to each poll the task table on their own interval for their tag. Instead,
+bot.scheduler owns the table. Cogs register a handler per tag, and the scheduler
+sleeps until the earliest task of any registered tag is due. When it wakes, it fetches
+only due rows with one query and hands each to its tag's handler.
+
+Handlers run concurrently, up to a per-tag limit, and are given the task as a
+db.table.Task. A handler is responsible for dropping or rescheduling its task once
+handled. Should it raise without having done so, the task is retried after
+FAILURE_BACKOFF, doubling with every failure in a row up to MAX_FAILURE_BACKOFF, or
+dropped if its tag was registered with retry=False. A task failing MAX_FAILURES times
+in a row is dropped either way.
+
+Every write to the task table should go through the scheduler, so it can wake early
+for a task due sooner than it was going to sleep. A write it never saw only delays
+that task until the next wake up.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import discord
+import pendulum
+from asyncpg import Pool
+from pendulum import DateTime
+
+from src import db
+from src.db.table import Task
+
+_log = logging.getLogger(__name__)
+
+FAILURE_BACKOFF = 60  # seconds
+MAX_FAILURE_BACKOFF = 3600  # seconds
+MAX_FAILURES = 8  # in a row, before a task is dropped
+
+Handler = Callable[[Task], Awaitable[None]]
+
+
+@dataclass
+class TagMetrics:
+	running: int = 0
+	waiting: int = 0  # due, but over the concurrency limit
+	dispatched: int = 0
+	failed: int = 0
+	last_lag: float = 0.0  # seconds between run_at and the handler starting
+	max_lag: float = 0.0
+
+	@property
+	def depth(self) -> int:
+		return self.running + self.waiting
+
+
+@dataclass
+class _Registration:
+	handler: Handler
+	semaphore: asyncio.Semaphore
+	retry: bool = True
+	metrics: TagMetrics = field(default_factory=TagMetrics)
+
+
+class TaskScheduler:
+	def __init__(self, pool: Pool, bot: discord.Client):
+		self.pool = pool
+		self.bot = bot
+		self._tags: dict[str, _Registration] = {}
+		self._in_flight: set[int] = set()
+		self._handled: set[int] = set()  # in flight, rescheduled or dropped
+		self._failures: dict[int, int] = {}  # task id -> failures in a row
+		self._handling: set[asyncio.Task] = set()
+		self._next_run_at: float | None = None
+		self._wake = asyncio.Event()
+		self._loop_task: asyncio.Task | None = None
+
+	def register(
+		self,
+		tag: str,
+		handler: Handler,
+		*,
+		concurrency: int = 1,
+		retry: bool = True,
+	) -> None:
+		"""Have handler run tasks tagged with tag, at most concurrency at once.
+
+		Pass retry=False to drop failed tasks rather than retry them.
+		"""
+		self._tags[tag] = _Registration(
+			handler, asyncio.Semaphore(concurrency), retry
+		)
+		self._wake.set()
+
+	def unregister(self, tag: str) -> None:
+		"""Stop handling tag. Handlers already running are left to finish."""
+		self._tags.pop(tag, None)
+
+	def metrics(self) -> dict[str, TagMetrics]:
+		return {tag: reg.metrics for tag, reg in self._tags.items()}
+
+	def status(self) -> str:
+		lines = [
+			f"{tag}: {m.running} running, {m.waiting} waiting, "
+			f"{m.dispatched} dispatched, {m.failed} failed, "
+			f"lag {m.last_lag:.2f}s (max {m.max_lag:.2f}s)"
+			for tag, m in self.metrics().items()
+		]
+		if self._next_run_at is not None:
+			next_wake = self._next_run_at - time.time()
+			lines.append(f"next wake in {next_wake:.1f}s")
+
+		return "\n".join(lines) or "No task handlers registered."
+
+	def start(self) -> None:
+		self._loop_task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		tasks = list(self._handling)
+		if self._loop_task is not None:
+			tasks.append(self._loop_task)
+
+		for task in tasks:
+			task.cancel()
+
+		await asyncio.gather(*tasks, return_exceptions=True)
+
+	# Writes, mirroring db.task
+
+	async def add(self, tsk: Task) -> int:
+		"""Add the task, returning its id."""
+		tsk.id = await db.task.add(self.pool, tsk)
+		self._notify(tsk.run_at)
+		return tsk.id
+
+	async def add_many(self, tsks: list[Task]) -> None:
+		await db.task.add_many(self.pool, tsks)
+		for tsk in tsks:
+			self._notify(tsk.run_at)
+
+	async def reschedule(self, id: int, run_at: DateTime) -> None:
+		await db.task.update_run_at(self.pool, id, run_at)
+		self._mark_handled(id)
+		self._notify(run_at)
+
+	async def update(self, id: int, run_at: DateTime, payload: dict) -> None:
+		await db.task.update_all(self.pool, id, run_at, payload)
+		self._mark_handled(id)
+		self._notify(run_at)
+
+	async def drop_one(self, id: int) -> None:
+		await db.task.drop_one(self.pool, id)
+		self._mark_handled(id)
+
+	async def drop(
+		self, *, payload: dict = {}, tag: list[str] = []
+	) -> None:
+		await db.task.drop(self.pool, payload=payload, tag=tag)
+
+	async def drop_by_key(
+		self, tag: str, gid: int | None = None, cid: int | None = None
+	) -> None:
+		await db.task.drop_by_key(self.pool, tag, gid, cid)
+
+	# Internals
+
+	def _mark_handled(self, id: int) -> None:
+		if id in self._in_flight:
+			self._handled.add(id)
+
+	def _notify(self, run_at: DateTime) -> None:
+		"""Wake up early if run_at is sooner than the scheduler would."""
+		ts = run_at.timestamp()
+		if self._next_run_at is None or ts < self._next_run_at:
+			self._next_run_at = ts
+			self._wake.set()
+
+	async def _run(self) -> None:
+		await self.bot.wait_until_ready()
+
+		while True:
+			self._wake.clear()
+			try:
+				timeout = await self._dispatch_due()
+			except Exception:
+				_log.exception("Failed to fetch due tasks")
+				timeout = FAILURE_BACKOFF
+
+			with contextlib.suppress(asyncio.TimeoutError):
+				await asyncio.wait_for(self._wake.wait(), timeout)
+
+	async def _dispatch_due(self) -> float | None:
+		"""Hand due tasks to their handlers, return how long to sleep for."""
+		tags = list(self._tags)
+		if not tags:
+			self._next_run_at = None
+			return None
+
+		now = pendulum.now("UTC")
+		due = await db.task.get_due(
+			self.pool, tags, now, exclude=list(self._in_flight)
+		)
+		for record in due:
+			self._dispatch(Task(**record))
+
+		next_run_at = await db.task.get_next_run_at(
+			self.pool, tags, exclude=list(self._in_flight)
+		)
+		if next_run_at is None:
+			self._next_run_at = None
+			return None
+
+		self._next_run_at = next_run_at.timestamp()
+		return max(0.0, self._next_run_at - time.time())
+
+	def _dispatch(self, tsk: Task) -> None:
+		tag = next((t for t in tsk.tag if t in self._tags), None)
+		if tag is None:
+			return
+
+		self._in_flight.add(tsk.id)
+		handling = asyncio.create_task(self._handle(self._tags[tag], tsk))
+		self._handling.add(handling)
+		handling.add_done_callback(self._handling.discard)
+
+	async def _handle(self, reg: _Registration, tsk: Task) -> None:
+		metrics = reg.metrics
+		metrics.waiting += 1
+		waiting = True
+		try:
+			async with reg.semaphore:
+				metrics.waiting -= 1
+				waiting = False
+				metrics.running += 1
+				metrics.dispatched += 1
+				metrics.last_lag = max(
+					0.0, time.time() - tsk.run_at.timestamp()
+				)
+				metrics.max_lag = max(metrics.max_lag, metrics.last_lag)
+
+				try:
+					await reg.handler(tsk)
+				except Exception:
+					metrics.failed += 1
+					await self._failed(reg, tsk)
+				else:
+					self._failures.pop(tsk.id, None)
+				finally:
+					metrics.running -= 1
+		finally:
+			if waiting:
+				metrics.waiting -= 1
+
+			self._in_flight.discard(tsk.id)
+			self._handled.discard(tsk.id)
+			self._wake.set()  # it's no longer excluded from the next wake up
+
+	async def _failed(self, reg: _Registration, tsk: Task) -> None:
+		"""Retry or drop a task whose handler raised, logging why."""
+		failures = self._failures.get(tsk.id, 0) + 1
+		self._failures[tsk.id] = failures
+
+		if tsk.id in self._handled and failures < MAX_FAILURES:
+			# Already rescheduled by its handler, which keeps its own cadence
+			_log.exception(
+				"Task %s %s failed %s times in a row",
+				tsk.id,
+				tsk.tag,
+				failures,
+			)
+			return
+
+		if failures >= MAX_FAILURES or not reg.retry:
+			_log.exception(
+				"Task %s %s failed %s times in a row, dropping it",
+				tsk.id,
+				tsk.tag,
+				failures,
+			)
+			self._failures.pop(tsk.id)
+			try:
+				await self.drop_one(tsk.id)
+			except Exception:
+				_log.exception("Failed to drop task %s", tsk.id)
+			return
+
+		backoff = min(
+			FAILURE_BACKOFF * 2 ** (failures - 1), MAX_FAILURE_BACKOFF
+		)
+		_log.exception(
+			"Task %s %s failed, retrying in %ss", tsk.id, tsk.tag, backoff
+		)
+		run_at = pendulum.now("UTC").add(seconds=backoff)
+		try:
+			await self.reschedule(tsk.id, run_at)
+		except Exception:
+			_log.exception("Failed to reschedule task %s", tsk.id)
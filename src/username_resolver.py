@@ -0,0 +1,155 @@
+"""Resolves user ids to names for leaderboards, a page at a time.
+
+Names used to be looked up one row at a time, and anyone no longer in the guild or
+the client's cache cost a fetch_user request, every time a page showing them was
+viewed. bot.usernames looks at the guild and client cache first as before, but
+whatever has to be fetched is remembered in a bounded LRU for TTL seconds. Users who
+no longer exist are remembered as such, so they aren't fetched again either.
+
+All misses of a page are fetched concurrently, at most FETCH_CONCURRENCY at once on
+top of discord.py's own rate limit handling. Should discord answer with a 429 anyway,
+the remaining misses of the page are not fetched and fall back to their uid.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import discord
+
+_log = logging.getLogger(__name__)
+
+MAX_SIZE = 10_000
+TTL = 3600  # seconds
+ERROR_TTL = 60  # seconds, for fetches which failed for some other reason
+FETCH_CONCURRENCY = 4
+
+
+class UsernameResolver:
+	def __init__(
+		self,
+		client: discord.Client,
+		*,
+		max_size: int = MAX_SIZE,
+		ttl: float = TTL,
+	):
+		self.client = client
+		self.max_size = max_size
+		self.ttl = ttl
+
+		# uid -> (name, expires), name is None for users which don't exist
+		self._names: OrderedDict[int, tuple[str | None, float]] = OrderedDict()
+		self._fetching: dict[int, asyncio.Task] = {}
+		self._semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+		self._rate_limited_until = 0.0
+
+		self.hits = 0
+		self.fetches = 0
+
+	def __len__(self) -> int:
+		return len(self._names)
+
+	async def resolve(self, guild: discord.Guild | None, uid: int) -> str:
+		return (await self.resolve_many(guild, [uid]))[0]
+
+	async def resolve_many(
+		self, guild: discord.Guild | None, uids: list[int]
+	) -> list[str]:
+		"""Return the display names of uids, in order, or the uid if it can't be.
+
+		Members of guild are named as they appear in it.
+		"""
+		names: dict[int, str | None] = {}
+		misses = []
+		now = time.monotonic()
+		for uid in dict.fromkeys(uids):
+			name = self._known(guild, uid, now)
+			if name is ...:
+				misses.append(uid)
+			else:
+				names[uid] = name
+
+		if misses:
+			fetched = await asyncio.gather(
+				*(self._fetch(uid) for uid in misses)
+			)
+			names.update(zip(misses, fetched))
+
+		return [names[uid] or str(uid) for uid in uids]
+
+	def forget(self, uid: int) -> None:
+		self._names.pop(uid, None)
+
+	def clear(self) -> None:
+		self._names.clear()
+
+	def status(self) -> str:
+		return (
+			f"usernames: {len(self)} cached, {self.hits} hits, "
+			f"{self.fetches} fetches"
+		)
+
+	def _known(self, guild: discord.Guild | None, uid: int, now: float):
+		"""Return the name of uid without fetching, ... if it has to be fetched."""
+		member = guild.get_member(uid) if guild is not None else None
+		if member is not None:
+			return member.display_name
+
+		user = self.client.get_user(uid)
+		if user is not None:
+			return user.display_name
+
+		cached = self._names.get(uid)
+		if cached is None:
+			return ...
+
+		name, expires = cached
+		if now >= expires:
+			del self._names[uid]
+			return ...
+
+		self._names.move_to_end(uid)
+		self.hits += 1
+		return name
+
+	def _fetch(self, uid: int) -> asyncio.Task:
+		"""Fetch uid, sharing the fetch with anyone else already waiting on it."""
+		fetching = self._fetching.get(uid)
+		if fetching is None:
+			fetching = asyncio.create_task(self._fetch_user(uid))
+			self._fetching[uid] = fetching
+			fetching.add_done_callback(
+				lambda _: self._fetching.pop(uid, None)
+			)
+
+		return asyncio.shield(fetching)
+
+	async def _fetch_user(self, uid: int) -> str | None:
+		async with self._semaphore:
+			if time.monotonic() < self._rate_limited_until:
+				return None  # not remembered, retried on the next page
+
+			self.fetches += 1
+			try:
+				user = await self.client.fetch_user(uid)
+			except discord.NotFound:
+				name, ttl = None, self.ttl
+			except discord.HTTPException as err:
+				if err.status == 429:
+					self._rate_limited_until = time.monotonic() + ERROR_TTL
+					return None
+
+				_log.warning("Failed to fetch user %s: %s", uid, err)
+				name, ttl = None, ERROR_TTL
+			else:
+				name, ttl = user.display_name, self.ttl
+
+		self._remember(uid, name, ttl)
+		return name
+
+	def _remember(self, uid: int, name: str | None, ttl: float) -> None:
+		self._names[uid] = (name, time.monotonic() + ttl)
+		self._names.move_to_end(uid)
+		while len(self._names) > self.max_size:
+			self._names.popitem(last=False)
@@ -281,10 +281,9 @@ async def find_username(
 ) -> str:
 	"""Attempt to resolve a user id to a member's display name.
 
-	If fails, return uid.
+	If fails, return uid. Prefer bot.usernames.resolve_many() for many at once.
 	"""
-	res = await find_user(bot, ctx, uid)
-	return res.display_name if hasattr(res, "display_name") else res
+	return await bot.usernames.resolve(ctx.guild, uid)
 
 
 async def find_user(
@@ -0,0 +1,90 @@
+import itertools
+
+_pids = itertools.count(1)
+
+
+class FakeConnection:
+	"""Answers fetch() with canned rows, counting the queries it's sent.
+
+	Statements it prepares answer the same way, see db.statement.
+	"""
+
+	def __init__(self, rows):
+		self.rows = rows
+		self.queries = 0
+		self.pid = next(_pids)
+		self.prepared = []  # queries prepared, in order
+		self.listeners = []
+
+	def get_server_pid(self):
+		return self.pid
+
+	def is_in_transaction(self):
+		return False
+
+	def add_termination_listener(self, callback):
+		self.listeners.append(callback)
+
+	def close(self):
+		for callback in self.listeners:
+			callback(self)
+
+	async def prepare(self, query):
+		self.prepared.append(query)
+		return _Prepared(self)
+
+	async def fetch(self, query, *args):
+		self.queries += 1
+		return list(self.rows)
+
+	def transaction(self):
+		return _Nothing()
+
+	async def execute(self, query, *args):
+		self.queries += 1
+
+
+class _Prepared:
+	def __init__(self, con):
+		self.con = con
+
+	async def fetch(self, *args):
+		return await self.con.fetch(None, *args)
+
+	async def fetchrow(self, *args):
+		rows = await self.con.fetch(None, *args)
+		return rows[0] if rows else None
+
+	async def fetchval(self, *args):
+		row = await self.fetchrow(*args)
+		return row[0] if row else None
+
+	async def executemany(self, args):
+		await self.con.execute(None, args)
+
+
+class FakePool:
+	def __init__(self, rows):
+		self.con = FakeConnection(rows)
+
+	def acquire(self):
+		return _Acquired(self.con)
+
+
+class _Acquired:
+	def __init__(self, con):
+		self.con = con
+
+	async def __aenter__(self):
+		return self.con
+
+	async def __aexit__(self, *exc):
+		pass
+
+
+class _Nothing:
+	async def __aenter__(self):
+		pass
+
+	async def __aexit__(self, *exc):
+		pass
@@ -0,0 +1,63 @@
+import asyncio
+
+from src.db import cache
+
+
+def test_invalidate_all_drops_fetch_in_flight():
+	"""A fetch racing an invalidation of every guild doesn't cache what it read."""
+	cache.clear()
+	reads = []
+
+	@cache.cached("test_in_flight")
+	async def get(pool, gid):
+		reads.append(gid)
+		if len(reads) == 1:
+			cache.invalidate("test_in_flight")
+		return len(reads)
+
+	async def run():
+		assert await get(None, 1) == 1
+		assert await get(None, 1) == 2
+		assert await get(None, 1) == 2
+
+	asyncio.run(run())
+	assert reads == [1, 1]
+
+
+def test_invalidate_guild_keeps_others():
+	cache.clear()
+	reads = []
+
+	@cache.cached("test_guild")
+	async def get(pool, gid):
+		reads.append(gid)
+		return gid
+
+	async def run():
+		await get(None, 1)
+		await get(None, 2)
+		cache.invalidate("test_guild", 1)
+		await get(None, 1)
+		await get(None, 2)
+
+	asyncio.run(run())
+	assert reads == [1, 2, 1]
+
+
+def test_getters_sharing_namespace_keep_their_own_values():
+	cache.clear()
+
+	@cache.cached("test_shared")
+	async def get_quiet(pool, gid, *, mode=None):
+		return ["quiet"]
+
+	@cache.cached("test_shared")
+	async def get_message(pool, gid, *, mode=None):
+		return "message"
+
+	async def run():
+		for _ in range(2):
+			assert await get_quiet(None, 1, mode=1) == ["quiet"]
+			assert await get_message(None, 1, mode=1) == "message"
+
+	asyncio.run(run())
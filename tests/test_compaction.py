@@ -0,0 +1,209 @@
+"""Compacting member_exp_log must not change any answer read from it.
+
+Runs against a Postgres at TEST_DSN, in a scratch schema dropped afterwards.
+"""
+
+import asyncio
+import os
+
+import asyncpg
+import pendulum
+import pytest
+
+from benchmarks.compaction import AGGREGATES
+from src.db import internal, member_exp_log, partition
+from src.db.migration import MIGRATIONS
+
+DSN = os.environ.get("TEST_DSN")
+SCHEMA = "test_compaction"
+
+ROWS = 20_000
+GUILDS = 2
+MEMBERS = 30
+FIRST = pendulum.datetime(2023, 1, 1)
+MONTHS = 12
+UNSYNCED_MONTH = 4  # old enough to compact, but has logs yet to be synced
+NOW = FIRST.add(months=MONTHS - 1)  # all but the last few months compacted
+
+pytestmark = pytest.mark.skipif(
+	not DSN, reason="needs a Postgres at TEST_DSN"
+)
+
+
+async def _fill(pool: asyncpg.Pool) -> int:
+	"""Fill the log, return the sync watermark of all but UNSYNCED_MONTH."""
+	async with pool.acquire() as con:
+		await con.execute(
+			"""
+			CREATE TABLE internal (field text PRIMARY KEY, value text);
+			CREATE TABLE member_exp (
+				gid bigint NOT NULL,
+				uid bigint NOT NULL,
+				lifetime bigint NOT NULL DEFAULT 0
+			);
+			CREATE TABLE member_exp_log (
+				gid bigint NOT NULL,
+				uid bigint NOT NULL,
+				exp integer NOT NULL,
+				at timestamptz NOT NULL,
+				source text NOT NULL DEFAULT 'message',
+				id bigserial
+			) PARTITION BY RANGE (at);
+			"""
+		)
+		for i in range(MONTHS):
+			month = FIRST.add(months=i)
+			await partition.create(
+				con, "member_exp_log", month.year, month.month
+			)
+
+		fill = f"""
+			INSERT INTO member_exp_log (gid, uid, exp, at, source)
+			SELECT
+				1 + (random() * {GUILDS - 1})::int,
+				1 + (random() * {MEMBERS - 1})::int,
+				15 + (random() * 10)::int,
+				$1::timestamptz + random() * $2 * interval '1 second',
+				CASE WHEN random() < 0.9 THEN 'message' ELSE 'frog' END
+			FROM generate_series(1, $3)
+		"""
+		span = (FIRST.add(months=MONTHS) - FIRST).total_seconds()
+		await con.execute(fill, FIRST, span, ROWS)
+		watermark = await con.fetchval("SELECT MAX(id) FROM member_exp_log")
+
+		# Logged since the last sync, into a month old enough to be compacted
+		month = FIRST.add(months=UNSYNCED_MONTH)
+		span = (month.add(months=1) - month).total_seconds()
+		await con.execute(fill, month, span, 100)
+
+		await con.execute(MIGRATIONS[0][2])  # member_exp_season, filled
+		await con.execute(
+			"""
+			INSERT INTO member_exp (gid, uid, lifetime)
+			SELECT gid, uid, SUM(exp) FROM member_exp_log GROUP BY gid, uid
+			"""
+		)
+		await internal.set_watermark(con, "exp_sync", watermark)
+
+	return watermark
+
+
+async def _answers(pool: asyncpg.Pool, watermark: int) -> dict:
+	"""Return the answer of every query of db.member_exp_log."""
+	answers = {}
+	async with pool.acquire() as con:
+		for name, sql in AGGREGATES.items():
+			args = [watermark] if "$1" in sql else []
+			answers[name] = [tuple(row) for row in await con.fetch(sql, *args)]
+
+	months = [FIRST.add(months=i) for i in range(MONTHS)]
+	seasons = sorted({(m.year, (m.month - 1) // 3) for m in months})
+	members = [
+		(gid, uid)
+		for gid in range(1, GUILDS + 1)
+		for uid in range(1, MEMBERS + 1)
+	]
+
+	for gid, uid in members:
+		for m in months:
+			answers[("monthly", gid, uid, m)] = (
+				await member_exp_log.get_monthly(
+					pool, gid, uid, m.year, m.month
+				)
+			)
+			answers[("seasonal_by_month", gid, uid, m)] = (
+				await member_exp_log.get_seasonal_by_month(
+					pool, gid, uid, m.year, m.month
+				)
+			)
+
+		for year, season in seasons:
+			answers[("seasonal", gid, uid, year, season)] = (
+				await member_exp_log.get_seasonal(
+					pool, gid, uid, year, season
+				)
+			)
+			window = await member_exp_log.get_focus_window(
+				pool, gid, uid, year, season
+			)
+			answers[("focus_window", gid, uid, year, season)] = sorted(
+				tuple(row) for row in window
+			)
+
+	for gid in range(1, GUILDS + 1):
+		answers[("total_members", gid)] = (
+			await member_exp_log.get_total_members(pool, gid)
+		)
+		for year, season in seasons:
+			ranked = await member_exp_log.get_seasonal_bulk_ranked(
+				pool, gid, year, season
+			)
+			answers[("bulk_ranked", gid, year, season)] = sorted(
+				tuple(row) for row in ranked
+			)
+			answers[("total_members", gid, year, season)] = (
+				await member_exp_log.get_seasonal_total_members(
+					pool, gid, year, season
+				)
+			)
+
+		for m in months:
+			answers[("total_members_by_month", gid, m)] = (
+				await member_exp_log.get_seasonal_total_members_by_month(
+					pool, gid, m.year, m.month
+				)
+			)
+
+	return answers
+
+
+async def _sync(pool: asyncpg.Pool) -> int:
+	"""Move the sync watermark past every log, returning it."""
+	async with pool.acquire() as con:
+		watermark = await con.fetchval("SELECT MAX(id) FROM member_exp_log")
+		await internal.set_watermark(con, "exp_sync", watermark)
+
+	return watermark
+
+
+async def _compacted_before(pool: asyncpg.Pool):
+	async with pool.acquire() as con:
+		return await internal.get_exp_compacted_before(con)
+
+
+async def _run() -> None:
+	con = await asyncpg.connect(DSN)
+	await con.execute(
+		f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}"
+	)
+
+	try:
+		async with asyncpg.create_pool(
+			DSN, server_settings={"search_path": SCHEMA}
+		) as pool:
+			watermark = await _fill(pool)
+			expected = await _answers(pool, watermark)
+
+			# Stops at the month with logs yet to be synced
+			assert await member_exp_log.compact(pool, NOW) > 0
+			assert await _answers(pool, watermark) == expected
+			assert await _compacted_before(pool) == FIRST.add(
+				months=UNSYNCED_MONTH
+			)
+
+			watermark = await _sync(pool)
+			expected = await _answers(pool, watermark)
+
+			# Once synced, the rest are compacted
+			assert await member_exp_log.compact(pool, NOW) > 0
+			assert await _answers(pool, watermark) == expected
+			assert await _compacted_before(pool) == (
+				NOW - member_exp_log.COMPACT_AFTER
+			).start_of("month")
+	finally:
+		await con.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+		await con.close()
+
+
+def test_compaction_keeps_every_answer():
+	asyncio.run(_run())
@@ -0,0 +1,51 @@
+import asyncio
+
+from src import db
+from src.cooldown import CooldownGate
+from src.exp_ledger import ExpLedger, LedgerEntry
+
+KEY = (1, 2)
+
+
+def test_failed_logs_queued_with_their_lifetime_gain(monkeypatch):
+	"""Logs the database refused are written next flush, along with their gain."""
+	batches = []
+
+	async def apply_ledger(pool, members, logs):
+		batches.append((members, logs))
+		return logs if len(batches) == 1 else []
+
+	monkeypatch.setattr(db.member_exp, "apply_ledger", apply_ledger)
+
+	ledger = ExpLedger(None, CooldownGate())
+	ledger._evict_idle = lambda: None
+	ledger._entries[KEY] = LedgerEntry(*KEY, 20, 1, None, (2024, 0), 20, 0)
+	ledger._dirty.add(KEY)
+	ledger._lifetime_gain[KEY] = 20
+	ledger._logs.append(db.table.MemberExpLog(*KEY, 20, None))
+
+	async def run():
+		await ledger.flush()
+		await ledger.flush()
+
+	asyncio.run(run())
+
+	(members, logs), (retried, relogged) = batches
+	assert members[0][2] == 20
+	assert retried[0][2] == 20
+	assert relogged == logs
+	assert not ledger._logs and not ledger._lifetime_gain
+
+
+def test_failed_message_exp_held_back_from_lifetime():
+	frog = db.table.MemberExpLogSourceEnum.FROG
+	failed = [
+		db.table.MemberExpLog(*KEY, 20, None),
+		db.table.MemberExpLog(*KEY, 5, None, frog),  # never in lifetime gain
+	]
+	members = [(*KEY, 30, 2, None, 0), (1, 3, 10, 1, None, 0)]
+
+	assert db.member_exp._hold_back(members, failed) == [
+		(*KEY, 10, 2, None, 0),
+		(1, 3, 10, 1, None, 0),
+	]
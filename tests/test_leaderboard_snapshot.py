@@ -0,0 +1,45 @@
+import asyncio
+
+from src import leaderboard_snapshot
+from src.leaderboard_snapshot import Board, LeaderboardSnapshots
+
+
+def test_invalidate_drops_load_in_flight(monkeypatch):
+	"""A load started before an invalidate doesn't store what it read."""
+	reads = []
+
+	async def fetch_ranked(pool, board, gid, year, season):
+		reads.append(gid)
+		if len(reads) == 1:
+			snapshots.invalidate(gid)
+		return [(1, 2, len(reads))]
+
+	monkeypatch.setattr(leaderboard_snapshot, "fetch_ranked", fetch_ranked)
+	snapshots = LeaderboardSnapshots(None)
+
+	async def run():
+		first = await snapshots.lifetime(Board.EXP, 1)
+		second = await snapshots.lifetime(Board.EXP, 1)
+		third = await snapshots.lifetime(Board.EXP, 1)
+		return first, second, third
+
+	first, second, third = asyncio.run(run())
+	assert reads == [1, 1]
+	assert first.rows[0][2] == 1
+	assert second is third
+
+
+def test_least_recently_viewed_dropped(monkeypatch):
+	async def fetch_ranked(pool, board, gid, year, season):
+		return []
+
+	monkeypatch.setattr(leaderboard_snapshot, "fetch_ranked", fetch_ranked)
+	monkeypatch.setattr(leaderboard_snapshot, "MAX_SNAPSHOTS", 2)
+	snapshots = LeaderboardSnapshots(None)
+
+	async def run():
+		for gid in (1, 2, 1, 3):
+			await snapshots.lifetime(Board.EXP, gid)
+
+	asyncio.run(run())
+	assert [key[1] for key in snapshots._snapshots] == [1, 3]
@@ -0,0 +1,51 @@
+import asyncio
+
+from src import db, levels_helper, rank
+from src.db.table import RankThreshold, WindowEnum
+
+from .fakes import FakePool
+
+GID = 1
+THRESHOLDS = [{"rid": 10, "threshold": 1}, {"rid": 20, "threshold": 5}]
+EXP = levels_helper.exp_to_level_cum(5)
+MODE = WindowEnum.SEASONAL
+
+
+async def _ladder_then_member(pool):
+	ladder = await rank.get_ladder(pool, GID, mode=MODE)
+	member = await db.rank_threshold.of_member(
+		pool, GID, 2, mode=MODE, exp=EXP
+	)
+	return ladder, member
+
+
+async def _member_then_ladder(pool):
+	member = await db.rank_threshold.of_member(
+		pool, GID, 2, mode=MODE, exp=EXP
+	)
+	ladder = await rank.get_ladder(pool, GID, mode=MODE)
+	return ladder, member
+
+
+def test_ladder_and_thresholds_cached_apart():
+	"""get_ladder and rank_threshold.get don't hand out each other's entries."""
+	for both in (_ladder_then_member, _member_then_ladder):
+		db.cache.clear()
+		ladder, member = asyncio.run(both(FakePool(THRESHOLDS)))
+
+		assert isinstance(ladder, rank.RankLadder)
+		assert ladder.changes(1, keep_old=False) == ((20,), (10,))
+		assert member == 20
+
+
+def test_threshold_setter_invalidates_ladder():
+	db.cache.clear()
+	pool = FakePool(THRESHOLDS)
+
+	async def run():
+		await rank.get_ladder(pool, GID, mode=MODE)
+		pool.con.rows = THRESHOLDS[:1]
+		await db.rank_threshold.add(pool, RankThreshold(GID, 30, 9, MODE))
+		return await rank.get_ladder(pool, GID, mode=MODE)
+
+	assert asyncio.run(run()).rids == (10,)
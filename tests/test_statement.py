@@ -0,0 +1,34 @@
+import asyncio
+
+from src.db import statement
+
+from .fakes import FakeConnection
+
+HOT = statement.Statement("test.hot", "SELECT 1", hot=True)
+COLD = statement.Statement("test.cold", "SELECT 2")
+
+
+def test_closed_connection_forgotten():
+	con = FakeConnection([(1,)])
+
+	asyncio.run(statement.prepare(con))
+	assert con.pid in statement._connections
+
+	con.close()
+	assert con.pid not in statement._connections
+
+
+def test_hot_prepared_again_once_migrated():
+	con = FakeConnection([(1,)])
+
+	async def run():
+		await statement.prepare(con)
+		await COLD.fetchval(con)
+		statement.migrated()
+		await COLD.fetchval(con)
+
+	asyncio.run(run())
+	first = con.prepared.index("SELECT 2")
+	assert "SELECT 1" in con.prepared[:first]
+	assert con.prepared[first + 1 :].count("SELECT 1") == 1
+	assert con.prepared[first + 1 :].count("SELECT 2") == 1